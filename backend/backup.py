@@ -0,0 +1,49 @@
+"""
+数据备份工具 - 以NDJSON流式导出/导入全部概念和语料，内存占用与数据量无关
+
+用法：
+    python -m backend.backup export backup.ndjson.gz      # .gz -> gzip，.zst -> zstd
+    python -m backend.backup import backup.ndjson.gz [--batch-size 500] [--no-resume]
+导入中断后重新执行同一命令，会从 {备份文件}.import-state 记录的检查点继续。
+"""
+import argparse
+import time
+from pathlib import Path
+
+from .data_manager import data_manager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式导出/导入概念与语料数据")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = sub.add_parser("export", help="导出为NDJSON")
+    export_parser.add_argument("path", type=Path, help="备份文件")
+    export_parser.add_argument("--compression", choices=["gzip", "zstd", "none"], default=None,
+                               help="压缩格式，默认按扩展名判断")
+
+    import_parser = sub.add_parser("import", help="从NDJSON导入")
+    import_parser.add_argument("path", type=Path, help="备份文件（自动识别压缩格式）")
+    import_parser.add_argument("--batch-size", type=int, default=500, help="每次提交的记录数")
+    import_parser.add_argument("--no-resume", action="store_true", help="忽略检查点，从头导入")
+    args = parser.parse_args()
+
+    started = time.time()
+    if args.command == "export":
+        count = data_manager.export_ndjson(args.path, args.compression)
+        print(f"导出完成: {count} 条记录 -> {args.path} ({time.time() - started:.1f}s)")
+        return
+
+    def report(p):
+        percent = p["bytes_read"] / p["total_bytes"] * 100 if p["total_bytes"] else 100
+        elapsed = time.time() - started
+        print(f"已导入 {p['records']} 条记录（概念 {p['concepts']}，语料 {p['corpus']}）"
+              f" {percent:.0f}% ({p['records'] / elapsed if elapsed else 0:.0f} 条/秒)")
+
+    result = data_manager.import_ndjson(args.path, args.batch_size, resume=not args.no_resume, progress=report)
+    data_manager.compact_changelogs()
+    print(f"导入完成: 概念 {result['concepts']} 个，语料 {result['corpus']} 条")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,502 @@
+"""
+概念存储后端 - DataManager 的可插拔存储层
+
+- JSONConceptStore：每个概念一个JSON文件（默认，适合少量概念），局部更新追加到变更日志
+- SQLiteConceptStore：单个带索引的SQLite数据库，元数据独立成列，语料按时代逐行存储
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .utils.fileio import atomic_open, file_lock
+
+# 在 SQLite 中独立成列的元数据字段
+METADATA_FIELDS = ("eras", "last_updated", "corpus_count")
+
+# 局部更新：[(字段路径, 新值), ...]，例如 [(("semantic_shift",), {...}), (("corpus", "古希腊"), [...])]
+FieldUpdates = Sequence[Tuple[Sequence[str], Any]]
+
+
+def apply_updates(data: Dict[str, Any], updates: FieldUpdates) -> Dict[str, Any]:
+    """将局部更新应用到文档上（原地修改），中间层级不存在时自动创建"""
+    for path, value in updates:
+        target = data
+        for key in path[:-1]:
+            if not isinstance(target.get(key), dict):
+                target[key] = {}
+            target = target[key]
+        target[path[-1]] = value
+    return data
+
+
+class ConceptStore:
+    """概念存储接口"""
+
+    name = "base"
+
+    def load(self, concept_name: str) -> Optional[Dict[str, Any]]:
+        """读取完整概念文档，不存在时返回 None"""
+        raise NotImplementedError
+
+    def save(self, concept_name: str, data: Dict[str, Any]):
+        """写入完整概念文档"""
+        raise NotImplementedError
+
+    def save_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """批量写入概念文档，返回写入数量"""
+        count = 0
+        for concept_name, data in items:
+            self.save(concept_name, data)
+            count += 1
+        return count
+
+    def list_names(self) -> List[str]:
+        """所有概念名称"""
+        raise NotImplementedError
+
+    def source(self, concept_name: str) -> Optional[Path]:
+        """概念对应的源文件，用于缓存失效判断；没有独立文件时返回 None"""
+        return None
+
+    def metadata(self, concept_name: str) -> Optional[Dict[str, Any]]:
+        """直接读取元数据，返回 None 表示需要由完整文档推导"""
+        return None
+
+    def get_corpus(self, concept_name: str, era: str) -> Optional[List[str]]:
+        """直接读取某时代的语料，返回 None 表示需要由完整文档推导"""
+        return None
+
+    def apply_update(self, concept_name: str, updates: FieldUpdates):
+        """局部更新概念文档"""
+        self.save(concept_name, apply_updates(self.load(concept_name) or {}, updates))
+
+    def set_corpus(self, concept_name: str, era: str, texts: List[str], last_updated: str):
+        """替换某时代的语料，并更新 corpus_count 和 last_updated"""
+        data = self.load(concept_name) or {}
+        self.apply_update(concept_name, _corpus_updates(data, era, texts, last_updated))
+
+    def changed(self) -> bool:
+        """自上次调用以来存储是否被其他进程修改（需要清空内存索引）"""
+        return False
+
+    def compact_all(self) -> int:
+        """合并所有待合并的变更，返回处理的概念数"""
+        return 0
+
+    def close(self):
+        pass
+
+
+def _corpus_updates(data: Dict[str, Any], era: str, texts: List[str], last_updated: str) -> FieldUpdates:
+    """替换某时代语料对应的局部更新"""
+    corpus = dict(data.get("corpus") or {})
+    corpus[era] = list(texts)
+    return [
+        (("corpus", era), list(texts)),
+        (("corpus_count",), sum(len(t) for t in corpus.values())),
+        (("last_updated",), last_updated),
+    ]
+
+
+class JSONConceptStore(ConceptStore):
+    """每个概念一个JSON文件
+
+    - 整体保存先写临时文件再替换，读者不会看到半写入的JSON
+    - 同一概念的写操作通过锁文件串行化（跨线程和跨进程）
+    - 局部更新（如设置 semantic_shift、替换某时代语料）追加到 .changes/{概念}.jsonl，
+      读取时在基础文档上重放；日志超过阈值时合并回基础文档
+    """
+
+    name = "json"
+
+    def __init__(
+        self,
+        concepts_dir: Path,
+        changelog_max_entries: int = 50,
+        changelog_max_bytes: int = 1024 * 1024,
+    ):
+        self.concepts_dir = Path(concepts_dir)
+        self.changes_dir = self.concepts_dir / ".changes"
+        self.locks_dir = self.concepts_dir / ".locks"
+        self.changelog_max_entries = changelog_max_entries
+        self.changelog_max_bytes = changelog_max_bytes
+        # 概念列表缓存及对应的目录 mtime
+        self._names: Optional[List[str]] = None
+        self._names_mtime: Any = None
+        self._lock = threading.Lock()
+        # 各概念变更日志的 (字节数, 条数)，字节数与文件一致时追加无需重新统计
+        self._log_entries: Dict[str, Tuple[int, int]] = {}
+
+    def path(self, concept_name: str) -> Path:
+        return self.concepts_dir / f"{concept_name}.json"
+
+    def log_path(self, concept_name: str) -> Path:
+        return self.changes_dir / f"{concept_name}.jsonl"
+
+    def source(self, concept_name: str) -> Tuple[Path, Path]:
+        return (self.path(concept_name), self.log_path(concept_name))
+
+    def _concept_lock(self, concept_name: str, shared: bool = False):
+        return file_lock(self.locks_dir / f"{concept_name}.lock", shared=shared)
+
+    def _read_log(self, concept_name: str) -> List[FieldUpdates]:
+        """读取变更日志，忽略末尾未写完的行"""
+        try:
+            with open(self.log_path(concept_name), 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line)["set"])
+            except (json.JSONDecodeError, KeyError):
+                continue
+        return entries
+
+    def _count_log_entries(self, concept_name: str, size: int) -> int:
+        """变更日志的条数；日志被其他进程改动过（字节数不符）时按行数重新统计，不解析JSON"""
+        cached = self._log_entries.get(concept_name)
+        if cached is not None and cached[0] == size:
+            return cached[1]
+        try:
+            with open(self.log_path(concept_name), 'rb') as f:
+                return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1024 * 1024), b""))
+        except FileNotFoundError:
+            return 0
+
+    def _load_unlocked(self, concept_name: str) -> Optional[Dict[str, Any]]:
+        concept_file = self.path(concept_name)
+        data = None
+        if concept_file.exists():
+            with open(concept_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        entries = self._read_log(concept_name)
+        if data is None and not entries:
+            return None
+        data = data or {}
+        for updates in entries:
+            apply_updates(data, updates)
+        return data
+
+    def load(self, concept_name: str) -> Optional[Dict[str, Any]]:
+        if not self.log_path(concept_name).exists():
+            # 没有变更日志时基础文档本身就是一致的快照（原子替换写入）
+            return self._load_unlocked(concept_name)
+        # 有日志时加共享锁，避免读到合并过程中的中间状态
+        with self._concept_lock(concept_name, shared=True):
+            return self._load_unlocked(concept_name)
+
+    def _write_base(self, concept_name: str, data: Dict[str, Any]):
+        with atomic_open(self.path(concept_name)) as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        try:
+            os.remove(self.log_path(concept_name))
+        except FileNotFoundError:
+            pass
+        self._log_entries.pop(concept_name, None)
+
+    def save(self, concept_name: str, data: Dict[str, Any]):
+        with self._concept_lock(concept_name):
+            self._write_base(concept_name, data)
+
+    def apply_update(self, concept_name: str, updates: FieldUpdates):
+        """追加到变更日志，不重写整个文档"""
+        with self._concept_lock(concept_name):
+            self._append_log(concept_name, updates)
+
+    def set_corpus(self, concept_name: str, era: str, texts: List[str], last_updated: str):
+        with self._concept_lock(concept_name):
+            data = self._load_unlocked(concept_name) or {}
+            self._append_log(concept_name, _corpus_updates(data, era, texts, last_updated))
+
+    def _append_log(self, concept_name: str, updates: FieldUpdates):
+        """追加一条变更（调用方持有锁），超过阈值时合并"""
+        self.changes_dir.mkdir(parents=True, exist_ok=True)
+        log_file = self.log_path(concept_name)
+        line = json.dumps({"ts": time.time(), "set": [[list(p), v] for p, v in updates]}, ensure_ascii=False)
+        with open(log_file, 'a', encoding='utf-8') as f:
+            entries = self._count_log_entries(concept_name, f.tell()) + 1
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        self._log_entries[concept_name] = (size, entries)
+
+        if size > self.changelog_max_bytes or entries >= self.changelog_max_entries:
+            self._compact_unlocked(concept_name)
+
+    def _compact_unlocked(self, concept_name: str):
+        data = self._load_unlocked(concept_name)
+        if data is not None:
+            self._write_base(concept_name, data)
+
+    def compact(self, concept_name: str):
+        """将变更日志合并回基础文档"""
+        with self._concept_lock(concept_name):
+            self._compact_unlocked(concept_name)
+
+    def compact_all(self) -> int:
+        if not self.changes_dir.exists():
+            return 0
+        count = 0
+        for log_file in self.changes_dir.glob("*.jsonl"):
+            self.compact(log_file.stem)
+            count += 1
+        return count
+
+    def list_names(self) -> List[str]:
+        """目录未变化时直接返回缓存的列表"""
+        try:
+            dir_mtime = os.stat(self.concepts_dir).st_mtime_ns
+        except OSError:
+            return []
+        try:
+            dir_mtime = (dir_mtime, os.stat(self.changes_dir).st_mtime_ns)
+        except OSError:
+            pass
+
+        with self._lock:
+            if self._names is None or self._names_mtime != dir_mtime:
+                names = {f.stem for f in self.concepts_dir.glob("*.json")}
+                # 只通过变更日志创建、尚未合并的概念
+                if self.changes_dir.exists():
+                    names.update(f.stem for f in self.changes_dir.glob("*.jsonl"))
+                self._names = sorted(names)
+                self._names_mtime = dir_mtime
+            return list(self._names)
+
+
+class SQLiteConceptStore(ConceptStore):
+    """单文件SQLite存储
+
+    concepts 表保存去掉语料后的文档，eras/last_updated/corpus_count 独立成列；
+    corpus 表按 (concept, era) 索引，每条语料一行，更新某时代语料不需要重写整个文档。
+    """
+
+    name = "sqlite"
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS concepts (
+        name TEXT PRIMARY KEY,
+        eras TEXT,
+        last_updated TEXT,
+        corpus_count INTEGER,
+        doc TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS corpus (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        concept TEXT NOT NULL,
+        era TEXT NOT NULL,
+        text TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_corpus_concept_era ON corpus (concept, era);
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        # 单个共享连接 + 锁，首次访问时创建（构造时不触碰文件系统）；autocommit 模式，写操作显式开启事务
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        self._data_version = None
+
+    def _connect(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._conn is None:
+                self.db_path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.executescript(self._SCHEMA)
+                self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+                self._conn = conn
+            return self._conn
+
+    def load(self, concept_name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT eras, last_updated, corpus_count, doc FROM concepts WHERE name = ?",
+                (concept_name,),
+            ).fetchone()
+            if row is None:
+                return None
+            corpus_rows = conn.execute(
+                "SELECT era, text FROM corpus WHERE concept = ? ORDER BY id",
+                (concept_name,),
+            ).fetchall()
+
+        data = json.loads(row[3])
+        eras, last_updated, corpus_count = row[:3]
+        if eras is not None:
+            data["eras"] = json.loads(eras)
+        if last_updated is not None:
+            data["last_updated"] = last_updated
+        if corpus_count is not None:
+            data["corpus_count"] = corpus_count
+        if "corpus" in data or corpus_rows:
+            corpus: Dict[str, List[str]] = {}
+            for era, text in corpus_rows:
+                corpus.setdefault(era, []).append(text)
+            data["corpus"] = corpus
+        return data
+
+    def _write(self, concept_name: str, data: Dict[str, Any]):
+        """在当前事务中写入文档（调用方持有锁并已开启事务）"""
+        conn = self._connect()
+        doc = {k: v for k, v in data.items() if k not in METADATA_FIELDS}
+        corpus = doc.pop("corpus", None)
+        if corpus is not None:
+            # 保留占位，读取时据此还原空的 corpus 字段
+            doc["corpus"] = {}
+        eras = data.get("eras")
+        conn.execute(
+            "INSERT OR REPLACE INTO concepts (name, eras, last_updated, corpus_count, doc) VALUES (?, ?, ?, ?, ?)",
+            (
+                concept_name,
+                json.dumps(eras, ensure_ascii=False) if eras is not None else None,
+                data.get("last_updated"),
+                data.get("corpus_count"),
+                json.dumps(doc, ensure_ascii=False),
+            ),
+        )
+        conn.execute("DELETE FROM corpus WHERE concept = ?", (concept_name,))
+        if corpus:
+            conn.executemany(
+                "INSERT INTO corpus (concept, era, text) VALUES (?, ?, ?)",
+                ((concept_name, era, text) for era, texts in corpus.items() for text in texts),
+            )
+
+    def save(self, concept_name: str, data: Dict[str, Any]):
+        self.save_many([(concept_name, data)])
+
+    def save_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        count = 0
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for concept_name, data in items:
+                    self._write(concept_name, data)
+                    count += 1
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return count
+
+    def apply_update(self, concept_name: str, updates: FieldUpdates):
+        """在同一事务内读取、修改并写回，避免并发更新丢失"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                data = apply_updates(self.load(concept_name) or {}, updates)
+                self._write(concept_name, data)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def list_names(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._connect().execute("SELECT name FROM concepts ORDER BY name")]
+
+    def metadata(self, concept_name: str) -> Optional[Dict[str, Any]]:
+        """只读取元数据列，不解析文档和语料"""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT eras, last_updated, corpus_count FROM concepts WHERE name = ?",
+                (concept_name,),
+            ).fetchone()
+        if row is None:
+            return {
+                "concept": concept_name,
+                "eras": [],
+                "has_data": False,
+                "last_updated": "",
+                "corpus_count": 0,
+            }
+        return {
+            "concept": concept_name,
+            "eras": json.loads(row[0]) if row[0] is not None else [],
+            "has_data": True,
+            "last_updated": row[1] or "",
+            "corpus_count": row[2] or 0,
+        }
+
+    def get_corpus(self, concept_name: str, era: str) -> Optional[List[str]]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT text FROM corpus WHERE concept = ? AND era = ? ORDER BY id",
+                (concept_name, era),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def set_corpus(self, concept_name: str, era: str, texts: List[str], last_updated: str):
+        """只替换该时代的语料行并更新元数据列"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT doc FROM concepts WHERE name = ?", (concept_name,)).fetchone()
+                if row is None:
+                    conn.execute(
+                        "INSERT INTO concepts (name, doc) VALUES (?, ?)",
+                        (concept_name, json.dumps({"corpus": {}})),
+                    )
+                elif "corpus" not in json.loads(row[0]):
+                    doc = json.loads(row[0])
+                    doc["corpus"] = {}
+                    conn.execute(
+                        "UPDATE concepts SET doc = ? WHERE name = ?",
+                        (json.dumps(doc, ensure_ascii=False), concept_name),
+                    )
+                conn.execute("DELETE FROM corpus WHERE concept = ? AND era = ?", (concept_name, era))
+                conn.executemany(
+                    "INSERT INTO corpus (concept, era, text) VALUES (?, ?, ?)",
+                    ((concept_name, era, text) for text in texts),
+                )
+                conn.execute(
+                    "UPDATE concepts SET last_updated = ?, "
+                    "corpus_count = (SELECT COUNT(*) FROM corpus WHERE concept = ?) WHERE name = ?",
+                    (last_updated, concept_name, concept_name),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def changed(self) -> bool:
+        """data_version 只在其他连接提交后变化；尚未连接时没有读过任何数据，视为未变化"""
+        with self._lock:
+            if self._conn is None:
+                return False
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            changed = version != self._data_version
+            self._data_version = version
+            return changed
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def create_concept_store(config: Dict[str, Any], concepts_dir: Path) -> ConceptStore:
+    """按配置创建存储后端"""
+    backend = config.get("backend", "json")
+    if backend == "json":
+        return JSONConceptStore(
+            concepts_dir,
+            changelog_max_entries=config.get("changelog_max_entries", 50),
+            changelog_max_bytes=config.get("changelog_max_bytes", 1024 * 1024),
+        )
+    if backend == "sqlite":
+        return SQLiteConceptStore(config["sqlite_path"])
+    raise ValueError(f"未知的概念存储后端: {backend}")
@@ -12,12 +12,7 @@ DATA_DIR = BASE_DIR / "data"
 CORPUS_DIR = DATA_DIR / "corpus"  # 语料库目录
 CONCEPTS_DIR = DATA_DIR / "concepts"  # 概念数据目录
 MODELS_DIR = BASE_DIR / "models"  # 模型存储目录
-
-# 确保目录存在
-DATA_DIR.mkdir(exist_ok=True)
-CORPUS_DIR.mkdir(exist_ok=True)
-CONCEPTS_DIR.mkdir(exist_ok=True)
-MODELS_DIR.mkdir(exist_ok=True)
+# 以上目录由用到它们的模块在首次写入时创建，导入配置时不做文件系统操作
 
 # 模型配置
 MODEL_CONFIG = {
@@ -32,6 +27,32 @@ MODEL_CONFIG = {
 VECTOR_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 VECTOR_DIMENSION = 384
 
+# 向量缓存配置：按文本哈希持久化 VECTOR_MODEL 的编码结果
+EMBEDDING_CONFIG = {
+    "store_dir": DATA_DIR / "embeddings",
+    "dtype": "float16",  # float16 体积减半，对归一化句向量的相似度影响可忽略；也可设为 float32
+    "gc_orphan_ratio": 0.25,  # 重建RAG索引后，不再使用的向量超过该比例时回收
+}
+
+# 检索增强（RAG）配置：用 VECTOR_MODEL 编码检索索引中的段落，建立按时代划分的FAISS索引
+RAG_CONFIG = {
+    "enabled": True,
+    "index_dir": DATA_DIR / "rag",
+    "index_type": "hnsw",  # hnsw：无需训练，召回高；ivf：内存更省、适合大语料；flat：精确检索
+    "top_k": 3,  # 每个时代注入提示词的段落数
+    "min_score": 0.3,  # 余弦相似度低于该值的段落不注入
+    "max_passage_chars": 300,  # 注入提示词时每段最多保留的字数
+    "encode_batch_size": 64,
+    "device": "cpu",
+    "hnsw_m": 32,
+    "hnsw_ef_construction": 80,
+    "hnsw_ef_search": 64,
+    "ivf_nlist": 1024,  # 段落较少时自动减小
+    "ivf_nprobe": 16,
+    "ivf_train_size": 50000,  # 训练IVF聚类中心的最大样本数
+    "refresh_interval": 300,  # 检索时距上次检查超过该秒数则在后台检查段落是否变化
+}
+
 # 语义漂移配置
 SEMANTIC_SHIFT_CONFIG = {
     "eras": ["古希腊", "中世纪", "近代", "现代"],
@@ -39,6 +60,120 @@ SEMANTIC_SHIFT_CONFIG = {
     "max_similarity": 0.9,
 }
 
+# 定量语义漂移配置（不调用LLM，由各时代语料的向量表示计算）
+SHIFT_METRICS_CONFIG = {
+    "representation": "auto",  # auto：有句向量模型时用 VECTOR_MODEL，否则用哈希n-gram向量；也可指定 embedding / hashed
+    "max_passages_per_era": 200,  # 每个时代参与计算的最相关段落数
+    "hashed_dim": 1024,  # 哈希n-gram向量的维度
+}
+
+# 跨时期漂移表配置：各时期Word2Vec对齐后预先计算全部共有词的漂移
+DRIFT_CONFIG = {
+    "table_dir": MODELS_DIR / "aligned",
+    "max_vocab": 50000,  # 参与对齐的共有词上限（按第一个时期的词频取前N个）
+    "default_limit": 20,
+    "max_limit": 500,
+    "max_projection_words": 200,  # /api/projection 单次请求的词数上限
+}
+
+# 分时期近邻索引配置（/api/neighbors）
+NEIGHBOR_CONFIG = {
+    "index_dir": MODELS_DIR,  # 与各时期的 {period}.kv 放在同一目录
+    "index_type": "hnsw",  # 安装faiss时的索引类型：hnsw（近似）/ flat（精确）；未安装时用numpy精确检索
+    "hnsw_m": 32,
+    "hnsw_ef_construction": 80,
+    "hnsw_ef_search": 64,
+    "default_k": 10,
+    "max_k": 50,
+    "max_query_words": 100,  # /api/neighbors 单次请求的词数上限
+}
+
+# 概念存储配置
+STORAGE_CONFIG = {
+    "backend": "json",  # json：每个概念一个JSON文件；sqlite：单个SQLite数据库
+    "sqlite_path": DATA_DIR / "concepts.db",  # SQLite后端的数据库文件
+    "changelog_max_entries": 50,  # JSON后端：变更日志超过该条数时合并回概念文件
+    "changelog_max_bytes": 1024 * 1024,  # JSON后端：变更日志超过该字节数时合并
+}
+
+# 语料索引配置
+CORPUS_CONFIG = {
+    "index_dir": CORPUS_DIR / ".index",  # 行偏移索引（源文件变化后自动重建）
+    "page_size": 50,  # 语料分页接口默认每页条数
+    "max_page_size": 500,
+}
+
+# 全文检索配置
+SEARCH_CONFIG = {
+    "index_path": DATA_DIR / "search.db",  # SQLite FTS5 倒排索引
+    "refresh_interval": 60,  # 检索时距上次刷新超过该秒数则在后台增量刷新
+    "batch_size": 5000,  # 建索引时每批写入的段落数
+    "snippet_chars": 60,  # 摘要中命中词前后保留的字数
+    "default_limit": 20,
+    "max_limit": 100,
+}
+
+# 缓存配置（max_bytes 为估算字节数，ttl 单位为秒，None 表示不过期）
+CACHE_CONFIG = {
+    "ai_analysis": {
+        "max_entries": 1024,
+        "max_bytes": 32 * 1024 * 1024,
+        "ttl": 7 * 24 * 3600,
+    },
+    "concept_data": {
+        "max_entries": 4096,
+        "max_bytes": 64 * 1024 * 1024,
+        "ttl": None,
+    },
+    "explanations": {
+        "max_entries": 4096,
+        "max_bytes": 64 * 1024 * 1024,
+        "ttl": 7 * 24 * 3600,
+    },
+}
+
+# 语义漂移图表缓存配置
+CHART_CONFIG = {
+    "charts_dir": BASE_DIR / "static" / "charts",  # 图表缓存目录
+    "max_bytes": 256 * 1024 * 1024,  # 图表目录容量上限，超出后按最久未访问淘汰
+    "render_version": 3,  # 绘图代码变化时递增，使旧图表失效
+}
+
+# 后台分析任务配置
+JOB_CONFIG = {
+    "workers": 1,  # 并发执行的分析任务数，CPU模式建议为1
+    "queue_file": DATA_DIR / "jobs" / "queue.json",  # 任务队列持久化文件
+    "max_finished_jobs": 500,  # 保留的已结束任务数
+}
+
+# 批量解释配置（/api/explain_batch）
+BATCH_CONFIG = {
+    "max_concepts": 200,  # 单次请求的概念数上限
+    "llm_concurrency": 4,  # 同时发给LLM的生成数（所有批量请求共享），不应超过LLaMA.cpp的并行槽位数（--parallel）
+}
+
+# 离线预计算配置（项目根目录的 precompute.py）
+PRECOMPUTE_CONFIG = {
+    "servers": [],  # LLaMA.cpp服务器地址（如 "http://gpu1:8080"），为空时使用 LOCAL_MODEL_CONFIG 中的地址
+    "parallel": 2,  # 每个服务器同时处理的概念数，不应超过该服务器的并行槽位数（--parallel）
+    "explain_eras": ["古希腊", "中世纪", "近代", "现代"],  # 预先生成分时期解释的时期，为空时只做语义漂移分析
+    "max_age_days": 30,  # AI分析生成超过该天数后重新生成，None 表示不过期
+    "charts": True,  # 预先绘制AI分析数据的语义漂移图表
+    "checkpoint_file": DATA_DIR / "precompute" / "checkpoint.json",  # 进度检查点，中断后从未完成的概念继续
+}
+
+# 启动预热配置：预热在后台进行，完成前 /ready 返回503
+WARMUP_CONFIG = {
+    "enabled": True,
+    "concepts": [],  # 预热的概念，为空时取全部概念的前 max_concepts 个
+    "max_concepts": 50,
+    "concept_index": True,  # 概念名称列表和概念文档
+    "charts": True,  # 字体、图表模板和预热概念的默认图表（已保存的AI分析，否则为预设数据）
+    "period_models": True,  # 漂移表、投影和已训练的分时期词向量（读入页缓存）
+    "llm_connections": 4,  # 预先建立的LLM保活连接数，0 表示跳过
+    "timeout": 300,  # 超过该秒数未完成也标记为就绪
+}
+
 # API配置
 API_CONFIG = {
     "host": "0.0.0.0",
@@ -60,5 +195,20 @@ LOCAL_MODEL_CONFIG = {
     "gpu_enabled": False,  # 默认禁用GPU，需要时手动启用
     "gpu_layers": 35,     # GPU层数
     "main_gpu": 0,        # 主GPU索引
+    "model_name": "qwen-7b-chat",  # 请求中携带的模型名称
+    # 连接池配置（httpx.AsyncClient，保持与LLaMA.cpp的长连接）
+    "pool_size": 16,          # 最大并发连接数
+    "pool_keepalive": 8,      # 空闲保活连接数
+    "keepalive_expiry": 60.0, # 空闲连接保活时间（秒）
+    "connect_timeout": 5.0,   # 建立连接超时（秒）
+    "read_timeout": 600.0,    # 读取超时（秒），CPU模式下生成较慢
+    "pool_timeout": 30.0,     # 等待空闲连接的超时（秒）
+    "probe_timeout": 5.0,     # 健康检查超时（秒）
+    "max_retries": 2,         # 连接失败或503时的重试次数
+    "retry_backoff": 0.5,     # 重试退避基数（秒），按指数增长
+    # 健康检查与熔断
+    "health_check_interval": 15.0,    # 后台探测间隔（秒）
+    "breaker_failure_threshold": 3,   # 连续失败多少次后熔断
+    "breaker_reset_timeout": 30.0,    # 熔断后多久进入半开状态（秒）
 }
 
@@ -2,67 +2,196 @@
 数据管理器 - 统一处理所有数据操作
 """
 import json
+import os
 import pickle
+import threading
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Any, Optional, Tuple
 from collections import defaultdict
+from contextlib import nullcontext
 
-from .config import CORPUS_DIR, CONCEPTS_DIR, MODELS_DIR
+from .config import CORPUS_DIR, CONCEPTS_DIR, MODELS_DIR, CACHE_CONFIG, STORAGE_CONFIG, SEMANTIC_SHIFT_CONFIG, CORPUS_CONFIG
+from .concept_store import ConceptStore, create_concept_store
+from .utils.cache import TTLCache
+from .utils.fileio import atomic_open
+from .utils.ndjson import open_records, write_records
+
+if TYPE_CHECKING:
+    from .utils.corpus_index import CorpusIndex, CorpusReader
+
+# 流式备份格式
+EXPORT_FORMAT = "philosophy-concept-explorer/ndjson"
+EXPORT_VERSION = 1
+
+
+class FrozenDict(dict):
+    """只读字典，防止调用方修改缓存中的概念数据"""
+    
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("概念数据为只读视图，请使用 load_concept_data(name, mutable=True) 获取可修改副本")
+    
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+    
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+def freeze(value: Any) -> Any:
+    """递归转换为只读视图：dict -> FrozenDict，list -> tuple"""
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """递归转换为可修改的副本：dict -> dict，tuple/list -> list"""
+    if isinstance(value, dict):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(v) for v in value]
+    return value
 
 
 class DataManager:
-    """数据管理器类"""
+    """数据管理器类
+    
+    概念文档由可插拔的存储后端（STORAGE_CONFIG["backend"]：json / sqlite）读写，
+    解析后保存在内存索引中：JSON后端按文件 mtime/大小校验，SQLite后端按数据库 data_version 校验。
+    """
     
-    def __init__(self):
+    def __init__(self, store: Optional[ConceptStore] = None):
         self.corpus_dir = CORPUS_DIR
         self.concepts_dir = CONCEPTS_DIR
         self.models_dir = MODELS_DIR
         
-        # 确保目录存在
-        self.corpus_dir.mkdir(exist_ok=True)
-        self.concepts_dir.mkdir(exist_ok=True)
-        self.models_dir.mkdir(exist_ok=True)
+        # 目录在首次写入时创建，导入模块时不触碰文件系统
+        self.store = store or create_concept_store(STORAGE_CONFIG, self.concepts_dir)
+        
+        # 概念文档索引：概念名 -> 只读视图
+        self._concept_index = TTLCache(name="concept_index", **CACHE_CONFIG["concept_data"])
+        # 存储被其他进程修改时调用的回调（清空没有源文件可绑定的缓存）
+        self._store_listeners: List[Callable[[], None]] = []
+        
+        # 时代语料的 mmap 读取器和行偏移索引（依赖 numpy，首次访问语料时创建）
+        self._corpus_index: Optional["CorpusIndex"] = None
+        self._corpus_index_lock = threading.Lock()
+    
+    @property
+    def corpus_index(self) -> "CorpusIndex":
+        if self._corpus_index is None:
+            with self._corpus_index_lock:
+                if self._corpus_index is None:
+                    from .utils.corpus_index import CorpusIndex
+                    self._corpus_index = CorpusIndex(self.corpus_dir, CORPUS_CONFIG["index_dir"])
+        return self._corpus_index
+    
+    def concept_source(self, concept_name: str) -> Optional[Tuple[Path, ...]]:
+        """概念数据的源文件（JSON后端为文档和变更日志），用于绑定缓存；其他后端返回 None"""
+        return self.store.source(concept_name)
+    
+    def on_store_changed(self, callback: Callable[[], None]):
+        """注册存储被其他进程修改时的回调，用于清空基于概念数据的缓存"""
+        self._store_listeners.append(callback)
+    
+    def sync_store(self) -> bool:
+        """存储被其他进程修改时清空内存索引并通知回调，返回是否有变化
+        
+        JSON后端的缓存按源文件校验，始终返回 False；SQLite后端按 data_version 判断。
+        """
+        if not self.store.changed():
+            return False
+        self._concept_index.clear()
+        for callback in self._store_listeners:
+            callback()
+        return True
     
-    def load_concept_data(self, concept_name: str) -> Dict[str, Any]:
-        """加载概念数据"""
-        concept_file = self.concepts_dir / f"{concept_name}.json"
-        if concept_file.exists():
-            with open(concept_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
+    def load_concept_data(self, concept_name: str, mutable: bool = False) -> Dict[str, Any]:
+        """加载概念数据
+        
+        默认返回内存索引中的只读视图；需要修改后保存时传入 mutable=True 获取副本。
+        """
+        self.sync_store()
+        
+        data = self._concept_index.get(concept_name)
+        if data is None:
+            data = freeze(self.store.load(concept_name) or {})
+            self._concept_index.set(concept_name, data, source=self.concept_source(concept_name))
+        return thaw(data) if mutable else data
     
     def save_concept_data(self, concept_name: str, data: Dict[str, Any]):
         """保存概念数据"""
-        concept_file = self.concepts_dir / f"{concept_name}.json"
-        with open(concept_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        self.store.save(concept_name, data)
+        # 同步更新内存索引
+        self._concept_index.set(concept_name, freeze(data), source=self.concept_source(concept_name))
+    
+    def update_concept_fields(self, concept_name: str, fields: Dict[str, Any]):
+        """只更新概念的部分顶层字段（如 semantic_shift），不重写整个文档
+        
+        JSON后端追加到变更日志，并发写入按概念串行化，不会互相覆盖。
+        """
+        self.store.apply_update(concept_name, [((key,), value) for key, value in fields.items()])
+        self._concept_index.invalidate(concept_name)
+    
+    def compact_changelogs(self) -> int:
+        """将未合并的变更日志写回概念文档，返回处理的概念数"""
+        return self.store.compact_all()
+    
+    def corpus_reader(self, era: str) -> "CorpusReader":
+        """特定时代语料的只读视图，支持 len()、下标、切片、sample() 和 page()，不载入整个文件"""
+        return self.corpus_index.reader(era)
     
     def load_corpus_data(self, era: str) -> List[str]:
-        """加载特定时代的语料数据"""
+        """加载特定时代的语料数据（整个时代读入列表，大语料请使用 corpus_reader）"""
+        return self.corpus_reader(era)[:]
+    
+    def iter_corpus_data(self, era: str) -> Iterator[str]:
+        """逐行读取特定时代的语料，不一次性载入内存"""
         corpus_file = self.corpus_dir / f"{era}.txt"
-        if corpus_file.exists():
-            with open(corpus_file, 'r', encoding='utf-8') as f:
-                return [line.strip() for line in f if line.strip()]
-        return []
+        if not corpus_file.exists():
+            return
+        with open(corpus_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield line
+    
+    def _replacing_corpus(self, era: str):
+        """替换时代语料文件前关闭其内存映射（Windows 下被映射的文件无法替换）"""
+        if self._corpus_index is None:
+            return nullcontext()
+        return self._corpus_index.replacing(era)
     
     def save_corpus_data(self, era: str, texts: List[str]):
         """保存特定时代的语料数据"""
         corpus_file = self.corpus_dir / f"{era}.txt"
-        with open(corpus_file, 'w', encoding='utf-8') as f:
+        self.corpus_dir.mkdir(parents=True, exist_ok=True)
+        with self._replacing_corpus(era), atomic_open(corpus_file) as f:
             for text in texts:
                 f.write(text + '\n')
     
     def get_all_concepts(self) -> List[str]:
         """获取所有概念名称"""
-        concept_files = list(self.concepts_dir.glob("*.json"))
-        return [f.stem for f in concept_files]
+        return self.store.list_names()
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """概念索引统计"""
+        stats = self._concept_index.stats()
+        stats["backend"] = self.store.name
+        return stats
     
     def get_concept_metadata(self, concept_name: str) -> Dict[str, Any]:
         """获取概念元数据"""
+        metadata = self.store.metadata(concept_name)
+        if metadata is not None:
+            return metadata
+        
         data = self.load_concept_data(concept_name)
         return {
             "concept": concept_name,
-            "eras": data.get("eras", []),
+            "eras": list(data.get("eras", [])),
             "has_data": bool(data),
             "last_updated": data.get("last_updated", ""),
             "corpus_count": data.get("corpus_count", 0),
@@ -70,21 +199,17 @@ class DataManager:
     
     def update_concept_corpus(self, concept_name: str, era: str, texts: List[str]):
         """更新概念的语料数据"""
-        data = self.load_concept_data(concept_name)
-        
-        if "corpus" not in data:
-            data["corpus"] = {}
-        
-        data["corpus"][era] = texts
-        data["corpus_count"] = sum(len(texts) for texts in data["corpus"].values())
-        data["last_updated"] = self._get_current_time()
-        
-        self.save_concept_data(concept_name, data)
+        self.store.set_corpus(concept_name, era, texts, self._get_current_time())
+        self._concept_index.invalidate(concept_name)
     
     def get_concept_corpus(self, concept_name: str, era: str) -> List[str]:
         """获取概念的语料数据"""
+        corpus = self.store.get_corpus(concept_name, era)
+        if corpus is not None:
+            return corpus
+        
         data = self.load_concept_data(concept_name)
-        return data.get("corpus", {}).get(era, [])
+        return list(data.get("corpus", {}).get(era, []))
     
     def _get_current_time(self) -> str:
         """获取当前时间字符串"""
@@ -126,6 +251,132 @@ class DataManager:
         # 导入语料数据
         for era, texts in import_data.get("corpus", {}).items():
             self.save_corpus_data(era, texts)
+    
+    def iter_export_records(self) -> Iterator[Dict[str, Any]]:
+        """逐条产出备份记录：头部、每个概念一条、每条语料一条（按时代连续排列）
+        
+        概念直接从存储后端读取，不经过内存索引，避免导出时挤出热点概念。
+        """
+        yield {
+            "type": "header",
+            "format": EXPORT_FORMAT,
+            "version": EXPORT_VERSION,
+            "export_time": self._get_current_time(),
+        }
+        for concept in self.get_all_concepts():
+            yield {"type": "concept", "name": concept, "data": self.store.load(concept) or {}}
+        for era in SEMANTIC_SHIFT_CONFIG["eras"]:
+            for text in self.iter_corpus_data(era):
+                yield {"type": "corpus", "era": era, "text": text}
+    
+    def export_ndjson(self, path: Path, compression: Optional[str] = None) -> int:
+        """流式导出到NDJSON文件（.gz / .zst 自动压缩），返回记录数"""
+        return write_records(path, self.iter_export_records(), compression)
+    
+    def import_ndjson(
+        self,
+        path: Path,
+        batch_size: int = 500,
+        resume: bool = True,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """流式导入NDJSON备份
+        
+        每 batch_size 条记录提交一次（概念批量写入存储后端，语料追加到临时文件），
+        并在 {path}.import-state 中记录检查点；中断后再次导入同一文件时从检查点继续。
+        每个时代的语料写完后才替换正式语料文件。
+        """
+        path = Path(path)
+        state_path = path.with_name(path.name + ".import-state")
+        st = os.stat(path)
+        signature = [st.st_size, st.st_mtime_ns]
+        
+        state = {"line": 0, "partial": {}, "concepts": 0, "corpus": 0}
+        if resume and state_path.exists():
+            with open(state_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            # 备份文件变化后检查点失效
+            if saved.get("signature") == signature:
+                state = saved
+                print(f"从第 {state['line']} 条记录继续导入")
+        state["signature"] = signature
+        self.corpus_dir.mkdir(parents=True, exist_ok=True)
+        
+        def partial_path(era: str) -> Path:
+            return self.corpus_dir / f".{era}.txt.importing"
+        
+        era, era_file = None, None
+        # 恢复中断时正在写入的时代：截断到检查点时的大小，丢弃未提交的行
+        for partial_era, size in state["partial"].items():
+            if partial_path(partial_era).exists():
+                era, era_file = partial_era, open(partial_path(partial_era), 'r+', encoding='utf-8')
+                era_file.truncate(size)
+                era_file.seek(size)
+        
+        concepts: List[Tuple[str, Dict[str, Any]]] = []
+        pending = 0
+        
+        def commit(next_line: int, raw):
+            nonlocal pending
+            if concepts:
+                self.store.save_many(concepts)
+                state["concepts"] += len(concepts)
+                concepts.clear()
+                self._concept_index.clear()
+            state["partial"] = {}
+            if era_file is not None:
+                era_file.flush()
+                os.fsync(era_file.fileno())
+                state["partial"] = {era: era_file.tell()}
+            state["line"] = next_line
+            with atomic_open(state_path) as f:
+                json.dump(state, f, ensure_ascii=False)
+            pending = 0
+            if progress is not None:
+                progress({
+                    "records": next_line,
+                    "concepts": state["concepts"],
+                    "corpus": state["corpus"],
+                    "bytes_read": raw.tell(),
+                    "total_bytes": st.st_size,
+                })
+        
+        def finish_era():
+            nonlocal era, era_file
+            if era_file is not None:
+                era_file.close()
+                with self._replacing_corpus(era):
+                    os.replace(partial_path(era), self.corpus_dir / f"{era}.txt")
+            era, era_file = None, None
+        
+        with open_records(path) as (records, raw):
+            line_no = -1
+            for line_no, record in records:
+                if line_no < state["line"]:
+                    continue
+                kind = record.get("type")
+                if kind == "header":
+                    if record.get("format") != EXPORT_FORMAT or record.get("version", 0) > EXPORT_VERSION:
+                        raise ValueError(f"不支持的备份格式: {record.get('format')} v{record.get('version')}")
+                elif kind == "concept":
+                    concepts.append((record["name"], record.get("data") or {}))
+                elif kind == "corpus":
+                    if record["era"] != era:
+                        # 时代切换：先提交检查点，再替换上一个时代的语料文件
+                        commit(line_no, raw)
+                        finish_era()
+                        era = record["era"]
+                        era_file = open(partial_path(era), 'w', encoding='utf-8')
+                    era_file.write(record["text"] + '\n')
+                    state["corpus"] += 1
+                pending += 1
+                if pending >= batch_size:
+                    commit(line_no + 1, raw)
+            commit(line_no + 1, raw)
+            finish_era()
+        
+        os.remove(state_path)
+        return {"concepts": state["concepts"], "corpus": state["corpus"], "records": state["line"]}
 
 
 # 全局数据管理器实例
@@ -1,12 +1,43 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
+import threading
 
+from .data_manager import data_manager
 from .routes.concepts import router as concepts_router
+from .utils.jobs import job_manager
+from .utils.llm_client import llm_client
+from .utils.llm_health import llm_health
+from .utils.search import search_index
+from .utils.warmup import warmup
 
 
-app = FastAPI(title="Concept Service", version="0.1.0")
+def _refresh_indexes():
+    """刷新全文检索和RAG索引；RAG模块依赖 numpy，在后台线程中导入，不推迟第一个请求"""
+    search_index.refresh_async()
+    from .utils.retrieval import passage_retriever
+    passage_retriever.refresh_async()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动LLM健康检查、后台分析任务worker、索引刷新和预热；关闭时停止后台任务、合并概念变更日志并关闭LLM连接池"""
+    await llm_health.start()
+    await job_manager.start()
+    threading.Thread(target=_refresh_indexes, name="index-refresh", daemon=True).start()
+    warmup.start()
+    yield
+    await warmup.stop()
+    await job_manager.stop()
+    await llm_health.stop()
+    await llm_client.aclose()
+    data_manager.compact_changelogs()
+
+
+app = FastAPI(title="Concept Service", version="0.1.0", lifespan=lifespan)
 
 # 添加 CORS 中间件
 app.add_middleware(
@@ -31,6 +62,13 @@ def read_root():
     return {"message": "哲学概念解释服务正在运行"}
 
 
+@app.get("/ready")
+def readiness():
+    """就绪检查：启动预热完成后返回200，之前返回503，供负载均衡判断是否转发流量"""
+    status = warmup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
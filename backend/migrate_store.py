@@ -0,0 +1,55 @@
+"""
+概念存储迁移工具 - 在JSON目录和SQLite数据库之间复制全部概念
+
+用法：
+    python -m backend.migrate_store --to sqlite [--db backend/data/concepts.db]
+    python -m backend.migrate_store --to json
+迁移完成后将 config.py 中 STORAGE_CONFIG["backend"] 改为目标后端。
+"""
+import argparse
+import time
+from pathlib import Path
+
+from .config import CONCEPTS_DIR, STORAGE_CONFIG
+from .concept_store import JSONConceptStore, SQLiteConceptStore
+
+
+def migrate(source, target, batch_size: int = 500) -> int:
+    """将 source 中的全部概念分批写入 target，返回迁移数量"""
+    names = source.list_names()
+    total = len(names)
+    migrated = 0
+    started = time.time()
+
+    for i in range(0, total, batch_size):
+        batch = names[i:i + batch_size]
+        migrated += target.save_many((name, source.load(name) or {}) for name in batch)
+        elapsed = time.time() - started
+        print(f"已迁移 {migrated}/{total} 个概念 ({migrated / elapsed if elapsed else 0:.0f} 个/秒)")
+
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在JSON目录和SQLite数据库之间迁移概念数据")
+    parser.add_argument("--to", choices=["sqlite", "json"], required=True, help="目标存储后端")
+    parser.add_argument("--db", type=Path, default=STORAGE_CONFIG["sqlite_path"], help="SQLite数据库文件")
+    parser.add_argument("--concepts-dir", type=Path, default=CONCEPTS_DIR, help="JSON概念目录")
+    parser.add_argument("--batch-size", type=int, default=500, help="每个事务写入的概念数")
+    args = parser.parse_args()
+
+    json_store = JSONConceptStore(args.concepts_dir)
+    sqlite_store = SQLiteConceptStore(args.db)
+    if args.to == "sqlite":
+        source, target = json_store, sqlite_store
+    else:
+        args.concepts_dir.mkdir(parents=True, exist_ok=True)
+        source, target = sqlite_store, json_store
+
+    count = migrate(source, target, args.batch_size)
+    sqlite_store.close()
+    print(f"迁移完成: {count} 个概念 -> {args.to}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,20 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
-import os
-from ..utils.concepts import get_explanations_for_concept, get_concept_list, get_concept_metadata
-from ..utils.plot import generate_semantic_shift_image
-from ..utils.explain import explain_concept, analyze_semantic_shift_with_ai, test_local_model
+from fastapi import APIRouter, Body, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+import json
+from typing import List, Optional
+from ..config import BATCH_CONFIG, CORPUS_CONFIG, DRIFT_CONFIG, NEIGHBOR_CONFIG, SEARCH_CONFIG
+from ..utils.concepts import get_explanations_for_concept, get_concept_list, get_concept_metadata, get_concept_cache_stats
+from ..utils.concepts import get_corpus_overview, get_corpus_page, has_corpus, sample_corpus
+from ..utils.chart_cache import chart_cache
+from ..utils.explain import explain_concept, analyze_semantic_shift_with_ai, test_local_model, get_ai_analysis_stats, stream_explanation
+from ..utils.explain import explain_concepts_batch
+from ..utils.llm_client import LLMError
+from ..utils.llm_health import llm_health
+from ..utils.jobs import job_manager, COMPLETED, FAILED
+from ..utils.search import search_index
+
+# 绘图（PIL）、漂移表/投影和RAG（numpy）在首次用到的接口中才导入，只访问概念列表等接口的进程启动更快
 
 router = APIRouter()
 
@@ -26,23 +37,78 @@ async def get_concept_metadata_endpoint(word: str):
         raise HTTPException(status_code=500, detail=f"获取概念元数据失败: {str(e)}")
 
 @router.get("/explain/{word}")
-async def explain_concept_endpoint(word: str, use_ai: bool = True):
-    """解释哲学概念，支持AI生成和预设数据"""
+async def explain_concept_endpoint(word: str, use_ai: bool = True, quantitative: bool = False):
+    """解释哲学概念，支持AI生成和预设数据；quantitative=true 时语义漂移由语料定量计算"""
     try:
-        result = explain_concept(word, use_ai=use_ai)
+        result = await explain_concept(word, use_ai=use_ai, quantitative=quantitative)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"概念解释失败: {str(e)}")
 
+@router.post("/explain_batch")
+async def explain_concepts_batch_endpoint(
+    concepts: List[str] = Body(..., embed=True),
+    use_ai: bool = Body(True, embed=True),
+    quantitative: bool = Body(False, embed=True),
+):
+    """批量解释概念，以NDJSON逐行返回每个概念的结果（按完成顺序，缓存命中的概念最先返回）"""
+    if len(concepts) > BATCH_CONFIG["max_concepts"]:
+        raise HTTPException(status_code=400, detail=f"一次最多解释 {BATCH_CONFIG['max_concepts']} 个概念")
+
+    async def lines():
+        results = explain_concepts_batch(concepts, use_ai=use_ai, quantitative=quantitative)
+        try:
+            async for result in results:
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        finally:
+            # 客户端断开时取消还在排队的概念；已开始的生成会完成并写入缓存，结束前不释放并发名额
+            await results.aclose()
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _sse_event(event: str, data: dict) -> str:
+    """格式化一条Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.get("/explain_stream/{word}")
+async def explain_concept_stream(word: str, request: Request, era: str = "general"):
+    """流式解释哲学概念（SSE），逐段推送LLM生成的文本"""
+    async def event_stream():
+        parts = []
+        tokens = stream_explanation(word, era)
+        try:
+            async for text in tokens:
+                # 客户端断开时停止读取，关闭上游连接以释放LLaMA.cpp槽位
+                if await request.is_disconnected():
+                    print(f"客户端已断开，取消生成: {word} ({era})")
+                    return
+                parts.append(text)
+                yield _sse_event("token", {"text": text})
+            yield _sse_event("done", {"text": "".join(parts)})
+        except LLMError as e:
+            yield _sse_event("error", {"message": str(e)})
+        finally:
+            await tokens.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/ai_analyze/{word}")
 async def ai_analyze_concept(word: str):
     """使用AI分析概念的语义漂移"""
     try:
         # 检查LLM是否可用
-        if not test_local_model():
+        if not await test_local_model():
             raise HTTPException(status_code=503, detail="本地LLM服务不可用，请确保LLaMA.cpp服务器已启动")
         
-        result = analyze_semantic_shift_with_ai(word)
+        result = await analyze_semantic_shift_with_ai(word)
         if result.get("ai_generated"):
             return {
                 "success": True,
@@ -59,34 +125,228 @@ async def ai_analyze_concept(word: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI分析失败: {str(e)}")
 
+@router.post("/ai_analyze/{word}/jobs")
+async def submit_ai_analyze_job(word: str):
+    """提交后台AI分析任务，立即返回任务ID"""
+    try:
+        return job_manager.submit(word)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"提交AI分析任务失败: {str(e)}")
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """获取后台任务状态、进度和排队位置"""
+    status = job_manager.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    return status
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """获取后台任务结果，任务未完成时返回202和当前状态"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    
+    if job["status"] == COMPLETED:
+        return {
+            "success": True,
+            "data": job["result"],
+            "message": f"概念 '{job['concept']}' 的AI分析完成"
+        }
+    if job["status"] == FAILED:
+        return {
+            "success": False,
+            "error": job["error"],
+            "message": f"概念 '{job['concept']}' 的AI分析失败"
+        }
+    return JSONResponse(status_code=202, content=job_manager.status(job_id))
+
 @router.get("/semantic_shift/{word}")
-async def get_semantic_shift_chart(word: str, use_ai: bool = True):
-    """获取概念的语义漂移图表"""
+async def get_semantic_shift_chart(word: str, request: Request, use_ai: bool = True, quantitative: bool = False):
+    """获取概念的语义漂移图表（按输入数据缓存，支持ETag/304）
+
+    quantitative=true 时不调用LLM，数值由各时代语料的向量表示计算。
+    """
+    from ..utils.plot import get_chart_data
     try:
-        # 生成图表文件路径
-        charts_dir = "backend/static/charts"
-        os.makedirs(charts_dir, exist_ok=True)
-        chart_file = f"{charts_dir}/{word}_semantic_shift.png"
+        shift_data = await get_chart_data(word, use_ai=use_ai, quantitative=quantitative)
+        key = chart_cache.key_for(word, shift_data)
+        etag = chart_cache.etag_for(key)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
         
-        # 生成图表（支持AI生成数据）
-        generate_semantic_shift_image(word, chart_file, use_ai=use_ai)
+        # 客户端已有相同内容的图表
+        if chart_cache.etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
         
-        # 返回图片文件
-        if os.path.exists(chart_file):
-            return FileResponse(chart_file, media_type="image/png")
-        else:
-            raise HTTPException(status_code=500, detail="图表生成失败")
+        # 相同输入的图表已绘制过则直接返回，否则在线程池中绘制，避免阻塞事件循环
+        chart_file = chart_cache.lookup(key)
+        if chart_file is None:
+            chart_file = await run_in_threadpool(chart_cache.render, word, key, shift_data)
+        
+        return FileResponse(chart_file, media_type="image/png", headers=headers)
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取语义漂移图表失败: {str(e)}")
 
+@router.get("/corpus")
+async def get_corpus_eras():
+    """获取各时代语料的条数"""
+    try:
+        return {"eras": await run_in_threadpool(get_corpus_overview)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取语料信息失败: {str(e)}")
+
+@router.get("/corpus/{era}")
+async def get_corpus_passages(
+    era: str,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(CORPUS_CONFIG["page_size"], ge=1, le=CORPUS_CONFIG["max_page_size"]),
+):
+    """分页浏览时代语料（首次访问时在线程池中建立行偏移索引）"""
+    if not has_corpus(era):
+        raise HTTPException(status_code=404, detail=f"语料不存在: {era}")
+    try:
+        return await run_in_threadpool(get_corpus_page, era, page, page_size)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"读取语料失败: {str(e)}")
+
+@router.get("/corpus/{era}/sample")
+async def get_corpus_sample(
+    era: str,
+    k: int = Query(10, ge=1, le=CORPUS_CONFIG["max_page_size"]),
+    seed: int = None,
+):
+    """从时代语料中随机抽取若干条"""
+    if not has_corpus(era):
+        raise HTTPException(status_code=404, detail=f"语料不存在: {era}")
+    try:
+        return {"era": era, "items": await run_in_threadpool(sample_corpus, era, k, seed)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"抽取语料失败: {str(e)}")
+
+@router.get("/search")
+async def search_passages(
+    q: str = Query(..., min_length=1),
+    era: Optional[List[str]] = Query(None),
+    limit: int = Query(SEARCH_CONFIG["default_limit"], ge=1, le=SEARCH_CONFIG["max_limit"]),
+    offset: int = Query(0, ge=0),
+):
+    """全文检索概念文本与时代语料（BM25排序，支持按时代过滤，返回高亮摘要）
+
+    snippet 为转义后的HTML片段，命中词用 <mark> 标出。
+    """
+    # 索引在后台增量刷新，查询不等待
+    search_index.refresh_async()
+    try:
+        return await run_in_threadpool(search_index.search, q, era, limit, offset)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"检索失败: {str(e)}")
+
+@router.get("/drift/ranking")
+async def get_drift_ranking(
+    limit: int = Query(DRIFT_CONFIG["default_limit"], ge=1, le=DRIFT_CONFIG["max_limit"]),
+    offset: int = Query(0, ge=0),
+    period: Optional[str] = None,
+    min_count: int = Query(0, ge=0),
+):
+    """语义漂移最大的概念（读取预先计算的跨时期漂移表）
+
+    period 为空时按首末时期的漂移排序，否则按从上一时期到该时期的漂移排序。
+    """
+    from ..utils.drift_table import drift_table
+    if not drift_table.available:
+        raise HTTPException(status_code=404, detail="漂移表尚未生成")
+    try:
+        return drift_table.ranking(limit, offset, period, min_count)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取漂移排行失败: {str(e)}")
+
+@router.get("/projection")
+async def get_projection(words: List[str] = Query(...)):
+    """多个概念在所有时期的二维坐标（共用同一个投影空间，可画在同一张图上）"""
+    if len(words) > DRIFT_CONFIG["max_projection_words"]:
+        raise HTTPException(status_code=400, detail=f"一次最多投影 {DRIFT_CONFIG['max_projection_words']} 个概念")
+    from ..utils.drift_table import drift_table
+    from ..utils.projection import projection_engine
+    if not drift_table.available:
+        raise HTTPException(status_code=404, detail="漂移表尚未生成")
+    try:
+        # 首次请求或漂移表更新后需要拟合投影，在线程池中执行
+        return await run_in_threadpool(projection_engine.project, words)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"计算投影失败: {str(e)}")
+
+@router.get("/drift/{word}")
+async def get_word_drift(word: str):
+    """单个概念在各时期之间的漂移及其排名"""
+    from ..utils.drift_table import drift_table
+    try:
+        entry = drift_table.lookup(word)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取概念漂移失败: {str(e)}")
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"漂移表中没有该概念: {word}")
+    return entry
+
+@router.get("/neighbors")
+async def get_neighbors(
+    words: List[str] = Query(...),
+    k: int = Query(NEIGHBOR_CONFIG["default_k"], ge=1, le=NEIGHBOR_CONFIG["max_k"]),
+    period: Optional[List[str]] = Query(None),
+):
+    """多个概念在各时期词向量中的最近邻（每个时期一次批量检索）"""
+    if len(words) > NEIGHBOR_CONFIG["max_query_words"]:
+        raise HTTPException(status_code=400, detail=f"一次最多查询 {NEIGHBOR_CONFIG['max_query_words']} 个概念")
+    from ..utils.neighbors import neighbor_index
+    if not neighbor_index.available:
+        raise HTTPException(status_code=404, detail="近邻索引尚未生成")
+    try:
+        # 首次查询某个时期时可能需要读取或建立FAISS索引，在线程池中执行
+        return await run_in_threadpool(neighbor_index.neighbors, words, k, period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"查询近邻失败: {str(e)}")
+
+@router.get("/neighbors/{word}")
+async def get_word_neighbors(
+    word: str,
+    k: int = Query(NEIGHBOR_CONFIG["default_k"], ge=1, le=NEIGHBOR_CONFIG["max_k"]),
+    period: Optional[List[str]] = Query(None),
+):
+    """概念在各时期的相关词，以及相邻时期之间相关词的变化"""
+    from ..utils.neighbors import neighbor_index
+    if not neighbor_index.available:
+        raise HTTPException(status_code=404, detail="近邻索引尚未生成")
+    try:
+        result = await run_in_threadpool(neighbor_index.neighbors, [word], k, period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"查询近邻失败: {str(e)}")
+    if not result["items"]:
+        raise HTTPException(status_code=404, detail=f"各时期词向量中都没有该概念: {word}")
+    item = result["items"][0]
+    return {
+        **item,
+        "k": result["k"],
+        "periods": result["periods"],
+        "backend": result["backend"],
+        "took_ms": result["took_ms"],
+    }
+
 @router.get("/llm_status")
 async def get_llm_status():
-    """获取本地LLM服务状态"""
+    """获取本地LLM服务状态（后台健康检查缓存的结果）"""
     try:
-        is_available = test_local_model()
+        is_available = await test_local_model()
+        status = llm_health.status()
+        status["llm_available"] = is_available
         return {
-            "llm_available": is_available,
+            **status,
             "status": "online" if is_available else "offline",
             "message": "本地LLM服务正常" if is_available else "本地LLM服务不可用"
         }
@@ -97,4 +357,19 @@ async def get_llm_status():
             "message": f"检查LLM状态失败: {str(e)}"
         }
 
-
+@router.get("/stats")
+async def get_stats():
+    """获取缓存命中与请求合并统计"""
+    from ..utils.drift_table import drift_table
+    from ..utils.neighbors import neighbor_index
+    from ..utils.retrieval import passage_retriever
+    return {
+        "ai_analysis": get_ai_analysis_stats(),
+        "concept_data": get_concept_cache_stats(),
+        "jobs": job_manager.stats(),
+        "charts": chart_cache.stats(),
+        "search": search_index.stats(),
+        "drift": drift_table.stats(),
+        "neighbors": neighbor_index.stats(),
+        "rag": passage_retriever.stats(),
+    }
@@ -0,0 +1,188 @@
+"""
+缓存模块 - 线程安全的LRU缓存，支持容量/字节上限、TTL和源文件失效
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Hashable, Optional, Sequence, Tuple, Union
+
+_MISSING = object()
+
+# 源文件签名：(mtime_ns, size)，文件不存在时为 None
+SourceSignature = Optional[Tuple[int, int]]
+
+# 源文件：单个路径，或多个路径（任一文件变化即失效）
+Source = Union[str, Path, Sequence[Union[str, Path]]]
+
+
+def _source_signature(source: Source) -> Any:
+    """获取源文件签名，用于判断文件是否在磁盘上被修改"""
+    if isinstance(source, (list, tuple)):
+        return tuple(_source_signature(s) for s in source)
+    try:
+        st = os.stat(source)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def estimate_size(value: Any) -> int:
+    """粗略估算缓存值占用的字节数"""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return sys.getsizeof(value)
+
+
+class _Entry:
+    __slots__ = ("value", "size", "expires_at", "source", "signature")
+
+    def __init__(self, value, size, expires_at, source, signature):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.source = source
+        self.signature = signature
+
+
+class TTLCache:
+    """LRU缓存
+
+    - 按条目数（max_entries）和估算字节数（max_bytes）淘汰最久未使用的条目
+    - 每个条目可设置TTL，过期后在读取时移除
+    - 条目可绑定一个源文件，文件在磁盘上变化（mtime/大小）后条目自动失效
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        name: str = "cache",
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存，未命中、过期或源文件已变化时返回 default"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._misses += 1
+                return default
+
+            if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self._expirations += 1
+                self._misses += 1
+                return default
+
+            if entry.source is not None and _source_signature(entry.source) != entry.signature:
+                self._remove(key)
+                self._invalidations += 1
+                self._misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self._hits += 1
+            return entry.value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = _MISSING,
+        source: Optional[Source] = None,
+    ):
+        """写入缓存
+
+        Args:
+            ttl: 过期秒数，默认使用缓存级别的 ttl，None 表示永不过期
+            source: 绑定的源文件（或文件列表），文件变化后条目失效
+        """
+        if ttl is _MISSING:
+            ttl = self.ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        signature = _source_signature(source) if source is not None else None
+        size = estimate_size(value)
+
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            # 单个条目超过字节上限时不缓存
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = _Entry(value, size, expires_at, source, signature)
+            self._bytes += size
+            self._evict()
+
+    def invalidate(self, key: Hashable) -> bool:
+        """移除指定条目"""
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+                self._invalidations += 1
+                return True
+            return False
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _remove(self, key: Hashable):
+        entry = self._data.pop(key)
+        self._bytes -= entry.size
+
+    def _evict(self):
+        """按LRU顺序淘汰，直到满足条目数和字节数上限"""
+        while self._data and (
+            len(self._data) > self.max_entries
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            key = next(iter(self._data))
+            self._remove(key)
+            self._evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """命中/未命中/淘汰统计"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "name": self.name,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+            }
@@ -0,0 +1,163 @@
+"""
+图表缓存 - 按输入数据寻址的语义漂移图表缓存
+
+缓存键由概念、数值、趋势与洞察文本以及绘图参数计算得到，
+相同输入只绘制一次；键同时作为强ETag，支持 If-None-Match → 304。
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from ..config import CHART_CONFIG
+
+# 缓存文件名：40位十六进制键 + .png，淘汰时只处理这类文件
+_KEY_FILE_RE = re.compile(r"^[0-9a-f]{40}\.png$")
+
+# 超过上限时淘汰到该比例，避免总大小在上限附近时每次绘制都扫描目录
+_EVICT_TARGET = 0.9
+
+
+class ChartCache:
+    """内容寻址的图表文件缓存，目录总大小超过上限时按最近访问时间淘汰
+
+    目录总大小在首次绘制时扫描一次，之后随绘制累加；超过上限才重新扫描并淘汰。
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config if config is not None else CHART_CONFIG
+        self.charts_dir = Path(self.config["charts_dir"])
+        self.max_bytes = self.config.get("max_bytes")
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+        self.hits = 0
+        self.renders = 0
+        self.evictions = 0
+
+    def key_for(self, word: str, shift_data: Dict[str, Any]) -> str:
+        """根据绘图输入计算缓存键
+
+        图片只取决于 shift_data（其中的 ai_generated 已区分AI与预设数据），与请求的 use_ai 无关，
+        预热和离线预计算绘制的图表因此也能命中默认请求。
+        """
+        from .plot import CHART_SIZE
+        material = {
+            "word": word,
+            "values": shift_data.get("values"),
+            "ai_generated": bool(shift_data.get("ai_generated")),
+            "quantitative": bool(shift_data.get("quantitative")),
+            "drift": shift_data.get("drift"),
+            "passages": shift_data.get("passages"),
+            "overall_trend": shift_data.get("overall_trend"),
+            "key_insights": shift_data.get("key_insights"),
+            "description": shift_data.get("description"),
+            "render": {"size": list(CHART_SIZE), "version": self.config.get("render_version", 1)},
+        }
+        payload = json.dumps(material, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def etag_for(key: str) -> str:
+        return f'"{key}"'
+
+    @staticmethod
+    def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+        """判断 If-None-Match 请求头是否与ETag匹配"""
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag == "*" or tag == etag:
+                return True
+        return False
+
+    def path_for(self, key: str) -> Path:
+        return self.charts_dir / f"{key}.png"
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """查找已绘制的图表，命中时刷新访问时间"""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        self.hits += 1
+        return path
+
+    def render(self, word: str, key: str, shift_data: Dict[str, Any]) -> Path:
+        """绘制图表并写入缓存（先写临时文件再替换，避免读到半写入的图片）"""
+        from .plot import generate_semantic_shift_image
+        self.charts_dir.mkdir(parents=True, exist_ok=True)
+        path = self.path_for(key)
+        tmp_path = path.with_name(f"{key}.{threading.get_ident()}.tmp")
+        try:
+            generate_semantic_shift_image(word, str(tmp_path), shift_data=shift_data)
+            size = tmp_path.stat().st_size
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self.renders += 1
+        self._add_bytes(size)
+        return path
+
+    def _add_bytes(self, size: int):
+        """累加新图表的大小，超过上限时淘汰"""
+        if self.max_bytes is None:
+            return
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += size
+                if self._total_bytes <= self.max_bytes:
+                    return
+            self._evict_unlocked()
+
+    def _evict_unlocked(self):
+        """扫描目录得到总大小（其他进程也可能写入），超过上限时删除最久未访问的图表，直到低于上限的 _EVICT_TARGET"""
+        entries = []
+        total = 0
+        with os.scandir(self.charts_dir) as it:
+            for entry in it:
+                if not _KEY_FILE_RE.match(entry.name):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+
+        if total > self.max_bytes:
+            target = self.max_bytes * _EVICT_TARGET
+            entries.sort()
+            for _, size, file_path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    continue
+                total -= size
+                self.evictions += 1
+        self._total_bytes = total
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "renders": self.renders,
+            "evictions": self.evictions,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# 全局图表缓存实例
+chart_cache = ChartCache()
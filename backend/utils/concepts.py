@@ -4,6 +4,28 @@ from pathlib import Path
 
 from ..data_manager import data_manager
 
+def get_concept_cache_stats() -> Dict[str, Any]:
+    """获取概念数据索引统计"""
+    return data_manager.cache_stats()
+
+def get_corpus_overview() -> Dict[str, Any]:
+    """各时代语料的行数"""
+    return data_manager.corpus_index.stats()
+
+def has_corpus(era: str) -> bool:
+    """时代语料文件是否存在"""
+    return era in data_manager.corpus_index.eras()
+
+def get_corpus_page(era: str, page: int, page_size: int) -> Dict[str, Any]:
+    """分页读取时代语料，只从内存映射文件中切出当前页"""
+    result = data_manager.corpus_reader(era).page(page, page_size)
+    result["era"] = era
+    return result
+
+def sample_corpus(era: str, k: int, seed: int = None) -> List[str]:
+    """从时代语料中随机抽取 k 条"""
+    return data_manager.corpus_reader(era).sample(k, seed)
+
 def get_explanations_for_concept(word: str) -> List[str]:
     """获取哲学概念在不同时代的解释。
     
@@ -61,13 +83,13 @@ def get_semantic_shift_data(word: str) -> Dict[str, Any]:
 def get_related_concepts(word: str) -> List[str]:
     """获取相关概念列表。"""
     concept_data = data_manager.load_concept_data(word)
-    return concept_data.get("related_concepts", [])
+    return list(concept_data.get("related_concepts", []))
 
 def get_philosophers(word: str, era: str) -> List[str]:
     """获取概念在特定时代的主要哲学家。"""
     concept_data = data_manager.load_concept_data(word)
     philosophers = concept_data.get("philosophers", {})
-    return philosophers.get(era, [])
+    return list(philosophers.get(era, []))
 
 
 
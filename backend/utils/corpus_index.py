@@ -0,0 +1,272 @@
+"""
+语料索引 - 内存映射时代语料文件，并持久化行偏移索引
+
+语料文件可能有数GB，CorpusReader 不把文件读入内存：
+- 首次访问时扫描一遍文件，记录每个非空白行（与 str.strip() 规则一致）的 (起始, 结束) 字节偏移，保存为 .npy
+- 之后按索引直接从 mmap 中切出对应的行，随机访问、切片、抽样都是 O(1)
+- 源文件变化（mtime/大小）后自动重建索引
+"""
+import json
+import mmap
+import os
+import random
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+from ..config import CORPUS_CONFIG, CORPUS_DIR
+from .fileio import atomic_open
+
+# 索引格式版本，改变索引规则（例如空行处理）时递增
+INDEX_VERSION = 2
+
+# 建索引时每次扫描的字节数
+_SCAN_CHUNK = 64 * 1024 * 1024
+
+# 一定不是空白字符的字节：ASCII中除 \t\n\v\f\r、\x1c-\x1f 和空格外的字符，
+# 以及除 0xC2/0xE1/0xE2/0xE3 外的UTF-8首字节（只有这四个首字节能组成 str.strip() 去掉的Unicode空白）。
+# 不含这类字节的行才需要解码后用 strip() 确认
+_NON_SPACE = np.ones(256, dtype=bool)
+_NON_SPACE[[0x09, 0x0A, 0x0B, 0x0C, 0x0D, 0x1C, 0x1D, 0x1E, 0x1F, 0x20]] = False
+_NON_SPACE[0x80:0xC0] = False
+_NON_SPACE[[0xC2, 0xE1, 0xE2, 0xE3]] = False
+# 可能组成Unicode空白的首字节；不含这类字节、也没有 _NON_SPACE 字节的行只有ASCII空白，无需解码
+_SPACE_LEAD = np.zeros(256, dtype=bool)
+_SPACE_LEAD[[0xC2, 0xE1, 0xE2, 0xE3]] = True
+
+
+def _signature(path: Path) -> List[int]:
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def build_line_index(mm: Union[mmap.mmap, bytes]) -> np.ndarray:
+    """扫描文件，返回形状为 (行数, 2) 的非空白行 [起始, 结束) 字节偏移（不含换行符）"""
+    size = len(mm)
+    newlines = []
+    for offset in range(0, size, _SCAN_CHUNK):
+        chunk = np.frombuffer(mm, dtype=np.uint8, count=min(_SCAN_CHUNK, size - offset), offset=offset)
+        newlines.append(np.flatnonzero(chunk == 0x0A).astype(np.int64) + offset)
+    ends = np.concatenate(newlines) if newlines else np.empty(0, dtype=np.int64)
+    starts = np.concatenate(([0], ends + 1))
+    ends = np.concatenate((ends, [size]))
+
+    # 去掉 \r\n 中的 \r
+    if size:
+        has_cr = ends > starts
+        has_cr[has_cr] = np.frombuffer(mm, dtype=np.uint8)[ends[has_cr] - 1] == 0x0D
+        ends = ends - has_cr
+
+    keep = ends > starts
+    starts, ends = starts[keep], ends[keep]
+    # 去掉只含空白字符的行，与原先按 str.strip() 过滤的规则一致
+    keep = _line_any(_NON_SPACE, mm, starts, ends)
+    undecided = np.flatnonzero(~keep)
+    if len(undecided):
+        maybe_unicode = _line_any(_SPACE_LEAD, mm, starts, ends)
+        for i in undecided[maybe_unicode[undecided]]:
+            keep[i] = bool(mm[starts[i]:ends[i]].decode('utf-8', errors='replace').strip())
+    return np.stack((starts[keep], ends[keep]), axis=1)
+
+
+def _line_any(table: np.ndarray, mm: Union[mmap.mmap, bytes], starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """各行（非空、按位置排序）是否含有 table 中为真的字节，按块向量化计算
+
+    相邻两行之间只有换行符，每行的区段取到下一行的起点也不影响结果。
+    """
+    size = len(mm)
+    found = np.zeros(len(starts), dtype=bool)
+    for offset in range(0, size, _SCAN_CHUNK):
+        count = min(_SCAN_CHUNK, size - offset)
+        mask = table[np.frombuffer(mm, dtype=np.uint8, count=count, offset=offset)]
+        # 与本块有交集的行
+        lo = int(np.searchsorted(ends, offset, side='right'))
+        hi = int(np.searchsorted(starts, offset + count, side='left'))
+        if lo >= hi:
+            continue
+        segment_starts = np.maximum(starts[lo:hi] - offset, 0)
+        found[lo:hi] |= np.logical_or.reduceat(mask, segment_starts)
+    return found
+
+
+class CorpusReader:
+    """单个时代语料文件的只读视图
+
+    支持 len()、下标/切片访问和迭代；文件内容通过 mmap 按需读取。
+    """
+
+    def __init__(self, path: Path, index_dir: Path):
+        self.path = Path(path)
+        self.index_path = Path(index_dir) / f"{self.path.stem}.idx.npy"
+        self.meta_path = Path(index_dir) / f"{self.path.stem}.idx.json"
+        self._file = None
+        self._mm: Optional[mmap.mmap] = None
+        self._offsets = np.empty((0, 2), dtype=np.int64)
+        self._signature: Optional[List[int]] = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """源文件变化时重新映射并加载/重建索引，返回是否发生了变化"""
+        try:
+            signature = _signature(self.path)
+        except OSError:
+            signature = None
+        with self._lock:
+            if signature == self._signature:
+                return False
+            self._close()
+            self._signature = signature
+            if signature is None or signature[1] == 0:
+                self._offsets = np.empty((0, 2), dtype=np.int64)
+                return True
+
+            self._file = open(self.path, 'rb')
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._offsets = self._load_index(signature)
+            if self._offsets is None:
+                self._offsets = build_line_index(self._mm)
+                self._save_index(signature)
+            return True
+
+    def _load_index(self, signature: List[int]) -> Optional[np.ndarray]:
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("version") != INDEX_VERSION or meta.get("signature") != signature:
+                return None
+            # 索引本身也按需映射，行数很多时不必整体读入
+            return np.load(self.index_path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+    def _save_index(self, signature: List[int]):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_open(self.index_path, "wb") as f:
+            np.save(f, self._offsets)
+        # 元数据最后写入，保证签名匹配时索引文件一定完整
+        with atomic_open(self.meta_path) as f:
+            json.dump({"version": INDEX_VERSION, "signature": signature, "lines": len(self._offsets)}, f)
+
+    def _close(self):
+        # 行偏移索引也可能是内存映射，一并释放
+        self._offsets = np.empty((0, 2), dtype=np.int64)
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        """关闭映射；之后再访问时重新打开（文件可能已被替换）"""
+        with self._lock:
+            self._close()
+            self._signature = None
+
+    @contextmanager
+    def closed(self):
+        """关闭映射，退出前阻塞对本读取器的访问（用于替换源文件）"""
+        with self._lock:
+            self._close()
+            self._signature = None
+            yield
+
+    def _reopen_if_closed(self):
+        if self._signature is None:
+            self.refresh()
+
+    def __len__(self) -> int:
+        self._reopen_if_closed()
+        return len(self._offsets)
+
+    def _line(self, start: int, end: int) -> str:
+        return self._mm[start:end].decode('utf-8', errors='replace').strip()
+
+    def __getitem__(self, key):
+        self._reopen_if_closed()
+        with self._lock:
+            if isinstance(key, slice):
+                return [self._line(s, e) for s, e in self._offsets[key]]
+            start, end = self._offsets[key]
+            return self._line(start, end)
+
+    def __iter__(self) -> Iterator[str]:
+        # 迭代期间文件可能被替换（映射关闭后重新打开），每次都按当前行数判断
+        i = 0
+        while i < len(self):
+            yield self[i]
+            i += 1
+
+    def sample(self, k: int, seed: Optional[int] = None) -> List[str]:
+        """不放回随机抽取 k 行"""
+        rng = random.Random(seed)
+        indices = rng.sample(range(len(self)), min(k, len(self)))
+        return [self[i] for i in indices]
+
+    def page(self, page: int, page_size: int) -> Dict[str, Any]:
+        """分页读取，page 从 1 开始"""
+        total = len(self)
+        start = (page - 1) * page_size
+        return {
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "pages": (total + page_size - 1) // page_size,
+            "items": [
+                {"index": start + i, "text": text}
+                for i, text in enumerate(self[start:start + page_size])
+            ],
+        }
+
+
+class CorpusIndex:
+    """所有时代语料的读取器，按时代缓存 CorpusReader"""
+
+    def __init__(self, corpus_dir: Path = CORPUS_DIR, index_dir: Path = CORPUS_CONFIG["index_dir"]):
+        self.corpus_dir = Path(corpus_dir)
+        self.index_dir = Path(index_dir)
+        self._readers: Dict[str, CorpusReader] = {}
+        self._lock = threading.Lock()
+
+    def reader(self, era: str) -> CorpusReader:
+        """获取时代语料读取器；文件在磁盘上变化后自动刷新"""
+        with self._lock:
+            reader = self._readers.get(era)
+            if reader is None:
+                reader = CorpusReader(self.corpus_dir / f"{era}.txt", self.index_dir)
+                self._readers[era] = reader
+                return reader
+        reader.refresh()
+        return reader
+
+    @contextmanager
+    def replacing(self, era: str):
+        """替换时代语料文件期间关闭其映射，并暂停创建读取器
+
+        Windows 下被映射的文件无法替换（PermissionError），替换前必须关闭。
+        """
+        with self._lock:
+            reader = self._readers.pop(era, None)
+            if reader is None:
+                yield
+                return
+            # 仍持有该读取器的调用方（如正在迭代的检索刷新）等到替换完成后再重新打开
+            with reader.closed():
+                yield
+
+    def eras(self) -> List[str]:
+        """磁盘上存在语料文件的时代"""
+        return sorted(p.stem for p in self.corpus_dir.glob("*.txt"))
+
+    def stats(self) -> Dict[str, Any]:
+        return {era: len(self.reader(era)) for era in self.eras()}
+
+    def close(self):
+        with self._lock:
+            for reader in self._readers.values():
+                reader.close()
+            self._readers.clear()
@@ -0,0 +1,255 @@
+"""
+跨时期对齐与漂移表 - 把各时期独立训练的词向量旋转到同一空间，预先计算全部共有词的漂移
+
+- 相邻时期之间用正交Procrustes求旋转矩阵（批量SVD一次完成），再依次复合到第一个时期的空间
+- 所有共有词的相邻时期余弦距离和首末时期余弦距离一次向量化算出，保存为漂移表
+- 对齐后的向量一并保存（.npy，按需内存映射），供投影等后续计算使用
+- 读取端只依赖 numpy，服务进程不需要安装 gensim；文件变化后自动重新加载
+
+目录结构（DRIFT_CONFIG["table_dir"]）：
+    words.json     共有词（按第一个时期的词频排序）
+    vectors.npy    对齐后的向量 (时期, 词, 维度)，float32，已归一化
+    drift.npy      漂移 (词, 相邻时期数 + 1)，最后一列为首末时期的漂移
+    counts.npy     各时期词频中的最小值 (词,)
+    meta.json      时期列表、维度与生成时间，最后写入
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ..config import DRIFT_CONFIG
+from .fileio import atomic_open
+
+# 漂移表格式版本
+TABLE_VERSION = 1
+
+# 排序列名：首末时期的总漂移
+TOTAL = "total"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def procrustes_rotations(stack: np.ndarray) -> np.ndarray:
+    """相邻时期之间的正交Procrustes旋转
+
+    Args:
+        stack: (时期, 词, 维度) 的向量，各时期同一行对应同一个词
+    Returns:
+        (时期 - 1, 维度, 维度)，第 t 个矩阵把时期 t+1 旋转到时期 t 的空间
+    """
+    cross = np.einsum("pvd,pve->pde", stack[1:], stack[:-1])
+    u, _, vt = np.linalg.svd(cross)
+    return u @ vt
+
+
+def align_stack(stack: np.ndarray) -> np.ndarray:
+    """把所有时期旋转到第一个时期的空间，返回归一化后的对齐向量"""
+    stack = _normalize(np.asarray(stack, dtype=np.float32))
+    if len(stack) < 2:
+        return stack
+    rotations = procrustes_rotations(stack)
+    # 复合旋转：时期 t -> t-1 -> ... -> 0
+    cumulative = [rotations[0]]
+    for rotation in rotations[1:]:
+        cumulative.append(rotation @ cumulative[-1])
+    aligned = np.empty_like(stack)
+    aligned[0] = stack[0]
+    aligned[1:] = np.einsum("pvd,pde->pve", stack[1:], np.stack(cumulative))
+    return aligned
+
+
+def drift_scores(aligned: np.ndarray) -> np.ndarray:
+    """(词, 相邻时期数 + 1) 的余弦距离，最后一列为首末时期"""
+    steps = 1.0 - np.einsum("pvd,pvd->vp", aligned[1:], aligned[:-1])
+    total = 1.0 - np.einsum("vd,vd->v", aligned[-1], aligned[0])
+    return np.clip(np.column_stack((steps, total)), 0.0, 2.0).astype(np.float32)
+
+
+def save_alignment(
+    directory: Path,
+    periods: Sequence[str],
+    words: Sequence[str],
+    stack: np.ndarray,
+    counts: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """对齐各时期向量、计算漂移并写入漂移表目录"""
+    started = time.perf_counter()
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    aligned = align_stack(stack)
+    drift = drift_scores(aligned)
+    if counts is None:
+        counts = np.zeros(len(words), dtype=np.int64)
+
+    with atomic_open(directory / "vectors.npy", "wb") as f:
+        np.save(f, aligned)
+    with atomic_open(directory / "drift.npy", "wb") as f:
+        np.save(f, drift)
+    with atomic_open(directory / "counts.npy", "wb") as f:
+        np.save(f, np.asarray(counts, dtype=np.int64))
+    with atomic_open(directory / "words.json") as f:
+        json.dump(list(words), f, ensure_ascii=False)
+    meta = {
+        "version": TABLE_VERSION,
+        "periods": list(periods),
+        "words": len(words),
+        "dimension": int(aligned.shape[-1]),
+        "built_at": time.time(),
+    }
+    # meta 最后写入，读取端以它的修改时间判断漂移表是否更新
+    with atomic_open(directory / "meta.json") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    print(f"漂移表已生成: {len(periods)} 个时期，{len(words)} 个共有词，耗时 {time.perf_counter() - started:.2f}s")
+    return meta
+
+
+class DriftTable:
+    """读取预先计算的漂移表，按漂移大小排序词语"""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.meta_path = self.directory / "meta.json"
+        self._lock = threading.Lock()
+        self._signature: Optional[int] = None
+        self._meta: Dict[str, Any] = {}
+        self._words: List[str] = []
+        self._word_index: Dict[str, int] = {}
+        self._drift = np.empty((0, 0), dtype=np.float32)
+        self._counts = np.empty(0, dtype=np.int64)
+        self._vectors: Optional[np.ndarray] = None
+        self._orders: Dict[int, np.ndarray] = {}
+
+    def _load(self) -> bool:
+        """meta.json 变化时重新加载，返回漂移表是否可用"""
+        try:
+            signature = os.stat(self.meta_path).st_mtime_ns
+        except OSError:
+            signature = None
+        with self._lock:
+            if signature == self._signature:
+                return bool(self._words)
+            self._signature = signature
+            self._words, self._word_index, self._orders, self._vectors = [], {}, {}, None
+            if signature is None:
+                return False
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != TABLE_VERSION:
+                print(f"漂移表版本不匹配，请重新生成: {self.directory}")
+                return False
+            with open(self.directory / "words.json", "r", encoding="utf-8") as f:
+                self._words = json.load(f)
+            self._meta = meta
+            self._word_index = {w: i for i, w in enumerate(self._words)}
+            self._drift = np.load(self.directory / "drift.npy")
+            self._counts = np.load(self.directory / "counts.npy")
+            return bool(self._words)
+
+    @property
+    def available(self) -> bool:
+        return self._load()
+
+    @property
+    def periods(self) -> List[str]:
+        self._load()
+        return list(self._meta.get("periods", []))
+
+    def vectors(self) -> np.ndarray:
+        """对齐后的向量 (时期, 词, 维度)，内存映射"""
+        if not self._load():
+            raise FileNotFoundError(f"漂移表不存在: {self.directory}")
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.load(self.directory / "vectors.npy", mmap_mode="r")
+            return self._vectors
+
+    def words(self) -> List[str]:
+        self._load()
+        return self._words
+
+    def index_of(self, words: Sequence[str]) -> List[Optional[int]]:
+        self._load()
+        return [self._word_index.get(w) for w in words]
+
+    def _column(self, period: Optional[str]) -> int:
+        """排序依据：None/total 为首末时期，否则为从上一时期到 period 的漂移"""
+        periods = self._meta.get("periods", [])
+        if period is None or period == TOTAL:
+            return len(periods) - 1
+        if period not in periods[1:]:
+            raise ValueError(f"时期必须是 {', '.join(periods[1:])} 或 {TOTAL} 之一")
+        return periods.index(period) - 1
+
+    def _order(self, column: int) -> np.ndarray:
+        with self._lock:
+            order = self._orders.get(column)
+            if order is None:
+                order = np.argsort(-self._drift[:, column], kind="stable")
+                self._orders[column] = order
+            return order
+
+    def _entry(self, i: int) -> Dict[str, Any]:
+        periods = self._meta["periods"]
+        row = self._drift[i]
+        return {
+            "word": self._words[i],
+            "drift": round(float(row[-1]), 4),
+            "steps": {
+                f"{a}→{b}": round(float(v), 4)
+                for a, b, v in zip(periods[:-1], periods[1:], row[:-1])
+            },
+            "count": int(self._counts[i]),
+        }
+
+    def ranking(self, limit: int = 20, offset: int = 0, period: Optional[str] = None,
+                min_count: int = 0) -> Dict[str, Any]:
+        """漂移最大的词，min_count 过滤掉任一时期中过于罕见的词"""
+        started = time.perf_counter()
+        if not self._load():
+            raise FileNotFoundError(f"漂移表不存在: {self.directory}")
+        column = self._column(period)
+        order = self._order(column)
+        if min_count > 0:
+            order = order[self._counts[order] >= min_count]
+        selected = order[offset:offset + limit]
+        return {
+            "periods": self._meta["periods"],
+            "by": period or TOTAL,
+            "total": int(len(order)),
+            "items": [self._entry(int(i)) for i in selected],
+            "has_more": offset + limit < len(order),
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    def lookup(self, word: str) -> Optional[Dict[str, Any]]:
+        """单个词的漂移，词不在共有词表中时返回 None"""
+        if not self._load():
+            return None
+        i = self._word_index.get(word)
+        if i is None:
+            return None
+        entry = self._entry(i)
+        entry["rank"] = int(np.flatnonzero(self._order(len(self._meta["periods"]) - 1) == i)[0]) + 1
+        return entry
+
+    def stats(self) -> Dict[str, Any]:
+        if not self._load():
+            return {"available": False}
+        return {
+            "available": True,
+            "periods": self._meta["periods"],
+            "words": len(self._words),
+            "dimension": self._meta.get("dimension"),
+            "built_at": self._meta.get("built_at"),
+        }
+
+
+drift_table = DriftTable(DRIFT_CONFIG["table_dir"])
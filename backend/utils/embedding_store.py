@@ -0,0 +1,260 @@
+"""
+向量缓存 - 按文本哈希持久化句向量，避免重启和重建索引时重复编码
+
+- vectors.{代}.bin：行优先的向量矩阵（float16/float32），读取时内存映射
+- index.db（SQLite，WAL）：文本哈希 -> 行号，以及当前代号
+- 只编码缺失的文本，新向量追加到矩阵末尾，写入过程通过锁文件在进程间串行化
+- 多个worker进程可以同时只读映射同一份矩阵
+- gc() 只保留仍在使用的向量，写入新一代矩阵后切换，旧文件随即删除
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from ..config import EMBEDDING_CONFIG, VECTOR_DIMENSION, VECTOR_MODEL
+from .fileio import file_lock
+
+# SQLite 单条语句中 IN (...) 参数个数上限以内的批量大小
+_LOOKUP_BATCH = 500
+
+
+def text_hash(text: str) -> bytes:
+    """文本内容哈希（16字节）"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class EmbeddingStore:
+    """哈希 -> 向量的磁盘缓存"""
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS embeddings (hash BLOB PRIMARY KEY, row INTEGER NOT NULL) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER);
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        dim: int,
+        encoder: Optional[Callable[[List[str]], np.ndarray]] = None,
+        dtype: str = "float16",
+    ):
+        self.directory = Path(directory)
+        self.dim = dim
+        self.encoder = encoder
+        self.dtype = np.dtype(dtype)
+        self.row_bytes = self.dim * self.dtype.itemsize
+        self.lock_path = self.directory / "write.lock"
+        self._local = threading.local()
+        self._map_lock = threading.Lock()
+        self._mapped: Optional[np.memmap] = None
+        self._mapped_generation: Optional[int] = None
+        self._stats_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._encoded = 0
+        self._encode_seconds = 0.0
+        self._collected = 0
+
+    # ---- 存储 ----
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.directory / "index.db"), isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self._SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _generation(self, conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return row[0] if row else 0
+
+    def _vectors_path(self, generation: int) -> Path:
+        return self.directory / f"vectors.{generation}.bin"
+
+    def _matrix(self, generation: int, min_rows: int) -> np.ndarray:
+        """当前代矩阵的只读映射；其他进程追加了新行或切换了代时重新映射"""
+        with self._map_lock:
+            mapped = self._mapped
+            if mapped is None or self._mapped_generation != generation or len(mapped) < min_rows:
+                path = self._vectors_path(generation)
+                rows = os.path.getsize(path) // self.row_bytes if path.exists() else 0
+                if rows == 0:
+                    mapped = np.empty((0, self.dim), dtype=self.dtype)
+                else:
+                    mapped = np.memmap(path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+                self._mapped = mapped
+                self._mapped_generation = generation
+            return mapped
+
+    def _lookup(self, conn: sqlite3.Connection, hashes: List[bytes]) -> Dict[bytes, int]:
+        found: Dict[bytes, int] = {}
+        for i in range(0, len(hashes), _LOOKUP_BATCH):
+            batch = hashes[i:i + _LOOKUP_BATCH]
+            found.update(conn.execute(
+                f"SELECT hash, row FROM embeddings WHERE hash IN ({', '.join('?' * len(batch))})", batch
+            ).fetchall())
+        return found
+
+    # ---- 读写 ----
+
+    def get_many(self, texts: List[str]) -> np.ndarray:
+        """返回 texts 的向量（float32，形状 (n, dim)），缺失的文本批量编码后写入缓存"""
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        conn = self._connect()
+        hashes = [text_hash(t) for t in texts]
+        unique = list(dict.fromkeys(hashes))
+
+        # 行号只在同一代内有效；期间其他进程完成了 gc 时重新查找
+        while True:
+            generation = self._generation(conn)
+            rows = self._lookup(conn, unique)
+            missing = [h for h in unique if h not in rows]
+            if missing:
+                if self.encoder is None:
+                    raise KeyError(f"{len(missing)} 条文本没有缓存的向量")
+                first_text = {}
+                for h, t in zip(hashes, texts):
+                    first_text.setdefault(h, t)
+                rows.update(self._append(conn, missing, [first_text[h] for h in missing]))
+            if self._generation(conn) == generation:
+                break
+
+        missed = set(missing)
+        miss_count = sum(1 for h in hashes if h in missed)
+        with self._stats_lock:
+            self._hits += len(hashes) - miss_count
+            self._misses += miss_count
+
+        indices = np.fromiter((rows[h] for h in hashes), dtype=np.int64, count=len(hashes))
+        matrix = self._matrix(generation, int(indices.max()) + 1)
+        return np.asarray(matrix[indices], dtype=np.float32)
+
+    def _append(self, conn: sqlite3.Connection, hashes: List[bytes], texts: List[str]) -> Dict[bytes, int]:
+        """编码并追加缺失的向量（进程间串行），返回新行号"""
+        with file_lock(self.lock_path):
+            # 等锁期间其他进程可能已写入其中一部分
+            rows = self._lookup(conn, hashes)
+            todo = [(h, t) for h, t in zip(hashes, texts) if h not in rows]
+            if not todo:
+                return rows
+
+            started = time.perf_counter()
+            vectors = np.asarray(self.encoder([t for _, t in todo]), dtype=self.dtype)
+            elapsed = time.perf_counter() - started
+            if vectors.shape != (len(todo), self.dim):
+                raise ValueError(f"编码结果形状 {vectors.shape} 与预期 {(len(todo), self.dim)} 不符")
+
+            path = self._vectors_path(self._generation(conn))
+            with open(path, "ab") as f:
+                # 上次写入中断留下的不完整行直接截掉
+                size = f.seek(0, os.SEEK_END)
+                if size % self.row_bytes:
+                    f.truncate(size - size % self.row_bytes)
+                    f.seek(0, os.SEEK_END)
+                start_row = f.tell() // self.row_bytes
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            # 向量落盘后再写映射，读者看到的行号一定有效
+            new_rows = {h: start_row + i for i, (h, _) in enumerate(todo)}
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT OR REPLACE INTO embeddings (hash, row) VALUES (?, ?)", new_rows.items())
+            conn.execute("COMMIT")
+
+        with self._stats_lock:
+            self._encoded += len(todo)
+            self._encode_seconds += elapsed
+        rows.update(new_rows)
+        return rows
+
+    def gc(self, live_texts: Iterable[str]) -> int:
+        """只保留 live_texts 的向量，压缩到新一代矩阵，返回回收的行数"""
+        live = {text_hash(t) for t in live_texts}
+        conn = self._connect()
+        with file_lock(self.lock_path):
+            generation = self._generation(conn)
+            old_path = self._vectors_path(generation)
+            total_rows = os.path.getsize(old_path) // self.row_bytes if old_path.exists() else 0
+            keep = [(h, row) for h, row in conn.execute("SELECT hash, row FROM embeddings") if h in live]
+            if len(keep) == total_rows:
+                return 0
+
+            keep.sort(key=lambda item: item[1])
+            new_generation = generation + 1
+            new_path = self._vectors_path(new_generation)
+            if keep:
+                old = np.memmap(old_path, dtype=self.dtype, mode="r", shape=(total_rows, self.dim))
+                with open(new_path, "wb") as f:
+                    old_rows = np.array([row for _, row in keep], dtype=np.int64)
+                    for i in range(0, len(old_rows), 65536):
+                        f.write(np.ascontiguousarray(old[old_rows[i:i + 65536]]).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                del old
+            else:
+                new_path.touch()
+
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM embeddings")
+            conn.executemany("INSERT INTO embeddings (hash, row) VALUES (?, ?)",
+                             ((h, i) for i, (h, _) in enumerate(keep)))
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)", (new_generation,))
+            conn.execute("COMMIT")
+            # 其他进程已映射的旧文件在 POSIX 下删除后仍可读，下次访问时切换到新一代
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+        collected = total_rows - len(keep)
+        with self._stats_lock:
+            self._collected += collected
+        print(f"向量缓存已回收 {collected} 行，保留 {len(keep)} 行")
+        return collected
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存规模、命中率和编码吞吐；缓存尚未建立时返回零值，不为读取统计创建目录和数据库"""
+        rows, size = 0, 0
+        if getattr(self._local, "conn", None) is not None or (self.directory / "index.db").exists():
+            conn = self._connect()
+            rows = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            path = self._vectors_path(self._generation(conn))
+            size = os.path.getsize(path) if path.exists() else 0
+        with self._stats_lock:
+            lookups = self._hits + self._misses
+            return {
+                "rows": rows,
+                "bytes": size,
+                "dtype": self.dtype.name,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "encoded": self._encoded,
+                "encode_per_second": round(self._encoded / self._encode_seconds, 1) if self._encode_seconds else None,
+                "collected": self._collected,
+            }
+
+
+def store_dir_for(model_name: str, dim: int, dtype: str) -> Path:
+    """每个模型/维度/精度一个目录，换模型后不会混用旧向量"""
+    slug = re.sub(r"[^0-9A-Za-z._-]+", "_", model_name)
+    return Path(EMBEDDING_CONFIG["store_dir"]) / f"{slug}-{dim}-{dtype}"
+
+
+def create_embedding_store(encoder: Callable[[List[str]], np.ndarray]) -> EmbeddingStore:
+    """VECTOR_MODEL 对应的向量缓存"""
+    dtype = EMBEDDING_CONFIG.get("dtype", "float16")
+    return EmbeddingStore(store_dir_for(VECTOR_MODEL, VECTOR_DIMENSION, dtype), VECTOR_DIMENSION, encoder, dtype)
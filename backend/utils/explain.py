@@ -1,29 +1,57 @@
 """
 概念解释模块 - 支持RAG和本地大模型
 """
-import requests
+import asyncio
 import json
 import time
-from typing import Dict, List, Optional, Tuple
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
 from ..data_manager import data_manager
-from ..config import LOCAL_MODEL_CONFIG
+from ..config import BATCH_CONFIG, LOCAL_MODEL_CONFIG, CACHE_CONFIG
+from .cache import TTLCache
+from .llm_client import LLMClient, llm_client, LLMError
+from .llm_health import llm_health
+from .singleflight import SingleFlight
 
-# 简单的内存缓存
-_ai_analysis_cache = {}
+# AI分析结果缓存，JSON后端绑定概念文件，文件变化后自动失效
+_ai_analysis_cache = TTLCache(name="ai_analysis", **CACHE_CONFIG["ai_analysis"])
 
-def explain_concept_with_local_model(concept_name: str, era: str = "general") -> str:
-    """使用本地LLM解释哲学概念"""
+# 各时期概念解释缓存，键为 (概念, 时期)；与AI分析缓存一样绑定概念文件，
+# 其他进程（离线预计算、分析任务）写入后自动失效
+_explanation_cache = TTLCache(name="explanations", **CACHE_CONFIG["explanations"])
+
+# SQLite后端没有源文件可绑定，其他进程写入后（data_version 变化）清空
+data_manager.on_store_changed(_ai_analysis_cache.clear)
+data_manager.on_store_changed(_explanation_cache.clear)
+
+# 正在进行的AI分析，按概念合并
+_analysis_flight = SingleFlight()
+
+# 批量解释共用的LLM并发限制，绑定创建它的事件循环（见 _batch_slots）
+_batch_semaphore: Optional[asyncio.Semaphore] = None
+_batch_loop: Optional[asyncio.AbstractEventLoop] = None
+
+async def _retrieve_passages(concept_name: str, era: str = "general") -> List[Dict]:
+    """检索与概念相关的语料段落，检索不可用或出错时返回空列表"""
     try:
-        # 构建提示词
-        if era == "general":
-            prompt = f"""请分析哲学概念"{concept_name}"的含义。请从以下角度进行分析：
+        # 检索依赖 numpy/faiss，首次解释时才导入
+        from .retrieval import passage_retriever
+        return await passage_retriever.aretrieve(concept_name, era)
+    except Exception as e:
+        print(f"检索参考段落失败: {str(e)}")
+        return []
+
+def _build_explain_messages(concept_name: str, era: str = "general",
+                            passages: Optional[List[Dict]] = None) -> List[Dict[str, str]]:
+    """构建概念解释的对话消息，passages 为检索到的参考段落"""
+    if era == "general":
+        prompt = f"""请分析哲学概念"{concept_name}"的含义。请从以下角度进行分析：
 1. 核心定义和本质特征
 2. 在不同哲学流派中的理解
 3. 与现代生活的关联
 
 请用中文回答，格式要清晰易读。"""
-        else:
-            prompt = f"""请分析哲学概念"{concept_name}"在{era}时期的含义和特点。请从以下角度进行分析：
+    else:
+        prompt = f"""请分析哲学概念"{concept_name}"在{era}时期的含义和特点。请从以下角度进行分析：
 1. 该时期对该概念的主流理解
 2. 代表性哲学家的观点
 3. 与当时社会文化背景的关联
@@ -31,54 +59,130 @@ def explain_concept_with_local_model(concept_name: str, era: str = "general") ->
 
 请用中文回答，格式要清晰易读。"""
 
-        # 调用本地LLM
-        response = requests.post(
-            f"http://{LOCAL_MODEL_CONFIG['host']}:{LOCAL_MODEL_CONFIG['port']}/v1/chat/completions",
-            json={
-                "model": "qwen-7b-chat",
-                "messages": [
-                    {"role": "system", "content": "你是一位专业的哲学学者，擅长分析哲学概念的历史演变和现代意义。"},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.7,
-                "max_tokens": 1000
-            },
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return result['choices'][0]['message']['content']
-        else:
-            return f"LLM调用失败: {response.status_code}"
+    if passages:
+        from .retrieval import format_context
+        prompt = f"""以下是从语料库中检索到的相关段落，请结合这些材料回答（与问题无关的段落请忽略）：
+{format_context(passages)}
+
+{prompt}"""
+
+    return [
+        {"role": "system", "content": "你是一位专业的哲学学者，擅长分析哲学概念的历史演变和现代意义。"},
+        {"role": "user", "content": prompt}
+    ]
+
+def _cache_explanation(concept_name: str, era: str, text: str):
+    _explanation_cache.set((concept_name, era), text, source=data_manager.concept_source(concept_name))
+
+def _lookup_explanation(concept_name: str, era: str) -> Optional[str]:
+    """缓存或概念文档（ai_explanations，由离线预计算保存）中的解释，没有时返回 None"""
+    data_manager.sync_store()
+    cached = _explanation_cache.get((concept_name, era))
+    if cached is not None:
+        return cached
+    concept_data = data_manager.load_concept_data(concept_name)
+    saved = (concept_data or {}).get("ai_explanations", {}).get(era)
+    if saved:
+        _cache_explanation(concept_name, era, saved)
+    return saved or None
+
+async def generate_explanation(concept_name: str, era: str = "general", client: Optional[LLMClient] = None) -> str:
+    """检索参考段落后调用LLM生成解释（不查缓存），结果写入解释缓存；失败时抛出 LLMError"""
+    passages = await _retrieve_passages(concept_name, era)
+    text = await (client or llm_client).chat(
+        _build_explain_messages(concept_name, era, passages),
+        temperature=0.7,
+        max_tokens=1000,
+        read_timeout=30
+    )
+    _cache_explanation(concept_name, era, text)
+    return text
+
+async def explain_concept_with_local_model(concept_name: str, era: str = "general") -> str:
+    """使用本地LLM解释哲学概念"""
+    try:
+        cached = _lookup_explanation(concept_name, era)
+        if cached is not None:
+            return cached
+        return await generate_explanation(concept_name, era)
             
+    except LLMError as e:
+        return str(e)
     except Exception as e:
         return f"LLM调用出错: {str(e)}"
 
-def analyze_semantic_shift_with_ai(concept_name: str, use_cache: bool = True) -> Dict:
-    """使用AI分析概念的语义漂移"""
+async def stream_explanation(concept_name: str, era: str = "general") -> AsyncIterator[str]:
+    """流式解释哲学概念，逐段产出LLM生成的文本
+
+    完整生成结束后写入解释缓存；命中缓存时一次性产出全文。
+    调用方提前关闭生成器时上游生成随之取消，不写缓存。
+    """
+    cached = _lookup_explanation(concept_name, era)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    passages = await _retrieve_passages(concept_name, era)
+    async for text in llm_client.stream_chat(
+        _build_explain_messages(concept_name, era, passages),
+        temperature=0.7,
+        max_tokens=1000,
+        read_timeout=30
+    ):
+        parts.append(text)
+        yield text
+
+    _cache_explanation(concept_name, era, "".join(parts))
+
+async def analyze_semantic_shift_with_ai(concept_name: str, use_cache: bool = True,
+                                         client: Optional[LLMClient] = None) -> Dict:
+    """使用AI分析概念的语义漂移
+
+    同一概念的并发分析会合并为一次LLM生成，所有调用者共享同一结果；
+    失败结果不会写入缓存。client 为空时使用全局LLM客户端（离线预计算可指定其他服务器）。
+    """
     try:
-        # 检查缓存
-        if use_cache and concept_name in _ai_analysis_cache:
-            print(f"使用缓存的分析结果: {concept_name}")
-            return _ai_analysis_cache[concept_name]
-        
-        # 检查是否已有保存的AI分析结果
+        # 检查缓存和已保存的AI分析结果
         if use_cache:
-            concept_data = data_manager.load_concept_data(concept_name)
-            if concept_data and "semantic_shift" in concept_data and concept_data["semantic_shift"].get("ai_generated"):
-                print(f"使用已保存的AI分析结果: {concept_name}")
-                _ai_analysis_cache[concept_name] = concept_data["semantic_shift"]
-                return concept_data["semantic_shift"]
+            cached, source = _lookup_analysis(concept_name)
+            if cached is not None:
+                print(f"使用{'缓存' if source == 'cache' else '已保存'}的分析结果: {concept_name}")
+                return cached
         
-        # 检查GPU状态
-        if LOCAL_MODEL_CONFIG.get("gpu_enabled", False):
-            print(f"开始AI分析概念: {concept_name} (GPU模式，RTX 4060加速，预计1-2分钟)")
-        else:
-            print(f"开始AI分析概念: {concept_name} (CPU模式，请耐心等待...)")
+        return await _analysis_flight.do(
+            concept_name, lambda: _generate_semantic_shift_analysis(concept_name, client)
+        )
         
-        # 构建语义漂移分析提示词
-        prompt = f"""请分析哲学概念"{concept_name}"在不同历史时期的语义变化。请提供：
+    except Exception as e:
+        return {
+            "error": f"AI分析出错: {str(e)}",
+            "ai_generated": False
+        }
+
+def _lookup_analysis(concept_name: str) -> Tuple[Optional[Dict], str]:
+    """查找已有的AI分析结果，返回 (结果, 来源)：来源为 cache（内存缓存）或 saved（概念文档），没有时结果为 None"""
+    data_manager.sync_store()
+    cached = _ai_analysis_cache.get(concept_name)
+    if cached is not None:
+        return cached, "cache"
+    concept_data = data_manager.load_concept_data(concept_name)
+    if concept_data and "semantic_shift" in concept_data and concept_data["semantic_shift"].get("ai_generated"):
+        _ai_analysis_cache.set(concept_name, concept_data["semantic_shift"],
+                               source=data_manager.concept_source(concept_name))
+        return concept_data["semantic_shift"], "saved"
+    return None, ""
+
+async def _generate_semantic_shift_analysis(concept_name: str, client: Optional[LLMClient] = None) -> Dict:
+    """调用LLM生成语义漂移分析（不经过缓存）"""
+    # 检查GPU状态
+    if LOCAL_MODEL_CONFIG.get("gpu_enabled", False):
+        print(f"开始AI分析概念: {concept_name} (GPU模式，RTX 4060加速，预计1-2分钟)")
+    else:
+        print(f"开始AI分析概念: {concept_name} (CPU模式，请耐心等待...)")
+    
+    # 构建语义漂移分析提示词
+    prompt = f"""请分析哲学概念"{concept_name}"在不同历史时期的语义变化。请提供：
 
 1. 古希腊时期（Ancient Greece）：该概念的含义、特点、代表性观点
 2. 中世纪时期（Medieval）：该概念的发展变化、新的理解
@@ -102,108 +206,109 @@ def analyze_semantic_shift_with_ai(concept_name: str, use_cache: bool = True) ->
     "key_insights": ["关键洞察1", "关键洞察2", "关键洞察3"]
 }}"""
 
-        # 调用本地LLM
-        response = requests.post(
-            f"http://{LOCAL_MODEL_CONFIG['host']}:{LOCAL_MODEL_CONFIG['port']}/v1/chat/completions",
-            json={
-                "model": "qwen-7b-chat",
-                "messages": [
-                    {"role": "system", "content": "你是一位专业的哲学史学者，擅长分析哲学概念的语义演变。请严格按照要求的JSON格式回答。"},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.1,  # 降低温度，提高一致性
-                "max_tokens": 1000,  # 减少token数，提高速度
-                "top_p": 0.9,  # 添加top_p参数
-                "frequency_penalty": 0.1  # 添加频率惩罚
-            },
-            timeout=600  # CPU模式，增加到10分钟
+    # 按时期检索参考段落，注入提示词
+    from .retrieval import ERA_ALIASES, format_context
+    era_names = list(ERA_ALIASES)
+    era_passages = await asyncio.gather(*(_retrieve_passages(concept_name, era) for era in era_names))
+    references = [
+        f"{ERA_ALIASES[era]}时期（{era}）：\n{format_context(passages)}"
+        for era, passages in zip(era_names, era_passages) if passages
+    ]
+    if references:
+        prompt = "以下是从语料库中按时期检索到的相关段落，请结合这些材料分析：\n\n" + "\n\n".join(references) + "\n\n" + prompt
+
+    # 调用本地LLM（CPU模式下可能需要数分钟，读取超时见 LOCAL_MODEL_CONFIG["read_timeout"]）
+    try:
+        content = await (client or llm_client).chat(
+            [
+                {"role": "system", "content": "你是一位专业的哲学史学者，擅长分析哲学概念的语义演变。请严格按照要求的JSON格式回答。"},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.1,  # 降低温度，提高一致性
+            max_tokens=1000,  # 减少token数，提高速度
+            top_p=0.9,  # 添加top_p参数
+            frequency_penalty=0.1  # 添加频率惩罚
         )
-        
-        if response.status_code == 200:
-            result = response.json()
-            content = result['choices'][0]['message']['content']
+    except LLMError as e:
+        return {
+            "error": str(e),
+            "ai_generated": False
+        }
+    
+    # 尝试解析JSON
+    try:
+        # 提取JSON部分
+        start_idx = content.find('{')
+        end_idx = content.rfind('}') + 1
+        if start_idx != -1 and end_idx != -1:
+            json_str = content[start_idx:end_idx]
+            ai_analysis = json.loads(json_str)
             
-            # 尝试解析JSON
-            try:
-                # 提取JSON部分
-                start_idx = content.find('{')
-                end_idx = content.rfind('}') + 1
-                if start_idx != -1 and end_idx != -1:
-                    json_str = content[start_idx:end_idx]
-                    ai_analysis = json.loads(json_str)
-                    
-                    # 转换为标准格式
-                    result_data = {
-                        "values": [
-                            ai_analysis["eras"]["Ancient Greece"]["score"],
-                            ai_analysis["eras"]["Medieval"]["score"],
-                            ai_analysis["eras"]["Modern"]["score"],
-                            ai_analysis["eras"]["Contemporary"]["score"]
-                        ],
-                        "descriptions": {
-                            "Ancient Greece": ai_analysis["eras"]["Ancient Greece"]["description"],
-                            "Medieval": ai_analysis["eras"]["Medieval"]["description"],
-                            "Modern": ai_analysis["eras"]["Modern"]["description"],
-                            "Contemporary": ai_analysis["eras"]["Contemporary"]["description"]
-                        },
-                        "philosophers": {
-                            "Ancient Greece": ai_analysis["eras"]["Ancient Greece"]["key_philosophers"],
-                            "Medieval": ai_analysis["eras"]["Medieval"]["key_philosophers"],
-                            "Modern": ai_analysis["eras"]["Modern"]["key_philosophers"],
-                            "Contemporary": ai_analysis["eras"]["Contemporary"]["key_philosophers"]
-                        },
-                        "overall_trend": ai_analysis["overall_trend"],
-                        "key_insights": ai_analysis["key_insights"],
-                        "ai_generated": True
-                    }
-                    
-                    # 保存到缓存
-                    _ai_analysis_cache[concept_name] = result_data
-                    print(f"AI分析完成: {concept_name}")
-                    return result_data
-                else:
-                    raise ValueError("No JSON found in response")
-                    
-            except (json.JSONDecodeError, KeyError, ValueError) as e:
-                # 如果解析失败，返回错误信息
-                error_result = {
-                    "error": f"AI分析结果解析失败: {str(e)}",
-                    "raw_response": content,
-                    "ai_generated": False
-                }
-                return error_result
-        else:
-            return {
-                "error": f"LLM调用失败: {response.status_code}",
-                "ai_generated": False
+            # 转换为标准格式
+            result_data = {
+                "values": [
+                    ai_analysis["eras"]["Ancient Greece"]["score"],
+                    ai_analysis["eras"]["Medieval"]["score"],
+                    ai_analysis["eras"]["Modern"]["score"],
+                    ai_analysis["eras"]["Contemporary"]["score"]
+                ],
+                "descriptions": {
+                    "Ancient Greece": ai_analysis["eras"]["Ancient Greece"]["description"],
+                    "Medieval": ai_analysis["eras"]["Medieval"]["description"],
+                    "Modern": ai_analysis["eras"]["Modern"]["description"],
+                    "Contemporary": ai_analysis["eras"]["Contemporary"]["description"]
+                },
+                "philosophers": {
+                    "Ancient Greece": ai_analysis["eras"]["Ancient Greece"]["key_philosophers"],
+                    "Medieval": ai_analysis["eras"]["Medieval"]["key_philosophers"],
+                    "Modern": ai_analysis["eras"]["Modern"]["key_philosophers"],
+                    "Contemporary": ai_analysis["eras"]["Contemporary"]["key_philosophers"]
+                },
+                "overall_trend": ai_analysis["overall_trend"],
+                "key_insights": ai_analysis["key_insights"],
+                "ai_generated": True,
+                "generated_at": time.time()
             }
             
-    except Exception as e:
-        return {
-            "error": f"AI分析出错: {str(e)}",
+            # 保存到缓存
+            _ai_analysis_cache.set(concept_name, result_data, source=data_manager.concept_source(concept_name))
+            print(f"AI分析完成: {concept_name}")
+            return result_data
+        else:
+            raise ValueError("No JSON found in response")
+            
+    except (json.JSONDecodeError, KeyError, ValueError) as e:
+        # 如果解析失败，返回错误信息
+        error_result = {
+            "error": f"AI分析结果解析失败: {str(e)}",
+            "raw_response": content,
             "ai_generated": False
         }
+        return error_result
 
-def explain_concept(concept_name: str, use_ai: bool = True) -> Dict:
-    """解释哲学概念，优先使用AI，回退到预设数据"""
+async def explain_concept(concept_name: str, use_ai: bool = True, quantitative: bool = False) -> Dict:
+    """解释哲学概念，优先使用AI，回退到预设数据
+
+    quantitative=True 时不调用LLM，返回预设解释和由语料计算的语义漂移数据。
+    """
     try:
+        if quantitative:
+            from .shift_metrics import compute_semantic_shift
+            shift = await asyncio.get_running_loop().run_in_executor(None, compute_semantic_shift, concept_name)
+            return {
+                "explanations": get_explanations_for_concept(concept_name),
+                "semantic_shift": shift,
+                "ai_generated": False
+            }
+
         if use_ai:
             # 尝试使用AI分析
-            ai_result = analyze_semantic_shift_with_ai(concept_name)
+            ai_result = await analyze_semantic_shift_with_ai(concept_name)
             
             if ai_result.get("ai_generated") and "error" not in ai_result:
                 # AI分析成功，保存结果
                 save_ai_analysis(concept_name, ai_result)
-                return {
-                    "explanations": {
-                        "Ancient Greece": ai_result["descriptions"]["Ancient Greece"],
-                        "Medieval": ai_result["descriptions"]["Medieval"],
-                        "Modern": ai_result["descriptions"]["Modern"],
-                        "Contemporary": ai_result["descriptions"]["Contemporary"]
-                    },
-                    "semantic_shift": ai_result,
-                    "ai_generated": True
-                }
+                return _ai_explanation(ai_result)
             else:
                 print(f"AI分析失败: {ai_result.get('error', 'Unknown error')}")
                 # 回退到预设数据
@@ -225,17 +330,142 @@ def explain_concept(concept_name: str, use_ai: bool = True) -> Dict:
             "ai_generated": False
         }
 
-def save_ai_analysis(concept_name: str, ai_result: Dict):
-    """保存AI分析结果到数据管理器"""
+def _ai_explanation(ai_result: Dict) -> Dict:
+    """由AI分析结果组装 explain_concept 的返回格式"""
+    return {
+        "explanations": {
+            "Ancient Greece": ai_result["descriptions"]["Ancient Greece"],
+            "Medieval": ai_result["descriptions"]["Medieval"],
+            "Modern": ai_result["descriptions"]["Modern"],
+            "Contemporary": ai_result["descriptions"]["Contemporary"]
+        },
+        "semantic_shift": ai_result,
+        "ai_generated": True
+    }
+
+def _batch_slots() -> asyncio.Semaphore:
+    """批量解释的LLM并发限制，所有批量请求共享；脚本中多次 asyncio.run 时重建"""
+    global _batch_semaphore, _batch_loop
+    loop = asyncio.get_running_loop()
+    if _batch_semaphore is None or _batch_loop is not loop:
+        _batch_semaphore = asyncio.Semaphore(max(1, BATCH_CONFIG.get("llm_concurrency", 4)))
+        _batch_loop = loop
+    return _batch_semaphore
+
+async def _analyze_in_slot(concept_name: str) -> Dict:
+    """占用一个批量LLM名额执行AI分析，名额在共享的生成真正结束时才释放
+
+    生成经过 SingleFlight（shield），调用方被取消后仍会继续运行；如果随调用方的取消释放名额，
+    新的概念会在旧生成结束前开始，LLaMA.cpp上的并发生成数就会超过 llm_concurrency。
+    """
+    slots = _batch_slots()
+    await slots.acquire()
+    try:
+        # 排队期间其他请求可能已经完成了该概念的分析
+        cached, _ = _lookup_analysis(concept_name)
+        task = None if cached is not None else _analysis_flight.join(
+            concept_name, lambda: _generate_semantic_shift_analysis(concept_name))
+    except BaseException:
+        slots.release()
+        raise
+    if task is None:
+        slots.release()
+        return cached
+    task.add_done_callback(lambda _: slots.release())
+    return await asyncio.shield(task)
+
+async def explain_concepts_batch(concept_names: Sequence[str], use_ai: bool = True,
+                                 quantitative: bool = False) -> AsyncIterator[Dict]:
+    """批量解释概念，按完成顺序逐个产出结果
+
+    先遍历一次概念数据，已缓存或已保存AI分析的概念立即产出；只有未命中的概念调用LLM，
+    同时进行的生成数不超过 BATCH_CONFIG["llm_concurrency"]，慢的概念不会阻塞其他概念。
+    每个结果带有 concept、source（cache/saved/llm/preset/corpus）和 took_ms（自批量开始计）。
+    调用方提前关闭生成器（客户端断开）时取消还在排队的概念；已经开始的生成会继续完成并写入缓存，
+    完成前一直占用名额（见 _analyze_in_slot）。
+    """
+    started = time.perf_counter()
+    names = list(dict.fromkeys(concept_names))
+
+    def item(name: str, result: Dict, source: str) -> Dict:
+        return {"concept": name, "source": source, **result,
+                "took_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    def preset(name: str) -> Dict:
+        return item(name, {"explanations": get_explanations_for_concept(name), "ai_generated": False}, "preset")
+
+    misses = []
+    for name in names:
+        if use_ai and not quantitative:
+            cached, source = _lookup_analysis(name)
+            if cached is not None:
+                yield item(name, _ai_explanation(cached), source)
+                continue
+        misses.append(name)
+    if not misses:
+        return
+    if not quantitative and not (use_ai and await test_local_model()):
+        # 不使用AI或LLM不可用时直接返回预设数据，不逐个等待LLM超时
+        for name in misses:
+            yield preset(name)
+        return
+
+    async def run(name: str) -> Tuple[str, Dict]:
+        if quantitative:
+            # 定量计算不占用LLM槽位
+            return name, await explain_concept(name, quantitative=True)
+        try:
+            ai_result = await _analyze_in_slot(name)
+        except Exception as e:
+            ai_result = {"error": f"AI分析出错: {str(e)}", "ai_generated": False}
+        if ai_result.get("ai_generated") and "error" not in ai_result:
+            save_ai_analysis(name, ai_result)
+            return name, _ai_explanation(ai_result)
+        print(f"AI分析失败: {ai_result.get('error', 'Unknown error')}")
+        return name, {"explanations": get_explanations_for_concept(name), "ai_generated": False}
+
+    tasks = [asyncio.ensure_future(run(name)) for name in misses]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            name, result = await next_done
+            source = "corpus" if quantitative else ("llm" if result.get("ai_generated") else "preset")
+            yield item(name, result, source)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def save_ai_analysis(concept_name: str, ai_result: Dict) -> bool:
+    """保存AI分析结果到数据管理器，返回是否已写入（概念不存在或写入失败时为 False）"""
     try:
         # 更新概念的语义漂移数据
-        concept_data = data_manager.load_concept_data(concept_name)
-        if concept_data:
-            concept_data["semantic_shift"] = ai_result
-            data_manager.save_concept_data(concept_name, concept_data)
-            print(f"AI分析结果已保存到概念: {concept_name}")
+        if not data_manager.load_concept_data(concept_name):
+            return False
+        # 只追加 semantic_shift 字段的变更，不读改写整个文档
+        data_manager.update_concept_fields(concept_name, {"semantic_shift": ai_result})
+        # 文件已更新，重新绑定缓存条目，避免下次读取时被判定为失效
+        _ai_analysis_cache.set(concept_name, ai_result, source=data_manager.concept_source(concept_name))
+        print(f"AI分析结果已保存到概念: {concept_name}")
+        return True
     except Exception as e:
         print(f"保存AI分析结果失败: {str(e)}")
+        return False
+
+def save_ai_explanations(concept_name: str, explanations: Dict[str, str]) -> bool:
+    """保存各时期的AI解释（合并到概念文档的 ai_explanations 字段），解释接口之后直接返回；返回是否已写入"""
+    try:
+        concept_data = data_manager.load_concept_data(concept_name)
+        if not concept_data:
+            return False
+        merged = {**concept_data.get("ai_explanations", {}), **explanations}
+        data_manager.update_concept_fields(concept_name, {"ai_explanations": merged})
+        # 文件已更新，重新绑定缓存条目
+        for era, text in explanations.items():
+            _cache_explanation(concept_name, era, text)
+        print(f"AI解释已保存到概念: {concept_name} ({', '.join(explanations)})")
+        return True
+    except Exception as e:
+        print(f"保存AI解释失败: {str(e)}")
+        return False
 
 def get_explanations_for_concept(concept_name: str) -> Dict[str, str]:
     """获取概念的预设解释（回退方案）"""
@@ -259,37 +489,29 @@ def get_explanations_for_concept(concept_name: str) -> Dict[str, str]:
             "Contemporary": f"{concept_name}在当代的最新发展。"
         }
 
-def test_local_model() -> bool:
-    """测试本地LLM是否可用"""
-    try:
-        # 使用正确的LLaMA.cpp API端点
-        response = requests.get(
-            f"http://{LOCAL_MODEL_CONFIG['host']}:{LOCAL_MODEL_CONFIG['port']}/v1/models",
-            timeout=5
-        )
-        return response.status_code == 200
-    except:
-        try:
-            # 备用测试方法：尝试简单的completion请求
-            response = requests.post(
-                f"http://{LOCAL_MODEL_CONFIG['host']}:{LOCAL_MODEL_CONFIG['port']}/v1/chat/completions",
-                json={
-                    "model": "qwen-7b-chat",
-                    "messages": [{"role": "user", "content": "test"}],
-                    "max_tokens": 10
-                },
-                timeout=5
-            )
-            return response.status_code == 200
-        except:
-            return False
+def get_ai_analysis_stats() -> Dict:
+    """获取AI分析的缓存与合并统计"""
+    return {
+        "cache": _ai_analysis_cache.stats(),
+        "explanations": _explanation_cache.stats(),
+        "singleflight": _analysis_flight.stats(),
+    }
+
+async def test_local_model() -> bool:
+    """测试本地LLM是否可用
+
+    后台健康检查运行时直接返回缓存的状态，否则（脚本调用）实时探测。
+    """
+    if llm_health.running:
+        return llm_health.available
+    return await llm_client.probe()
 
 
 if __name__ == "__main__":
     # 测试本地模型
-    if test_local_model():
+    if asyncio.run(test_local_model()):
         print("测试概念解释...")
-        result = explain_concept("自由")
+        result = asyncio.run(explain_concept("自由"))
         for i, exp in enumerate(result):
             print(f"{i+1}. {exp}")
     else:
@@ -0,0 +1,68 @@
+"""
+文件工具 - 原子写入与跨进程文件锁
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def atomic_open(path: Union[str, Path], mode: str = "w", encoding: str = "utf-8") -> Iterator[IO]:
+    """原子写入：先写同目录下的临时文件，成功后再替换目标文件
+
+    读者只会看到旧文件或完整的新文件；写入过程中出错时目标文件保持不变。
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    kwargs = {} if "b" in mode else {"encoding": encoding}
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+@contextmanager
+def file_lock(lock_path: Union[str, Path], shared: bool = False) -> Iterator[None]:
+    """基于锁文件的锁，同时在线程和进程（多个uvicorn worker）之间生效
+
+    shared=True 时为共享（读）锁；Windows 下不支持共享锁，统一为排他锁。
+    同一线程内不可重入。
+    """
+    lock_path = Path(lock_path)
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
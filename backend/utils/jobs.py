@@ -0,0 +1,220 @@
+"""
+后台任务模块 - AI语义漂移分析的任务队列
+
+提交后立即返回任务ID，由有限数量的后台worker依次执行分析，
+结果通过 save_ai_analysis 持久化；队列保存在磁盘上，服务重启后未完成的任务会继续执行。
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from ..config import JOB_CONFIG
+from .explain import analyze_semantic_shift_with_ai, save_ai_analysis
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+class AnalysisJobManager:
+    """AI分析任务管理器"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config if config is not None else JOB_CONFIG
+        self.queue_file = Path(self.config["queue_file"])
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._active_by_concept: Dict[str, str] = {}
+        self._pending: List[str] = []
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # 最近完成任务的耗时，用于估算进度
+        self._durations: List[float] = []
+
+    async def start(self):
+        """加载磁盘队列并启动worker"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._load()
+        for job_id in list(self._pending):
+            self._queue.put_nowait(job_id)
+        for i in range(max(1, self.config.get("workers", 1))):
+            self._workers.append(asyncio.create_task(self._worker(), name=f"analysis-worker-{i}"))
+        if self._pending:
+            print(f"恢复未完成的AI分析任务: {len(self._pending)} 个")
+
+    async def stop(self):
+        """停止worker，正在执行的任务会在下次启动时重新排队"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._save()
+
+    def submit(self, concept_name: str) -> Dict[str, Any]:
+        """提交分析任务，同一概念已有未完成任务时直接复用"""
+        job_id = self._active_by_concept.get(concept_name)
+        if job_id is not None:
+            return {**self.status(job_id), "attached": True}
+
+        job_id = uuid.uuid4().hex
+        self._jobs[job_id] = {
+            "job_id": job_id,
+            "concept": concept_name,
+            "status": QUEUED,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            "result": None,
+        }
+        self._active_by_concept[concept_name] = job_id
+        self._pending.append(job_id)
+        if self._queue is not None:
+            self._queue.put_nowait(job_id)
+        self._trim()
+        self._save()
+        return {**self.status(job_id), "attached": False}
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务记录"""
+        return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务状态（不含结果），包括进度和排队位置"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+
+        status = {k: v for k, v in job.items() if k != "result"}
+        status["queue_position"] = self._pending.index(job_id) + 1 if job_id in self._pending else 0
+        status["progress"] = self._progress(job)
+        return status
+
+    def stats(self) -> Dict[str, Any]:
+        """任务队列统计"""
+        counts = {QUEUED: 0, RUNNING: 0, COMPLETED: 0, FAILED: 0}
+        for job in self._jobs.values():
+            counts[job["status"]] += 1
+        return {
+            "workers": len(self._workers),
+            "jobs": counts,
+            "avg_duration": round(self._avg_duration(), 3) if self._durations else None,
+        }
+
+    def _progress(self, job: Dict[str, Any]) -> float:
+        """估算任务进度：按最近任务平均耗时推算，完成前最多到0.95"""
+        if job["status"] in (COMPLETED, FAILED):
+            return 1.0
+        if job["status"] == QUEUED or not job["started_at"]:
+            return 0.0
+        avg = self._avg_duration()
+        if not avg:
+            return 0.5
+        return round(min(0.95, (time.time() - job["started_at"]) / avg), 3)
+
+    def _avg_duration(self) -> float:
+        return sum(self._durations) / len(self._durations) if self._durations else 0.0
+
+    async def _worker(self):
+        """从队列中取任务并执行"""
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        """执行单个分析任务"""
+        job = self._jobs.get(job_id)
+        if job is None or job["status"] not in ACTIVE_STATUSES:
+            return
+        if job_id in self._pending:
+            self._pending.remove(job_id)
+
+        concept_name = job["concept"]
+        job["status"] = RUNNING
+        job["started_at"] = time.time()
+        self._save()
+
+        try:
+            result = await analyze_semantic_shift_with_ai(concept_name)
+            if result.get("ai_generated") and "error" not in result:
+                save_ai_analysis(concept_name, result)
+                job["status"] = COMPLETED
+                job["result"] = result
+            else:
+                job["status"] = FAILED
+                job["error"] = result.get("error", "AI分析失败")
+        except asyncio.CancelledError:
+            # 服务关闭：保留为排队状态，重启后重新执行
+            job["status"] = QUEUED
+            job["started_at"] = None
+            self._pending.insert(0, job_id)
+            raise
+        except Exception as e:
+            job["status"] = FAILED
+            job["error"] = f"AI分析出错: {str(e)}"
+
+        job["finished_at"] = time.time()
+        if job["status"] == COMPLETED:
+            self._durations = (self._durations + [job["finished_at"] - job["started_at"]])[-20:]
+        if self._active_by_concept.get(concept_name) == job_id:
+            del self._active_by_concept[concept_name]
+        print(f"AI分析任务结束: {concept_name} ({job['status']})")
+        self._save()
+
+    def _trim(self):
+        """只保留最近的已完成任务"""
+        max_finished = self.config.get("max_finished_jobs", 500)
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] not in ACTIVE_STATUSES]
+        for job_id in finished[:max(0, len(finished) - max_finished)]:
+            del self._jobs[job_id]
+
+    def _load(self):
+        """从磁盘恢复任务，上次未完成的任务重新排队"""
+        if not self.queue_file.exists():
+            return
+        try:
+            with open(self.queue_file, 'r', encoding='utf-8') as f:
+                jobs = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"读取任务队列失败: {str(e)}")
+            return
+
+        for job in jobs:
+            if job["job_id"] in self._jobs:
+                continue
+            if job["status"] in ACTIVE_STATUSES:
+                job["status"] = QUEUED
+                job["started_at"] = None
+                if job["concept"] in self._active_by_concept:
+                    continue
+                self._active_by_concept[job["concept"]] = job["job_id"]
+                self._pending.append(job["job_id"])
+            self._jobs[job["job_id"]] = job
+
+    def _save(self):
+        """写入磁盘队列（先写临时文件再替换，避免半写入）"""
+        try:
+            self.queue_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.queue_file.with_suffix(".tmp")
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(list(self._jobs.values()), f, ensure_ascii=False)
+            os.replace(tmp_file, self.queue_file)
+        except OSError as e:
+            print(f"保存任务队列失败: {str(e)}")
+
+
+# 全局任务管理器实例
+job_manager = AnalysisJobManager()
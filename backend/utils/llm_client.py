@@ -0,0 +1,309 @@
+"""
+本地LLM异步客户端 - 通过连接池与LLaMA.cpp服务器保持长连接
+"""
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from ..config import LOCAL_MODEL_CONFIG
+
+# 可重试的传输层错误：连接阶段失败或服务端中途断开
+# 注意不包含 ReadTimeout，长时间生成超时后重试只会再浪费一次生成
+_RETRYABLE_ERRORS = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.PoolTimeout,
+    httpx.RemoteProtocolError,
+)
+
+# LLaMA.cpp 在加载模型或槽位已满时返回 503
+_RETRYABLE_STATUS = {502, 503, 504}
+
+
+class LLMError(Exception):
+    """LLM调用失败"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(LLMError):
+    """熔断器打开，LLM调用被快速拒绝"""
+
+
+class CircuitBreaker:
+    """LLM调用熔断器
+
+    连续失败达到 failure_threshold 次后打开，期间所有调用立即失败；
+    经过 reset_timeout 秒后进入半开状态，放行一个试探调用，成功则关闭，失败则重新打开。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.rejected = 0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        """是否放行本次调用"""
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                print(f"LLM熔断器打开：连续失败 {self.consecutive_failures} 次")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """试探调用被取消（未产生结果）时释放半开名额"""
+        self._trial_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        """熔断器状态"""
+        retry_in = None
+        if self.state == self.OPEN:
+            retry_in = round(max(0.0, self.opened_at + self.reset_timeout - time.monotonic()), 1)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "rejected": self.rejected,
+            "retry_in": retry_in,
+        }
+
+
+class LLMClient:
+    """LLaMA.cpp OpenAI兼容接口的异步客户端
+
+    所有请求共享一个 httpx.AsyncClient 连接池，长时间的生成请求不会阻塞事件循环，
+    其他路由可以在生成期间正常响应。生成请求经过熔断器，LLM持续失败时快速失败。
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config if config is not None else LOCAL_MODEL_CONFIG
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.breaker = CircuitBreaker(
+            failure_threshold=self.config.get("breaker_failure_threshold", 3),
+            reset_timeout=self.config.get("breaker_reset_timeout", 30.0),
+        )
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError("LLM服务暂不可用（熔断中），已快速失败")
+
+    def _record(self, status_code: Optional[int] = None, error: bool = False):
+        """记录调用结果：传输错误和5xx视为失败
+
+        503 是 LLaMA.cpp 槽位已满时的背压，服务本身是健康的，既不算失败也不算成功，
+        否则负载高时熔断器反而会打开并拒绝流量。
+        """
+        if status_code == 503 and not error:
+            self.breaker.release()
+        elif error or (status_code is not None and status_code >= 500):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.config['host']}:{self.config['port']}"
+
+    @property
+    def model_name(self) -> str:
+        return self.config.get("model_name", "qwen-7b-chat")
+
+    def _timeout(self, read_timeout: Optional[float] = None) -> httpx.Timeout:
+        """构建超时配置，read_timeout 可按调用覆盖"""
+        return httpx.Timeout(
+            connect=self.config.get("connect_timeout", 5.0),
+            read=read_timeout if read_timeout is not None else self.config.get("read_timeout", 600.0),
+            write=self.config.get("connect_timeout", 5.0),
+            pool=self.config.get("pool_timeout", 30.0),
+        )
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """获取连接池客户端，按需创建"""
+        loop = asyncio.get_running_loop()
+        # 连接池绑定在创建它的事件循环上，脚本中多次 asyncio.run 时需要重建
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(
+                    max_connections=self.config.get("pool_size", 16),
+                    max_keepalive_connections=self.config.get("pool_keepalive", 8),
+                    keepalive_expiry=self.config.get("keepalive_expiry", 60.0),
+                ),
+                timeout=self._timeout(),
+            )
+            self._loop = loop
+        return self._client
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        read_timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        **kwargs,
+    ) -> httpx.Response:
+        """发送请求，连接失败或服务暂不可用时按指数退避重试"""
+        if retries is None:
+            retries = self.config.get("max_retries", 2)
+        backoff = self.config.get("retry_backoff", 0.5)
+        client = self._get_client()
+
+        for attempt in range(retries + 1):
+            try:
+                response = await client.request(method, path, timeout=self._timeout(read_timeout), **kwargs)
+            except _RETRYABLE_ERRORS as e:
+                if attempt >= retries:
+                    raise LLMError(f"LLM连接失败: {str(e) or type(e).__name__}") from e
+            except httpx.HTTPError as e:
+                raise LLMError(f"LLM请求出错: {str(e) or type(e).__name__}") from e
+            else:
+                if response.status_code not in _RETRYABLE_STATUS or attempt >= retries:
+                    return response
+            await asyncio.sleep(backoff * (2 ** attempt))
+
+        raise LLMError("LLM请求重试次数已用尽")
+
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        read_timeout: Optional[float] = None,
+        **params,
+    ) -> str:
+        """调用 /v1/chat/completions 并返回生成的文本"""
+        payload = {
+            "model": self.model_name,
+            "messages": messages,
+            "temperature": temperature if temperature is not None else self.config.get("temperature", 0.7),
+            "max_tokens": max_tokens if max_tokens is not None else self.config.get("max_tokens", 2000),
+            **params,
+        }
+        self._check_breaker()
+        try:
+            response = await self.request("POST", "/v1/chat/completions", json=payload, read_timeout=read_timeout)
+        except LLMError:
+            self._record(error=True)
+            raise
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        self._record(response.status_code)
+        if response.status_code != 200:
+            raise LLMError(f"LLM调用失败: {response.status_code}", status_code=response.status_code)
+
+        result = response.json()
+        return result['choices'][0]['message']['content']
+
+    async def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        read_timeout: Optional[float] = None,
+        **params,
+    ) -> AsyncIterator[str]:
+        """以 stream 模式调用 /v1/chat/completions，逐段产出生成的文本
+
+        调用方提前关闭生成器（例如客户端断开）时会关闭上游连接，
+        LLaMA.cpp 随即停止生成并释放槽位。
+        """
+        payload = {
+            "model": self.model_name,
+            "messages": messages,
+            "temperature": temperature if temperature is not None else self.config.get("temperature", 0.7),
+            "max_tokens": max_tokens if max_tokens is not None else self.config.get("max_tokens", 2000),
+            "stream": True,
+            **params,
+        }
+        self._check_breaker()
+        client = self._get_client()
+        try:
+            async with client.stream("POST", "/v1/chat/completions", json=payload,
+                                     timeout=self._timeout(read_timeout)) as response:
+                if response.status_code != 200:
+                    self._record(response.status_code)
+                    raise LLMError(f"LLM调用失败: {response.status_code}", status_code=response.status_code)
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except json.JSONDecodeError:
+                        continue
+                    choices = chunk.get("choices") or [{}]
+                    text = (choices[0].get("delta") or {}).get("content")
+                    if text:
+                        yield text
+                # 完整读完响应才记为成功，中途断开的流由下面的异常分支记为失败
+                self._record(response.status_code)
+        except httpx.HTTPError as e:
+            self._record(error=True)
+            raise LLMError(f"LLM请求出错: {str(e) or type(e).__name__}") from e
+        finally:
+            # 客户端断开导致生成器提前关闭时释放半开试探名额
+            self.breaker.release()
+
+    async def probe(self) -> bool:
+        """检查LLM服务是否可用
+
+        只请求 /v1/models，不再发送试探性的completion，避免与真实生成争抢槽位。
+        """
+        timeout = self.config.get("probe_timeout", 5.0)
+        try:
+            response = await self.request("GET", "/v1/models", read_timeout=timeout, retries=0)
+            return response.status_code == 200
+        except LLMError:
+            return False
+
+    async def aclose(self):
+        """关闭连接池"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
+
+
+# 全局LLM客户端实例
+llm_client = LLMClient()
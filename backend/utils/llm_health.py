@@ -0,0 +1,78 @@
+"""
+LLM健康检查 - 后台定时探测LLaMA.cpp服务并缓存状态
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from ..config import LOCAL_MODEL_CONFIG
+from .llm_client import LLMClient, llm_client
+
+
+class LLMHealthMonitor:
+    """按固定间隔探测LLM服务，请求路径只读取缓存的状态"""
+
+    def __init__(self, client: LLMClient, interval: Optional[float] = None):
+        self.client = client
+        self.interval = interval if interval is not None else LOCAL_MODEL_CONFIG.get("health_check_interval", 15.0)
+        self.available = False
+        self.last_latency_ms: Optional[float] = None
+        self.last_checked: Optional[str] = None
+        self.consecutive_failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """立即探测一次并启动后台探测任务"""
+        if self.running:
+            return
+        await self.check()
+        self._task = asyncio.create_task(self._loop(), name="llm-health-monitor")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def check(self) -> bool:
+        """执行一次探测并更新缓存状态"""
+        started = time.perf_counter()
+        available = await self.client.probe()
+        self.last_latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.last_checked = datetime.now().isoformat()
+        if available:
+            self.consecutive_failures = 0
+        else:
+            self.consecutive_failures += 1
+        if available != self.available:
+            print(f"LLM服务状态变化: {'online' if available else 'offline'}")
+        self.available = available
+        return available
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                print(f"LLM健康检查出错: {str(e)}")
+
+    def status(self) -> Dict[str, Any]:
+        """缓存的健康状态与熔断器状态"""
+        return {
+            "llm_available": self.available,
+            "last_latency_ms": self.last_latency_ms,
+            "last_checked": self.last_checked,
+            "consecutive_failures": self.consecutive_failures,
+            "check_interval": self.interval,
+            "breaker": self.client.breaker.snapshot(),
+        }
+
+
+# 全局健康检查实例
+llm_health = LLMHealthMonitor(llm_client)
@@ -0,0 +1,108 @@
+"""
+NDJSON 读写 - 每行一条记录，支持 gzip / zstd 压缩（zstd 需要安装 zstandard）
+"""
+import gzip
+import io
+import json
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+from .fileio import atomic_open
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def compression_for(path: Union[str, Path], compression: Optional[str] = None) -> Optional[str]:
+    """确定压缩格式：显式指定优先，否则按扩展名（.gz / .zst）判断"""
+    if compression in ("none", ""):
+        return None
+    if compression is not None:
+        if compression not in ("gzip", "zstd"):
+            raise ValueError(f"不支持的压缩格式: {compression}")
+        return compression
+    suffix = Path(path).suffix.lower()
+    if suffix in (".gz", ".gzip"):
+        return "gzip"
+    if suffix in (".zst", ".zstd"):
+        return "zstd"
+    return None
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd 压缩需要安装 zstandard：pip install zstandard")
+    return zstandard
+
+
+def _detect(raw: IO[bytes]) -> Optional[str]:
+    """按文件头识别压缩格式"""
+    magic = raw.read(4)
+    raw.seek(0)
+    if magic.startswith(_GZIP_MAGIC):
+        return "gzip"
+    if magic == _ZSTD_MAGIC:
+        return "zstd"
+    return None
+
+
+def write_records(path: Union[str, Path], records: Iterable[Dict[str, Any]], compression: Optional[str] = None) -> int:
+    """逐条写入记录，返回写入数量
+
+    records 可以是生成器，内存占用与记录总数无关；写入完成后才替换目标文件。
+    """
+    compression = compression_for(path, compression)
+    count = 0
+    with atomic_open(path, "wb") as raw:
+        if compression == "gzip":
+            stream = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6)
+        elif compression == "zstd":
+            stream = _zstandard().ZstdCompressor(level=3).stream_writer(raw, closefd=False)
+        else:
+            stream = raw
+        text = io.TextIOWrapper(stream, encoding="utf-8", newline="\n")
+        try:
+            for record in records:
+                text.write(json.dumps(record, ensure_ascii=False))
+                text.write("\n")
+                count += 1
+            text.flush()
+        finally:
+            # 关闭压缩流写出尾部数据；原始文件由 atomic_open 负责关闭
+            text.detach()
+            if stream is not raw:
+                stream.close()
+    return count
+
+
+@contextmanager
+def open_records(path: Union[str, Path]) -> Iterator[Tuple[Iterator[Tuple[int, Dict[str, Any]]], IO[bytes]]]:
+    """逐行读取记录
+
+    产出 (行号, 记录) 迭代器和底层原始文件；原始文件的 tell() 可用于计算读取进度。
+    """
+    with open(path, "rb") as raw:
+        compression = _detect(raw)
+        if compression == "gzip":
+            stream = gzip.GzipFile(fileobj=raw, mode="rb")
+        elif compression == "zstd":
+            stream = _zstandard().ZstdDecompressor().stream_reader(raw, closefd=False)
+        else:
+            stream = raw
+        text = io.TextIOWrapper(stream, encoding="utf-8")
+
+        def records():
+            for line_no, line in enumerate(text):
+                line = line.strip()
+                if line:
+                    yield line_no, json.loads(line)
+
+        try:
+            yield records(), raw
+        finally:
+            text.detach()
+            if stream is not raw:
+                stream.close()
@@ -0,0 +1,325 @@
+"""
+分时期近邻索引 - 每个时期的词向量建立一次最近邻索引，批量查询概念在各时期的相关词
+
+- 训练或加载词向量后，把 `{period}.kv` 的词表和归一化向量导出为同目录下的
+  `{period}.nn.json` / `{period}.nn.npy`，服务进程只依赖 numpy（以及可选的 faiss），不需要 gensim
+- 安装 faiss 时另外建立 `{period}.nn.faiss`（默认HNSW近似检索），向量更新后自动重建；
+  未安装时按块做矩阵乘法精确检索
+- 多个查询词在同一时期由一次检索完成；neighbors.json 记录时期顺序，最后写入，变化后自动重新加载
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..config import NEIGHBOR_CONFIG
+from .fileio import atomic_open
+
+# 索引格式版本
+INDEX_VERSION = 1
+
+# numpy 精确检索时每次参与矩阵乘法的词数
+_SEARCH_CHUNK = 65536
+
+
+def _paths(directory: Path, period: str) -> Dict[str, Path]:
+    return {
+        "words": directory / f"{period}.nn.json",
+        "vectors": directory / f"{period}.nn.npy",
+        "faiss": directory / f"{period}.nn.faiss",
+    }
+
+
+def _mtime(path: Path) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def is_stale(directory: Path, period: str, source: Path) -> bool:
+    """导出的向量不存在或早于 source（`{period}.kv`）时需要重新导出"""
+    exported = _mtime(_paths(Path(directory), period)["vectors"])
+    return exported is None or exported < (_mtime(source) or 0)
+
+
+def save_period_vectors(directory: Path, period: str, words: Sequence[str], vectors: np.ndarray):
+    """写入一个时期的词表和归一化向量（行号即词在索引中的编号）"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    paths = _paths(directory, period)
+    with atomic_open(paths["words"]) as f:
+        json.dump(list(words), f, ensure_ascii=False)
+    with atomic_open(paths["vectors"], "wb") as f:
+        np.save(f, vectors)
+
+
+def write_manifest(directory: Path, periods: Sequence[str]):
+    """记录时期顺序；已有清单中的时期保持原来的顺序，新时期追加在后面"""
+    directory = Path(directory)
+    path = directory / "neighbors.json"
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            existing = json.load(f).get("periods", [])
+    except (OSError, ValueError):
+        existing = []
+    ordered = [p for p in existing if _paths(directory, p)["vectors"].exists()]
+    ordered += [p for p in periods if p not in ordered]
+    with atomic_open(path) as f:
+        json.dump({"version": INDEX_VERSION, "periods": ordered, "built_at": time.time()}, f, ensure_ascii=False)
+
+
+class _PeriodIndex:
+    """一个时期的词表、向量（内存映射）和可选的FAISS索引"""
+
+    def __init__(self, directory: Path, period: str):
+        self.period = period
+        self.paths = _paths(directory, period)
+        with open(self.paths["words"], "r", encoding="utf-8") as f:
+            self.words: List[str] = json.load(f)
+        self.word_index = {w: i for i, w in enumerate(self.words)}
+        self.vectors = np.load(self.paths["vectors"], mmap_mode="r")
+        self.faiss_index = None
+
+
+class NeighborIndex:
+    """按时期查询词语的最近邻"""
+
+    def __init__(self, directory: Path, config: Optional[Dict[str, Any]] = None):
+        self.directory = Path(directory)
+        self.config = config if config is not None else NEIGHBOR_CONFIG
+        self.manifest_path = self.directory / "neighbors.json"
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._signature: Optional[int] = None
+        self._periods: Dict[str, _PeriodIndex] = {}
+        self._faiss = None
+        self._faiss_checked = False
+
+    # ---- 加载 ----
+
+    def _load(self) -> bool:
+        """neighbors.json 变化时重新加载，返回是否有可用的时期"""
+        signature = _mtime(self.manifest_path)
+        with self._lock:
+            if signature == self._signature:
+                return bool(self._periods)
+            self._signature = signature
+            self._periods = {}
+            if signature is None:
+                return False
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") != INDEX_VERSION:
+                print(f"近邻索引版本不匹配，请重新生成: {self.directory}")
+                return False
+            for period in manifest.get("periods", []):
+                try:
+                    self._periods[period] = _PeriodIndex(self.directory, period)
+                except (OSError, ValueError) as e:
+                    print(f"加载时期 {period} 的近邻索引失败: {str(e)}")
+            return bool(self._periods)
+
+    def _load_faiss(self):
+        """按需导入 faiss，未安装时返回 None（使用numpy精确检索）"""
+        if not self._faiss_checked:
+            try:
+                import faiss
+                self._faiss = faiss
+            except ImportError:
+                print("未安装faiss-cpu，近邻查询使用numpy精确检索")
+            self._faiss_checked = True
+        return self._faiss
+
+    @property
+    def available(self) -> bool:
+        return self._load()
+
+    @property
+    def periods(self) -> List[str]:
+        self._load()
+        return list(self._periods)
+
+    @property
+    def backend(self) -> str:
+        if self._load_faiss() is None:
+            return "numpy"
+        return f"faiss-{self.config.get('index_type', 'hnsw')}"
+
+    # ---- FAISS索引 ----
+
+    def _new_faiss_index(self, dim: int):
+        faiss = self._faiss
+        if self.config.get("index_type", "hnsw") == "hnsw":
+            base = faiss.IndexHNSWFlat(dim, self.config.get("hnsw_m", 32), faiss.METRIC_INNER_PRODUCT)
+            base.hnsw.efConstruction = self.config.get("hnsw_ef_construction", 80)
+            base.hnsw.efSearch = self.config.get("hnsw_ef_search", 64)
+        else:
+            base = faiss.IndexFlatIP(dim)
+        return faiss.IndexIDMap(base)
+
+    def _faiss_index(self, entry: _PeriodIndex):
+        """读取已保存的FAISS索引；不存在或早于导出的向量时重新建立并保存"""
+        if entry.faiss_index is not None or self._load_faiss() is None:
+            return entry.faiss_index
+        with self._build_lock:
+            if entry.faiss_index is not None:
+                return entry.faiss_index
+            index_path = entry.paths["faiss"]
+            built = _mtime(index_path)
+            if built is not None and built >= (_mtime(entry.paths["vectors"]) or 0):
+                entry.faiss_index = self._faiss.read_index(str(index_path))
+                return entry.faiss_index
+            started = time.perf_counter()
+            vectors = np.ascontiguousarray(entry.vectors, dtype=np.float32)
+            index = self._new_faiss_index(vectors.shape[1])
+            index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+            tmp_path = index_path.with_name(f".{index_path.name}.{os.getpid()}.tmp")
+            self._faiss.write_index(index, str(tmp_path))
+            os.replace(tmp_path, index_path)
+            entry.faiss_index = index
+            print(f"时期 {entry.period} 的近邻索引已建立: {len(vectors)} 个词，"
+                  f"耗时 {time.perf_counter() - started:.2f}s")
+            return index
+
+    def build(self) -> Dict[str, int]:
+        """加载全部时期，安装了 faiss 时建立（或读取）各时期的索引，返回各时期词数"""
+        self._load()
+        with self._lock:
+            entries = list(self._periods.values())
+        for entry in entries:
+            self._faiss_index(entry)
+        return {entry.period: len(entry.words) for entry in entries}
+
+    # ---- 查询 ----
+
+    @staticmethod
+    def _exact_search(vectors: np.ndarray, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """分块矩阵乘法求内积最大的 k 个，内存占用与词表大小无关"""
+        n = len(queries)
+        best_scores = np.full((n, k), -np.inf, dtype=np.float32)
+        best_ids = np.full((n, k), -1, dtype=np.int64)
+        for start in range(0, len(vectors), _SEARCH_CHUNK):
+            scores = queries @ np.asarray(vectors[start:start + _SEARCH_CHUNK]).T
+            kk = min(k, scores.shape[1])
+            part = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+            merged_scores = np.concatenate((best_scores, np.take_along_axis(scores, part, axis=1)), axis=1)
+            merged_ids = np.concatenate((best_ids, part + start), axis=1)
+            top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(merged_scores, top, axis=1)
+            best_ids = np.take_along_axis(merged_ids, top, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_ids, order, axis=1)
+
+    def _search(self, entry: _PeriodIndex, rows: List[int], k: int) -> List[List[Dict[str, Any]]]:
+        """一个时期内批量查询多个词的近邻（不含词本身）"""
+        queries = np.ascontiguousarray(entry.vectors[np.asarray(rows)], dtype=np.float32)
+        # 多取一个，去掉查询词本身
+        width = min(k + 1, len(entry.words))
+        index = self._faiss_index(entry)
+        if index is not None:
+            scores, ids = index.search(queries, width)
+        else:
+            scores, ids = self._exact_search(entry.vectors, queries, width)
+        results = []
+        for row, row_scores, row_ids in zip(rows, scores, ids):
+            neighbors = [
+                {"word": entry.words[int(i)], "similarity": round(float(s), 4)}
+                for s, i in zip(row_scores, row_ids) if i >= 0 and i != row
+            ]
+            results.append(neighbors[:k])
+        return results
+
+    def neighbors(self, words: Sequence[str], k: Optional[int] = None,
+                  periods: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """多个词在各时期的近邻，以及相邻时期之间近邻的变化
+
+        每个时期对全部查询词只检索一次；词不在某个时期的词表中时该时期的 neighbors 为 None，
+        所有时期都没有的词列入 missing。
+        """
+        started = time.perf_counter()
+        if not self._load():
+            raise FileNotFoundError(f"近邻索引不存在: {self.directory}")
+        k = k or self.config.get("default_k", 10)
+        words = list(dict.fromkeys(words))
+        with self._lock:
+            entries = dict(self._periods)
+        if periods:
+            unknown = [p for p in periods if p not in entries]
+            if unknown:
+                raise ValueError(f"时期必须是 {', '.join(entries)} 之一")
+            entries = {p: entries[p] for p in entries if p in periods}
+
+        per_period: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        for period, entry in entries.items():
+            found = [(w, entry.word_index[w]) for w in words if w in entry.word_index]
+            if found:
+                results = self._search(entry, [row for _, row in found], k)
+                per_period[period] = {w: result for (w, _), result in zip(found, results)}
+            else:
+                per_period[period] = {}
+
+        items, missing = [], []
+        for word in words:
+            eras = [{"period": p, "neighbors": per_period[p].get(word)} for p in entries]
+            present = [e for e in eras if e["neighbors"] is not None]
+            if not present:
+                missing.append(word)
+                continue
+            items.append({
+                "word": word,
+                "eras": eras,
+                "changes": self._changes(present),
+                "stable": self._stable(present),
+            })
+        return {
+            "k": k,
+            "periods": list(entries),
+            "backend": self.backend,
+            "items": items,
+            "missing": missing,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    @staticmethod
+    def _changes(present: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """相邻（有该词的）时期之间近邻的重合度、新增和消失的近邻"""
+        changes = []
+        for before, after in zip(present[:-1], present[1:]):
+            old = [n["word"] for n in before["neighbors"]]
+            new = [n["word"] for n in after["neighbors"]]
+            union = set(old) | set(new)
+            changes.append({
+                "from": before["period"],
+                "to": after["period"],
+                "overlap": round(len(set(old) & set(new)) / len(union), 4) if union else 1.0,
+                "gained": [w for w in new if w not in old],
+                "lost": [w for w in old if w not in new],
+            })
+        return changes
+
+    @staticmethod
+    def _stable(present: List[Dict[str, Any]]) -> List[str]:
+        """在所有（有该词的）时期中都是近邻的词，按第一个时期的顺序"""
+        common = set.intersection(*({n["word"] for n in era["neighbors"]} for era in present))
+        return [n["word"] for n in present[0]["neighbors"] if n["word"] in common]
+
+    def stats(self) -> Dict[str, Any]:
+        if not self._load():
+            return {"available": False}
+        with self._lock:
+            entries = list(self._periods.values())
+        return {
+            "available": True,
+            "backend": self.backend,
+            "periods": {entry.period: len(entry.words) for entry in entries},
+        }
+
+
+neighbor_index = NeighborIndex(NEIGHBOR_CONFIG["index_dir"])
@@ -1,133 +1,211 @@
 from PIL import Image, ImageDraw, ImageFont
+import asyncio
 import random
+import zlib
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
 from .concepts import get_semantic_shift_data
 from .explain import analyze_semantic_shift_with_ai
 
-def get_system_font():
-    """Get system available font"""
+# Use English labels
+ERAS = ["Ancient Greece", "Medieval", "Modern", "Contemporary"]
+
+CHART_SIZE = (1000, 700)  # 增加尺寸以容纳更多信息
+CHART_MARGIN = 80
+
+# Color themes for the chart
+THEMES = {
+    "light": {
+        "background": (248, 249, 250),
+        "grid": (220, 220, 220),
+        "axis": (0, 0, 0),
+        "text": (0, 0, 0),
+        "subtitle": (100, 100, 100),
+        "line": (33, 150, 243),
+        "node_fill": (255, 255, 255),
+        "insight": (50, 50, 50),
+        "note": (100, 100, 100),
+        "ai_badge": (76, 175, 80),
+        "preset_badge": (158, 158, 158),
+        "quantitative_badge": (255, 152, 0),
+    },
+}
+
+@lru_cache(maxsize=None)
+def get_system_font(size: int = 16):
+    """Get system available font (loaded once per size)"""
     try:
         # Try system font
-        return ImageFont.truetype("arial.ttf", 16)
+        return ImageFont.truetype("arial.ttf", size)
     except:
         try:
             # Alternative font
-            return ImageFont.truetype("simhei.ttf", 16)
+            return ImageFont.truetype("simhei.ttf", size)
         except:
             # Use default font
             return ImageFont.load_default()
 
-def generate_semantic_shift_image(word: str, file_path: str, use_ai: bool = True) -> str:
+async def get_chart_data(word: str, use_ai: bool = True, quantitative: bool = False) -> Dict:
+    """Resolve the semantic shift data used to draw the chart.
+
+    quantitative computes the values from the corpus without the LLM (see shift_metrics);
+    otherwise tries the AI analysis first when use_ai is set, falls back to preset data.
+    """
+    if quantitative:
+        from .shift_metrics import compute_semantic_shift
+        return await asyncio.get_running_loop().run_in_executor(None, compute_semantic_shift, word)
+    if use_ai:
+        # 尝试使用AI生成数据
+        ai_data = await analyze_semantic_shift_with_ai(word)
+        if ai_data.get("ai_generated") and "error" not in ai_data:
+            print(f"使用AI生成的数据: {word}")
+            return ai_data
+        print(f"AI生成失败，使用预设数据: {word}")
+    return get_semantic_shift_data(word)
+
+def _plot_bottom(height: int, margin: int) -> int:
+    """Y coordinate of the X axis"""
+    return height - margin - 100
+
+def _plot_x(i: int, width: int, margin: int) -> float:
+    return margin + (width - 2 * margin) * i / (len(ERAS) - 1)
+
+def _plot_y(v: float, height: int, margin: int) -> float:
+    return _plot_bottom(height, margin) - (height - 2 * margin - 100) * v
+
+@lru_cache(maxsize=8)
+def _build_static_layer(size: Tuple[int, int] = CHART_SIZE, theme: str = "light") -> Image.Image:
+    """Draw the data-independent part of the chart once per size/theme.
+
+    Background, grid, axes, Y-axis ticks, era labels and subtitle never change
+    between requests; callers copy this base image and draw only the data layers.
+    """
+    width, height = size
+    margin = CHART_MARGIN
+    colors = THEMES[theme]
+    bottom = _plot_bottom(height, margin)
+
+    img = Image.new("RGB", (width, height), colors["background"])
+    draw = ImageDraw.Draw(img)
+    font = get_system_font()
+
+    # Draw grid
+    for i in range(1, 5):
+        x = margin + (width - 2 * margin) * i / 4
+        draw.line((x, margin, x, bottom), fill=colors["grid"], width=1)
+    
+    for i in range(1, 6):
+        y = bottom - (height - 2 * margin - 100) * i / 5
+        draw.line((margin, y, width - margin, y), fill=colors["grid"], width=1)
+
+    # Coordinate axes
+    draw.line((margin, bottom, width - margin, bottom), fill=colors["axis"], width=3)
+    draw.line((margin, margin, margin, bottom), fill=colors["axis"], width=3)
+
+    # Era labels
+    for i, era in enumerate(ERAS):
+        x = _plot_x(i, width, margin)
+        y = height - margin - 80
+        # Use font to draw text
+        bbox = draw.textbbox((0, 0), era, font=font)
+        text_width = bbox[2] - bbox[0]
+        draw.text((x - text_width//2, y), era, fill=colors["text"], font=font)
+
+    # Y-axis labels
+    for t in [0.0, 0.2, 0.4, 0.6, 0.8, 1.0]:
+        y = _plot_y(t, height, margin)
+        draw.line((margin - 5, y, margin, y), fill=colors["axis"], width=2)
+        label = f"{t:.1f}"
+        draw.text((margin - 70, y - 10), label, fill=colors["text"], font=font)
+
+    # Subtitle
+    subtitle = "Semantic Complexity / Abstraction Level Changes"
+    bbox = draw.textbbox((0, 0), subtitle, font=font)
+    subtitle_width = bbox[2] - bbox[0]
+    draw.text((width//2 - subtitle_width//2, 60), subtitle, fill=colors["subtitle"], font=font)
+
+    return img
+
+def generate_semantic_shift_image(word: str, file_path: str, use_ai: bool = True,
+                                  shift_data: Optional[Dict] = None,
+                                  size: Tuple[int, int] = CHART_SIZE, theme: str = "light") -> str:
     """Generate semantic shift line chart for philosophical concepts and save as PNG.
     
     Args:
         word: Philosophical concept word
         file_path: Path to save the image
         use_ai: Whether to use AI-generated data
+        shift_data: Pre-resolved chart data (see get_chart_data); resolved here when omitted
+        size: Image size (width, height)
+        theme: Color theme name, see THEMES
         
     Returns:
         Saved image path
     """
-    width, height = 1000, 700  # 增加尺寸以容纳更多信息
-    margin = 80
-
-    # Use English labels
-    eras = ["Ancient Greece", "Medieval", "Modern", "Contemporary"]
-    
     # Get concept semantic shift data
-    if use_ai:
-        # 尝试使用AI生成数据
-        ai_data = analyze_semantic_shift_with_ai(word)
-        if ai_data.get("ai_generated") and "error" not in ai_data:
-            shift_data = ai_data
-            print(f"使用AI生成的数据: {word}")
-        else:
-            print(f"AI生成失败，使用预设数据: {word}")
-            shift_data = get_semantic_shift_data(word)
-    else:
-        shift_data = get_semantic_shift_data(word)
+    if shift_data is None:
+        # 同步调用入口（脚本使用），在事件循环中请先 await get_chart_data
+        shift_data = asyncio.run(get_chart_data(word, use_ai))
+
+    img = render_semantic_shift_chart(word, shift_data, size=size, theme=theme)
+    img.save(file_path, "PNG")
+    return file_path
+
+def render_semantic_shift_chart(word: str, shift_data: Dict,
+                                size: Tuple[int, int] = CHART_SIZE, theme: str = "light") -> Image.Image:
+    """Render the chart into a PIL image.
+
+    Copies the cached static layer and draws only the polyline, nodes,
+    value labels, title and footer text.
+    """
+    width, height = size
+    margin = CHART_MARGIN
+    colors = THEMES[theme]
     
     if "values" in shift_data and len(shift_data["values"]) == 4:
         values = shift_data["values"]
     else:
         # If no predefined data, generate reasonable random data
-        random.seed(hash(word) % 1000)  # Ensure same word generates same data
-        values = [random.uniform(0.2, 0.8) for _ in range(4)]
+        # crc32 is stable across processes, unlike hash() under hash randomization
+        rng = random.Random(zlib.crc32(word.encode("utf-8")))
+        values = [rng.uniform(0.2, 0.8) for _ in range(4)]
         values.sort()  # Sort to make curve more reasonable
 
-    img = Image.new("RGB", (width, height), (248, 249, 250))
+    img = _build_static_layer(size, theme).copy()
     draw = ImageDraw.Draw(img)
     
     # Get font
     font = get_system_font()
     title_font = get_system_font()  # 可以调整大小
-    small_font = get_system_font()  # 可以调整大小
-
-    # Draw grid
-    for i in range(1, 5):
-        x = margin + (width - 2 * margin) * i / 4
-        draw.line((x, margin, x, height - margin - 100), fill=(220, 220, 220), width=1)
-    
-    for i in range(1, 6):
-        y = height - margin - 100 - (height - 2 * margin - 100) * i / 5
-        draw.line((margin, y, width - margin, y), fill=(220, 220, 220), width=1)
-
-    # Coordinate axes
-    draw.line((margin, height - margin - 100, width - margin, height - margin - 100), fill=(0, 0, 0), width=3)
-    draw.line((margin, margin, margin, height - margin - 100), fill=(0, 0, 0), width=3)
 
     # Calculate coordinate points
-    xs, ys = [], []
-    for i, v in enumerate(values):
-        x = margin + (width - 2 * margin) * i / (len(values) - 1)
-        y = height - margin - 100 - (height - 2 * margin - 100) * v
-        xs.append(x)
-        ys.append(y)
+    xs = [_plot_x(i, width, margin) for i in range(len(values))]
+    ys = [_plot_y(v, height, margin) for v in values]
 
     # Draw line
     for i in range(len(values) - 1):
-        draw.line((xs[i], ys[i], xs[i + 1], ys[i + 1]), fill=(33, 150, 243), width=4)
+        draw.line((xs[i], ys[i], xs[i + 1], ys[i + 1]), fill=colors["line"], width=4)
     
     # Draw nodes
     for i in range(len(values)):
         # Outer circle
-        draw.ellipse((xs[i] - 8, ys[i] - 8, xs[i] + 8, ys[i] + 8), fill=(255, 255, 255), outline=(33, 150, 243), width=2)
+        draw.ellipse((xs[i] - 8, ys[i] - 8, xs[i] + 8, ys[i] + 8), fill=colors["node_fill"], outline=colors["line"], width=2)
         # Inner circle
-        draw.ellipse((xs[i] - 4, ys[i] - 4, xs[i] + 4, ys[i] + 4), fill=(33, 150, 243))
-
-    # Era labels
-    for i, era in enumerate(eras):
-        x = xs[i]
-        y = height - margin - 80
-        # Use font to draw text
-        bbox = draw.textbbox((0, 0), era, font=font)
-        text_width = bbox[2] - bbox[0]
-        draw.text((x - text_width//2, y), era, fill=(0, 0, 0), font=font)
-
-    # Y-axis labels
-    for i, t in enumerate([0.0, 0.2, 0.4, 0.6, 0.8, 1.0]):
-        y = height - margin - 100 - (height - 2 * margin - 100) * t
-        draw.line((margin - 5, y, margin, y), fill=(0, 0, 0), width=2)
-        label = f"{t:.1f}"
-        bbox = draw.textbbox((0, 0), label, font=font)
-        text_width = bbox[2] - bbox[0]
-        draw.text((margin - 70, y - 10), label, fill=(0, 0, 0), font=font)
+        draw.ellipse((xs[i] - 4, ys[i] - 4, xs[i] + 4, ys[i] + 4), fill=colors["line"])
 
     # Title
-    title = f"AI-Generated Semantic Shift Analysis: {word}"
+    if shift_data.get("quantitative"):
+        title = f"Corpus-Based Semantic Shift Analysis: {word}"
+    else:
+        title = f"AI-Generated Semantic Shift Analysis: {word}"
     bbox = draw.textbbox((0, 0), title, font=title_font)
     title_width = bbox[2] - bbox[0]
-    draw.text((width//2 - title_width//2, 30), title, fill=(0, 0, 0), font=title_font)
-    
-    # Subtitle
-    subtitle = "Semantic Complexity / Abstraction Level Changes"
-    bbox = draw.textbbox((0, 0), subtitle, font=font)
-    subtitle_width = bbox[2] - bbox[0]
-    draw.text((width//2 - subtitle_width//2, 60), subtitle, fill=(100, 100, 100), font=font)
+    draw.text((width//2 - title_width//2, 30), title, fill=colors["text"], font=title_font)
 
     # Add value labels
     for i, (x, y, v) in enumerate(zip(xs, ys, values)):
         label = f"{v:.2f}"
-        draw.text((x + 15, y - 20), label, fill=(33, 150, 243), font=font)
+        draw.text((x + 15, y - 20), label, fill=colors["line"], font=font)
 
     # Add AI-generated insights if available
     if shift_data.get("ai_generated") and "overall_trend" in shift_data:
@@ -135,17 +213,27 @@ def generate_semantic_shift_image(word: str, file_path: str, use_ai: bool = True
         trend_text = f"Overall Trend: {shift_data['overall_trend']}"
         if len(trend_text) > 80:
             trend_text = trend_text[:77] + "..."
-        draw.text((margin, height - 60), trend_text, fill=(50, 50, 50), font=font)
+        draw.text((margin, height - 60), trend_text, fill=colors["insight"], font=font)
         
         # Key insights
         if "key_insights" in shift_data and len(shift_data["key_insights"]) > 0:
             insights_text = f"Key Insights: {', '.join(shift_data['key_insights'][:2])}"
             if len(insights_text) > 80:
                 insights_text = insights_text[:77] + "..."
-            draw.text((margin, height - 40), insights_text, fill=(50, 50, 50), font=font)
+            draw.text((margin, height - 40), insights_text, fill=colors["insight"], font=font)
         
         # Data source indicator
-        draw.text((width - margin - 150, height - 40), "AI-Generated Data", fill=(76, 175, 80), font=font)
+        draw.text((width - margin - 150, height - 40), "AI-Generated Data", fill=colors["ai_badge"], font=font)
+    elif shift_data.get("quantitative"):
+        # Adjacent-era drift under the values
+        drift = ", ".join("-" if d is None else f"{d:.2f}" for d in shift_data.get("drift", [])[1:])
+        draw.text((margin, height - 60), f"Era-to-era drift: {drift}", fill=colors["insight"], font=font)
+        passages = shift_data.get("passages", {})
+        draw.text((margin, height - 40), f"Passages per era: {', '.join(str(n) for n in passages.values())}",
+                  fill=colors["note"], font=font)
+
+        # Data source indicator
+        draw.text((width - margin - 150, height - 40), "Quantitative Data", fill=colors["quantitative_badge"], font=font)
     else:
         # Use preset data description if available
         if "description" in shift_data:
@@ -153,13 +241,9 @@ def generate_semantic_shift_image(word: str, file_path: str, use_ai: bool = True
             # Simple handling of long descriptions
             if len(description) > 80:
                 description = description[:77] + "..."
-            draw.text((margin, height - 60), f"Note: {description}", fill=(100, 100, 100), font=font)
+            draw.text((margin, height - 60), f"Note: {description}", fill=colors["note"], font=font)
         
         # Data source indicator
-        draw.text((width - margin - 150, height - 40), "Preset Data", fill=(158, 158, 158), font=font)
-
-    img.save(file_path, "PNG")
-    return file_path
-
-
+        draw.text((width - margin - 150, height - 40), "Preset Data", fill=colors["preset_badge"], font=font)
 
+    return img
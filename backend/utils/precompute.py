@@ -0,0 +1,236 @@
+"""
+离线预计算 - 为全部（或指定的）概念预先生成AI语义漂移分析、分时期解释和图表
+
+- 结果通过 save_ai_analysis / save_ai_explanations 写入概念文档，服务运行时直接命中，不再等待LLM
+- 可同时使用多个LLaMA.cpp服务器，每个服务器 parallel 个worker，各自使用独立的连接池
+- 已是最新的概念跳过（缺少的图表仍由worker补画）；每处理完一个概念写入检查点，保存失败的概念不记为完成，中断后重新运行从未完成的概念继续
+- 每个概念结束时输出进度、吞吐（概念/分钟）、预计剩余时间和失败数
+"""
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+from ..config import LOCAL_MODEL_CONFIG, PRECOMPUTE_CONFIG
+from ..data_manager import data_manager
+from .explain import (_lookup_explanation, analyze_semantic_shift_with_ai, generate_explanation,
+                      save_ai_analysis, save_ai_explanations)
+from .fileio import atomic_open
+from .llm_client import LLMClient
+
+
+def client_for(server: str) -> LLMClient:
+    """按服务器地址（http://host:port 或 host:port）创建LLM客户端，其余配置沿用 LOCAL_MODEL_CONFIG"""
+    parsed = urlparse(server if "://" in server else f"http://{server}")
+    return LLMClient({
+        **LOCAL_MODEL_CONFIG,
+        "host": parsed.hostname or LOCAL_MODEL_CONFIG["host"],
+        "port": parsed.port or LOCAL_MODEL_CONFIG["port"],
+    })
+
+
+def _format_seconds(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class Precomputer:
+    """按检查点批量预计算概念的AI分析"""
+
+    def __init__(
+        self,
+        config: Optional[Dict[str, Any]] = None,
+        servers: Optional[Sequence[str]] = None,
+        parallel: Optional[int] = None,
+        force: bool = False,
+        charts: Optional[bool] = None,
+    ):
+        self.config = config if config is not None else PRECOMPUTE_CONFIG
+        self.servers = list(servers or self.config.get("servers")
+                            or [f"http://{LOCAL_MODEL_CONFIG['host']}:{LOCAL_MODEL_CONFIG['port']}"])
+        self.parallel = max(1, parallel or self.config.get("parallel", 2))
+        self.eras: List[str] = list(self.config.get("explain_eras", []))
+        self.force = force
+        self.charts = self.config.get("charts", True) if charts is None else charts
+        self.checkpoint_file = Path(self.config["checkpoint_file"])
+        self._checkpoint: Dict[str, Any] = {"done": {}, "failed": {}}
+        self._counts = {"total": 0, "skipped": 0, "done": 0, "failed": 0}
+        self._started = 0.0
+
+    # ---- 检查点 ----
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint_file, "r", encoding="utf-8") as f:
+                self._checkpoint = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"读取检查点失败，从头开始: {str(e)}")
+        self._checkpoint.setdefault("done", {})
+        self._checkpoint.setdefault("failed", {})
+        if self._checkpoint.get("eras", self.eras) != self.eras:
+            # 要生成解释的时期变了，已完成的概念需要重新检查
+            self._checkpoint["done"] = {}
+        self._checkpoint["eras"] = self.eras
+
+    def reset_checkpoint(self):
+        self._checkpoint = {"done": {}, "failed": {}, "eras": self.eras}
+        self._save_checkpoint()
+
+    def _save_checkpoint(self):
+        self.checkpoint_file.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_open(self.checkpoint_file) as f:
+            json.dump(self._checkpoint, f, ensure_ascii=False)
+
+    # ---- 新鲜度 ----
+
+    def _expired(self, generated_at: Optional[float]) -> bool:
+        """超过 max_age_days 视为过期；没有生成时间的旧结果无法判断，视为未过期"""
+        max_age = self.config.get("max_age_days")
+        return bool(max_age and generated_at and time.time() - generated_at > max_age * 86400)
+
+    def _analysis_fresh(self, concept_data: Dict[str, Any]) -> bool:
+        shift = concept_data.get("semantic_shift") or {}
+        return bool(shift.get("ai_generated")) and not self._expired(shift.get("generated_at"))
+
+    def _missing_eras(self, concept_data: Dict[str, Any]) -> List[str]:
+        saved = concept_data.get("ai_explanations") or {}
+        return [era for era in self.eras if not saved.get(era)]
+
+    def is_fresh(self, name: str) -> bool:
+        """分析未过期且各时期解释都已保存"""
+        if self.force:
+            return False
+        done_at = self._checkpoint["done"].get(name)
+        if done_at and not self._expired(done_at):
+            return True
+        concept_data = data_manager.load_concept_data(name)
+        return bool(concept_data) and self._analysis_fresh(concept_data) and not self._missing_eras(concept_data)
+
+    # ---- 执行 ----
+
+    async def _render_chart(self, name: str, shift_data: Dict[str, Any]):
+        """预先绘制服务端 /api/semantic_shift/{word} 会返回的图表"""
+        from .chart_cache import chart_cache
+        key = chart_cache.key_for(name, shift_data)
+        if chart_cache.lookup(key) is None:
+            await asyncio.get_running_loop().run_in_executor(None, chart_cache.render, name, key, shift_data)
+
+    async def process(self, name: str, client: LLMClient):
+        """生成一个概念缺少的分析和解释并保存，失败时抛出异常"""
+        concept_data = data_manager.load_concept_data(name)
+        if not concept_data:
+            raise ValueError("概念不存在，结果无法保存")
+
+        if self.force or not self._analysis_fresh(concept_data):
+            result = await analyze_semantic_shift_with_ai(name, use_cache=False, client=client)
+            if not result.get("ai_generated") or "error" in result:
+                raise RuntimeError(result.get("error", "AI分析失败"))
+            if not save_ai_analysis(name, result):
+                raise RuntimeError("AI分析结果保存失败")
+        else:
+            result = concept_data["semantic_shift"]
+
+        eras = self.eras if self.force else self._missing_eras(concept_data)
+        explanations = {}
+        for era in eras:
+            # 同一个worker依次生成，占用的槽位数不超过 parallel
+            explanations[era] = (None if self.force else _lookup_explanation(name, era)) \
+                or await generate_explanation(name, era, client)
+        if explanations and not save_ai_explanations(name, explanations):
+            raise RuntimeError("AI解释保存失败")
+
+        if self.charts:
+            await self._render_chart(name, result)
+
+    def _report(self, name: str, status: str, seconds: float):
+        counts = self._counts
+        finished = counts["done"] + counts["failed"]
+        remaining = counts["total"] - counts["skipped"] - finished
+        elapsed = time.perf_counter() - self._started
+        rate = finished / elapsed if elapsed > 0 else 0.0
+        eta = _format_seconds(remaining / rate) if rate > 0 else "-"
+        print(f"[{finished}/{counts['total'] - counts['skipped']}] {name} {status} ({seconds:.1f}s) | "
+              f"{rate * 60:.1f} 概念/分钟 | 剩余 {eta} | 失败 {counts['failed']}")
+
+    async def _render_saved_chart(self, name: str):
+        """分析已是最新的概念只补画缺少的图表，不调用LLM；失败不影响其他概念"""
+        try:
+            shift = data_manager.load_concept_data(name).get("semantic_shift")
+            if shift:
+                await self._render_chart(name, shift)
+        except Exception as e:
+            print(f"补画图表失败: {name} ({str(e)})")
+
+    async def _worker(self, queue: "asyncio.Queue[Tuple[str, bool]]", client: Optional[LLMClient]):
+        while True:
+            try:
+                name, chart_only = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if chart_only:
+                await self._render_saved_chart(name)
+                continue
+            started = time.perf_counter()
+            try:
+                await self.process(name, client)
+            except Exception as e:
+                self._counts["failed"] += 1
+                self._checkpoint["done"].pop(name, None)
+                self._checkpoint["failed"][name] = str(e)
+                status = f"失败: {str(e)}"
+            else:
+                self._counts["done"] += 1
+                self._checkpoint["done"][name] = time.time()
+                self._checkpoint["failed"].pop(name, None)
+                status = "完成"
+            self._save_checkpoint()
+            self._report(name, status, time.perf_counter() - started)
+
+    async def run(self, names: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """处理给定的概念（默认为全部概念），返回统计"""
+        self._started = time.perf_counter()
+        names = list(dict.fromkeys(names or data_manager.get_all_concepts()))
+        self._counts = {"total": len(names), "skipped": 0, "done": 0, "failed": 0}
+
+        # 待生成的概念在前，已是最新、只需补画图表的概念排在后面，由同一组worker处理
+        pending: List[str] = []
+        fresh: List[str] = []
+        for name in names:
+            (fresh if self.is_fresh(name) else pending).append(name)
+        self._counts["skipped"] = len(fresh)
+        if not self.charts:
+            fresh = []
+        queue: "asyncio.Queue[Tuple[str, bool]]" = asyncio.Queue()
+        for name in pending:
+            queue.put_nowait((name, False))
+        for name in fresh:
+            queue.put_nowait((name, True))
+        print(f"共 {len(names)} 个概念，跳过已是最新的 {self._counts['skipped']} 个，待处理 {len(pending)} 个")
+
+        clients = [client_for(server) for server in self.servers]
+        try:
+            if pending:
+                online = await asyncio.gather(*(client.probe() for client in clients))
+                for server, ok in zip(self.servers, online):
+                    print(f"LLM服务器 {server}: {'可用' if ok else '不可用，跳过'}")
+                workers = [self._worker(queue, client)
+                           for client, ok in zip(clients, online) if ok
+                           for _ in range(self.parallel)]
+                if not workers:
+                    raise RuntimeError("没有可用的LLM服务器")
+            else:
+                workers = [self._worker(queue, None) for _ in range(self.parallel)]
+            await asyncio.gather(*workers)
+        finally:
+            await asyncio.gather(*(client.aclose() for client in clients))
+
+        elapsed = time.perf_counter() - self._started
+        summary = {**self._counts, "seconds": round(elapsed, 1),
+                   "failures": {n: e for n, e in self._checkpoint["failed"].items() if n in names}}
+        print(f"预计算结束: 完成 {summary['done']}，跳过 {summary['skipped']}，失败 {summary['failed']}，"
+              f"耗时 {_format_seconds(elapsed)}")
+        return summary
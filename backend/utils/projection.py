@@ -0,0 +1,124 @@
+"""
+投影引擎 - 在对齐后的各时期词向量上拟合一次线性投影（PCA），所有词共用同一个二维空间
+
+- 拟合：按块累加协方差矩阵后做特征分解，内存占用与词表大小无关
+- 投影参数保存在漂移表目录下的 projection.npz，漂移表重新生成后自动重新拟合
+- 任意多个词在所有时期的坐标由一次矩阵乘法得到，不同词的轨迹可以画在同一张图上
+"""
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .drift_table import DriftTable, drift_table
+from .fileio import atomic_open
+
+# 拟合时每次读取的行数
+_FIT_CHUNK = 65536
+
+
+class ProjectionEngine:
+    """对齐向量 -> 二维坐标的线性投影"""
+
+    def __init__(self, table: DriftTable):
+        self.table = table
+        self.n_components = 2
+        self.path = table.directory / "projection.npz"
+        self._lock = threading.Lock()
+        self._mean: Optional[np.ndarray] = None
+        self._components: Optional[np.ndarray] = None
+        self._explained: List[float] = []
+        self._built_at: Optional[float] = None
+
+    def fit(self) -> Dict[str, Any]:
+        """在全部时期的对齐向量上拟合PCA并保存"""
+        started = time.perf_counter()
+        vectors = self.table.vectors()
+        flat = vectors.reshape(-1, vectors.shape[-1])
+        n, dim = flat.shape
+
+        total = np.zeros(dim, dtype=np.float64)
+        scatter = np.zeros((dim, dim), dtype=np.float64)
+        for i in range(0, n, _FIT_CHUNK):
+            chunk = np.asarray(flat[i:i + _FIT_CHUNK], dtype=np.float64)
+            total += chunk.sum(axis=0)
+            scatter += chunk.T @ chunk
+        mean = total / n
+        covariance = scatter / n - np.outer(mean, mean)
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        top = np.argsort(eigenvalues)[::-1][:self.n_components]
+        components = eigenvectors[:, top].T
+        # 固定符号，重新拟合后坐标方向保持一致
+        signs = np.sign(components[np.arange(len(top)), np.argmax(np.abs(components), axis=1)])
+        components *= signs[:, None]
+        explained = eigenvalues[top] / max(eigenvalues.sum(), 1e-12)
+
+        built_at = self.table.stats().get("built_at")
+        with atomic_open(self.path, "wb") as f:
+            np.savez(f, mean=mean.astype(np.float32), components=components.astype(np.float32),
+                     explained=explained, built_at=np.float64(built_at or 0.0))
+        with self._lock:
+            self._mean = mean.astype(np.float32)
+            self._components = components.astype(np.float32)
+            self._explained = [round(float(v), 4) for v in explained]
+            self._built_at = built_at
+        print(f"投影已拟合: {n} 个向量，解释方差 {self._explained}，耗时 {time.perf_counter() - started:.2f}s")
+        return {"vectors": n, "explained_variance": self._explained}
+
+    def _ensure(self):
+        """加载已保存的投影；不存在或漂移表已更新时重新拟合"""
+        built_at = self.table.stats().get("built_at")
+        with self._lock:
+            if self._components is not None and self._built_at == built_at:
+                return
+        try:
+            with np.load(self.path) as saved:
+                if float(saved["built_at"]) == float(built_at or 0.0) and len(saved["components"]) == self.n_components:
+                    with self._lock:
+                        self._mean = saved["mean"]
+                        self._components = saved["components"]
+                        self._explained = [round(float(v), 4) for v in saved["explained"]]
+                        self._built_at = built_at
+                    return
+        except (OSError, KeyError, ValueError):
+            pass
+        self.fit()
+
+    def project(self, words: Sequence[str]) -> Dict[str, Any]:
+        """一次计算多个词在所有时期的坐标，不在共有词表中的词列入 missing"""
+        started = time.perf_counter()
+        if not self.table.available:
+            raise FileNotFoundError(f"漂移表不存在: {self.table.directory}")
+        self._ensure()
+        words = list(dict.fromkeys(words))
+        indices = self.table.index_of(words)
+        found = [(w, i) for w, i in zip(words, indices) if i is not None]
+        periods = self.table.periods
+
+        items = []
+        if found:
+            rows = np.array([i for _, i in found])
+            order = np.argsort(rows)
+            # 按行号顺序读取内存映射，再还原请求顺序
+            gathered = np.empty((len(periods), len(rows), self._components.shape[1]), dtype=np.float32)
+            gathered[:, order] = self.table.vectors()[:, rows[order]]
+            coords = (gathered - self._mean) @ self._components.T
+            for j, (word, _) in enumerate(found):
+                items.append({
+                    "word": word,
+                    "coords": [
+                        {"period": period, "x": round(float(coords[p, j, 0]), 4), "y": round(float(coords[p, j, 1]), 4)}
+                        for p, period in enumerate(periods)
+                    ],
+                })
+        return {
+            "periods": periods,
+            "explained_variance": self._explained,
+            "items": items,
+            "missing": [w for w, i in zip(words, indices) if i is None],
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+
+projection_engine = ProjectionEngine(drift_table)
@@ -0,0 +1,353 @@
+"""
+检索增强（RAG）- 用 VECTOR_MODEL 编码语料段落，建立持久化的FAISS索引，为解释提示词提供参考资料
+
+- 段落来自全文检索索引（search.db），与 /api/search 使用同一份切分结果
+- 每个时代一个FAISS索引（另有一个覆盖全部段落的索引），类型可选 hnsw / ivf / flat
+- 检索索引的来源签名变化后在后台线程中重建；索引未就绪时检索返回空列表，不阻塞解释
+- sentence-transformers 或 faiss 未安装时自动停用，提示词保持原样
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..config import EMBEDDING_CONFIG, RAG_CONFIG, VECTOR_MODEL, VECTOR_DIMENSION
+from .embedding_store import create_embedding_store
+from .fileio import atomic_open
+from .search import search_index
+
+# 覆盖全部段落的索引名
+ALL_ERAS = "_all"
+
+# 分析提示词中使用的英文时期名 -> 语料中的时代名
+ERA_ALIASES = {
+    "Ancient Greece": "古希腊",
+    "Medieval": "中世纪",
+    "Modern": "近代",
+    "Contemporary": "现代",
+}
+
+# 每次向FAISS索引添加的向量数
+_ADD_CHUNK = 65536
+
+# 记录最近多少次检索的耗时
+_LATENCY_WINDOW = 200
+
+
+class PassageRetriever:
+    """按时代检索与查询语义最相近的语料段落"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config if config is not None else RAG_CONFIG
+        self.index_dir = Path(self.config["index_dir"])
+        self.manifest_path = self.index_dir / "manifest.json"
+        self._model = None
+        self._faiss = None
+        # 编码结果按文本哈希缓存在磁盘上，重启和重建索引时只编码新段落
+        self.embeddings = create_embedding_store(self._encode_uncached)
+        self._disabled_reason: Optional[str] = None if self.config.get("enabled", True) else "RAG_CONFIG未启用"
+        self._indexes: Dict[str, Any] = {}
+        self._manifest: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._model_lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._build_thread: Optional[threading.Thread] = None
+        self._last_refresh = 0.0
+        self._latencies: List[float] = []
+        self._queries = 0
+
+    # ---- 依赖与模型 ----
+
+    @property
+    def available(self) -> bool:
+        return self._disabled_reason is None
+
+    def _load_dependencies(self) -> bool:
+        """按需导入 faiss，缺少依赖时停用检索"""
+        if self._faiss is not None or not self.available:
+            return self.available
+        try:
+            import faiss
+        except ImportError as e:
+            self._disable(f"未安装faiss-cpu: {str(e)}")
+            return False
+        self._faiss = faiss
+        return True
+
+    def _disable(self, reason: str):
+        if self._disabled_reason is None:
+            print(f"RAG检索已停用: {reason}")
+        self._disabled_reason = reason
+
+    def _get_model(self):
+        """按需加载句向量模型（首次加载需要数秒）"""
+        with self._model_lock:
+            if self._model is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError as e:
+                    self._disable(f"未安装sentence-transformers: {str(e)}")
+                    raise RuntimeError(self._disabled_reason)
+                self._model = SentenceTransformer(VECTOR_MODEL, device=self.config.get("device", "cpu"))
+            return self._model
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """批量编码为归一化的 float32 向量（内积即余弦相似度），优先使用向量缓存"""
+        return self.embeddings.get_many(texts)
+
+    def _encode_uncached(self, texts: List[str]) -> np.ndarray:
+        vectors = self._get_model().encode(
+            texts,
+            batch_size=self.config.get("encode_batch_size", 64),
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+    # ---- 建索引 ----
+
+    def _new_index(self, vectors: np.ndarray, rows: np.ndarray):
+        """按配置创建FAISS索引；IVF 从 rows 中抽样训练聚类中心"""
+        faiss = self._faiss
+        dim = vectors.shape[1]
+        index_type = self.config.get("index_type", "hnsw")
+        n = len(rows)
+        # IVF 每个聚类至少需要约39个训练样本，段落太少时退化为精确检索
+        nlist = min(self.config.get("ivf_nlist", 1024), n // 39)
+
+        if index_type == "ivf" and nlist >= 2:
+            quantizer = faiss.IndexFlatIP(dim)
+            base = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            sample_size = min(n, self.config.get("ivf_train_size", 50000))
+            sample = np.sort(np.random.default_rng(0).choice(rows, sample_size, replace=False))
+            base.train(np.ascontiguousarray(vectors[sample]))
+            base.nprobe = self.config.get("ivf_nprobe", 16)
+        elif index_type == "hnsw":
+            base = faiss.IndexHNSWFlat(dim, self.config.get("hnsw_m", 32), faiss.METRIC_INNER_PRODUCT)
+            base.hnsw.efConstruction = self.config.get("hnsw_ef_construction", 80)
+            base.hnsw.efSearch = self.config.get("hnsw_ef_search", 64)
+        else:
+            base = faiss.IndexFlatIP(dim)
+        return faiss.IndexIDMap(base)
+
+    def build(self) -> Dict[str, Any]:
+        """编码所有段落并重建全部时代索引"""
+        faiss = self._faiss
+        started = time.time()
+        signature = search_index.signature()
+        meta = search_index.passage_eras()
+        n = len(meta)
+        ids = np.fromiter((pid for pid, _ in meta), dtype=np.int64, count=n)
+        eras = np.array([era or "" for _, era in meta], dtype=object)
+
+        # 向量先写入磁盘上的临时矩阵，语料很大时内存占用不随段落数增长
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        vectors_path = self.index_dir / f".vectors.{os.getpid()}.npy"
+        vectors = np.lib.format.open_memmap(vectors_path, mode="w+", dtype=np.float32, shape=(n, VECTOR_DIMENSION))
+        try:
+            row = 0
+            encode_started = time.time()
+            for batch in search_index.iter_passage_texts(self.config.get("encode_batch_size", 64) * 16):
+                encoded = self.encode([text for _, text in batch])
+                vectors[row:row + len(batch)] = encoded
+                row += len(batch)
+            encode_seconds = time.time() - encode_started
+
+            counts = {}
+            groups = {ALL_ERAS: np.arange(n)}
+            for era in sorted(set(eras) - {""}):
+                groups[era] = np.flatnonzero(eras == era)
+            indexes = {}
+            for era, rows in groups.items():
+                if len(rows) == 0:
+                    continue
+                index = self._new_index(vectors, rows)
+                for i in range(0, len(rows), _ADD_CHUNK):
+                    chunk = rows[i:i + _ADD_CHUNK]
+                    index.add_with_ids(np.ascontiguousarray(vectors[chunk]), ids[chunk])
+                indexes[era] = index
+                counts[era] = int(len(rows))
+        finally:
+            del vectors
+            os.remove(vectors_path)
+
+        # 每次重建使用新的文件名，最后写清单；旧清单引用的文件在切换完成后才删除
+        build_id = int(started * 1000)
+        files = {}
+        for i, (era, index) in enumerate(indexes.items()):
+            files[era] = f"{build_id}_{i}.faiss"
+            tmp_path = self.index_dir / f".{files[era]}.tmp"
+            faiss.write_index(index, str(tmp_path))
+            os.replace(tmp_path, self.index_dir / files[era])
+
+        build_seconds = time.time() - started
+        manifest = {
+            "signature": signature,
+            "model": VECTOR_MODEL,
+            "index_type": self.config.get("index_type", "hnsw"),
+            "files": files,
+            "counts": counts,
+            "passages": n,
+            "encode_seconds": round(encode_seconds, 2),
+            "build_seconds": round(build_seconds, 2),
+            "passages_per_second": round(n / encode_seconds, 1) if encode_seconds else None,
+            "built_at": time.time(),
+        }
+        with atomic_open(self.manifest_path) as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        with self._lock:
+            self._indexes = indexes
+            self._manifest = manifest
+        for path in self.index_dir.glob("*.faiss"):
+            if path.name not in files.values():
+                os.remove(path)
+        self._collect_embeddings(n)
+        print(f"RAG索引已重建: {n} 段，向量化 {manifest['passages_per_second']} 段/秒，总耗时 {build_seconds:.1f}s")
+        return manifest
+
+    def _collect_embeddings(self, live_count: int):
+        """向量缓存中不再对应任何段落的行过多时回收"""
+        rows = self.embeddings.stats()["rows"]
+        if rows - live_count <= rows * EMBEDDING_CONFIG.get("gc_orphan_ratio", 0.25):
+            return
+        live_texts = (text for batch in search_index.iter_passage_texts() for _, text in batch)
+        self.embeddings.gc(live_texts)
+
+    def _load(self) -> bool:
+        """从磁盘加载与当前清单一致的索引"""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if manifest.get("model") != VECTOR_MODEL or manifest.get("index_type") != self.config.get("index_type", "hnsw"):
+            return False
+        indexes = {era: self._faiss.read_index(str(self.index_dir / name)) for era, name in manifest["files"].items()}
+        with self._lock:
+            self._indexes = indexes
+            self._manifest = manifest
+        return True
+
+    def refresh(self, force: bool = False) -> bool:
+        """检索索引的段落变化（或尚未建立）时重建，返回是否重建"""
+        if not self._load_dependencies():
+            return False
+        with self._build_lock:
+            self._last_refresh = time.monotonic()
+            search_index.refresh()
+            if not self._manifest:
+                self._load()
+            if not force and self._manifest.get("signature") == search_index.signature():
+                return False
+            self.build()
+            return True
+
+    def refresh_async(self) -> bool:
+        """距上次刷新超过 refresh_interval 秒时在后台线程中刷新，返回是否启动了刷新"""
+        if not self._load_dependencies():
+            return False
+        if self._build_thread is not None and self._build_thread.is_alive():
+            return False
+        if self._last_refresh and time.monotonic() - self._last_refresh < self.config.get("refresh_interval", 300):
+            return False
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"RAG索引刷新失败: {str(e)}")
+
+        self._build_thread = threading.Thread(target=run, name="rag-index-refresh", daemon=True)
+        self._build_thread.start()
+        return True
+
+    # ---- 检索 ----
+
+    def retrieve(self, query: str, era: Optional[str] = None, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """检索与 query 最相近的 k 个段落；era 为空或 "general" 时检索全部时代"""
+        if not self._load_dependencies():
+            return []
+        # 段落有变化时在后台重建；索引尚未建立时本次不提供参考资料
+        self.refresh_async()
+        if not self._manifest and not self._load():
+            return []
+
+        era = ERA_ALIASES.get(era, era)
+        with self._lock:
+            index = self._indexes.get(era if era and era != "general" else ALL_ERAS)
+        if index is None:
+            return []
+
+        k = k or self.config.get("top_k", 3)
+        started = time.perf_counter()
+        try:
+            query_vector = self.encode([query])
+        except RuntimeError:
+            return []
+        scores, ids = index.search(query_vector, k)
+        min_score = self.config.get("min_score", 0.0)
+        hits = [(int(pid), float(score)) for pid, score in zip(ids[0], scores[0]) if pid != -1 and score >= min_score]
+        passages = search_index.get_passages([pid for pid, _ in hits])
+        results = []
+        for pid, score in hits:
+            if pid in passages:
+                results.append({**passages[pid], "score": round(score, 4)})
+
+        self._record_latency(time.perf_counter() - started)
+        return results
+
+    async def aretrieve(self, query: str, era: Optional[str] = None, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """在线程池中检索，编码查询时不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.retrieve, query, era, k)
+
+    def _record_latency(self, seconds: float):
+        with self._lock:
+            self._queries += 1
+            self._latencies.append(seconds)
+            if len(self._latencies) > _LATENCY_WINDOW:
+                del self._latencies[:-_LATENCY_WINDOW]
+
+    def stats(self) -> Dict[str, Any]:
+        """索引规模、建索引吞吐和检索耗时"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            manifest = dict(self._manifest)
+        return {
+            "available": self.available,
+            "disabled_reason": self._disabled_reason,
+            "building": self._build_thread is not None and self._build_thread.is_alive(),
+            "index_type": manifest.get("index_type"),
+            "counts": manifest.get("counts", {}),
+            "encode_passages_per_second": manifest.get("passages_per_second"),
+            "build_seconds": manifest.get("build_seconds"),
+            "queries": self._queries,
+            "latency_ms_avg": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+            "latency_ms_p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2)
+            if latencies else None,
+            "embeddings": self.embeddings.stats(),
+        }
+
+
+def format_context(passages: List[Dict[str, Any]], max_chars: Optional[int] = None) -> str:
+    """把检索到的段落格式化为提示词中的参考资料"""
+    max_chars = max_chars or RAG_CONFIG.get("max_passage_chars", 300)
+    lines = []
+    for i, passage in enumerate(passages, 1):
+        text = passage["text"]
+        if len(text) > max_chars:
+            text = text[:max_chars] + "…"
+        era = f"（{passage['era']}）" if passage.get("era") else ""
+        lines.append(f"[{i}]{era} {text}")
+    return "\n".join(lines)
+
+
+# 全局检索器实例
+passage_retriever = PassageRetriever()
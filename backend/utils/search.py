@@ -0,0 +1,425 @@
+"""
+全文检索 - 基于SQLite FTS5的倒排索引，BM25排序
+
+索引三类文本，每段文字为一条记录：
+- backend/data/*.txt：按空行分段，段首的“XX时期：”作为时代
+- corpus/{era}.txt：每行一条
+- 概念文档中的 corpus 字段：每个时代的每条语料
+
+中文按字切分为单字 + 相邻二字（bigram），英文按单词小写；查询时多字词只使用bigram，
+相当于要求词中每两个相邻字都出现，精度接近短语匹配。
+每个来源记录签名（文件 mtime/大小，或概念的 last_updated），刷新时只重建变化的来源。
+"""
+import hashlib
+import html
+import itertools
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ..config import DATA_DIR, SEARCH_CONFIG
+from ..data_manager import data_manager
+from .cache import _source_signature
+
+_CJK = "㐀-䶿一-鿿豈-﫿"
+_TOKEN_RE = re.compile(f"[{_CJK}]+|[0-9A-Za-zÀ-ɏ]+")
+_ERA_PREFIX_RE = re.compile(r"^\s*(\S{1,8}?)时期[：:]")
+
+# 来源 -> 段落：(概念, 时代, 文本)
+Passage = Tuple[str, str, str]
+
+
+def _is_cjk(char: str) -> bool:
+    return "㐀" <= char <= "鿿" or "豈" <= char <= "﫿"
+
+
+def tokenize(text: str, query: bool = False) -> List[str]:
+    """切分为索引词：中文单字 + bigram，英文小写单词
+
+    query=True 时多字中文词只产出bigram，单字词产出单字。
+    """
+    tokens = []
+    for run in _TOKEN_RE.findall(text):
+        if not _is_cjk(run[0]):
+            tokens.append(run.lower())
+            continue
+        if len(run) == 1 or not query:
+            tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _match_expression(query: str) -> Optional[str]:
+    """查询 -> FTS5 MATCH 表达式（所有词都必须出现）"""
+    tokens = list(dict.fromkeys(tokenize(query, query=True)))
+    if not tokens:
+        return None
+    return " ".join(f'"{t}"' for t in tokens)
+
+
+def _highlight_pattern(query: str) -> Optional[re.Pattern]:
+    """高亮用的正则：查询中的完整词优先，其次是其中的bigram"""
+    terms = set()
+    for run in _TOKEN_RE.findall(query):
+        terms.add(run)
+        if _is_cjk(run[0]):
+            terms.update(run[i:i + 2] for i in range(len(run) - 1))
+    if not terms:
+        return None
+    alternatives = sorted(terms, key=len, reverse=True)
+    return re.compile("|".join(re.escape(t) for t in alternatives), re.IGNORECASE)
+
+
+def make_snippet(text: str, pattern: Optional[re.Pattern], width: int) -> str:
+    """截取第一个命中位置附近的文字，并用 <mark> 标出命中的词
+
+    返回HTML片段：语料原文经过转义，只有 <mark> 是标签，前端可以直接作为HTML插入；
+    在原文上匹配、分段转义，查询词不会命中 &amp; 等转义序列。
+    """
+    match = pattern.search(text) if pattern is not None else None
+    if match is None:
+        return html.escape(text[:width * 2]) + ("…" if len(text) > width * 2 else "")
+    start = max(0, match.start() - width)
+    end = min(len(text), match.end() + width)
+    window = text[start:end]
+    parts, last = [], 0
+    for m in pattern.finditer(window):
+        parts.append(html.escape(window[last:m.start()]))
+        parts.append(f"<mark>{html.escape(m.group(0))}</mark>")
+        last = m.end()
+    parts.append(html.escape(window[last:]))
+    return ("…" if start > 0 else "") + "".join(parts) + ("…" if end < len(text) else "")
+
+
+def _split_paragraphs(path: Path) -> Iterator[Passage]:
+    """概念文本文件：按空行分段，段首“XX时期：”识别时代"""
+    concept = path.stem
+    with open(path, 'r', encoding='utf-8') as f:
+        paragraph: List[str] = []
+        for line in itertools.chain(f, [""]):
+            if line.strip():
+                paragraph.append(line.strip())
+                continue
+            if paragraph:
+                text = "".join(paragraph)
+                match = _ERA_PREFIX_RE.match(text)
+                yield concept, match.group(1) if match else "", text
+                paragraph = []
+
+
+class SearchIndex:
+    """磁盘上的全文检索索引
+
+    写入（刷新）在后台线程中进行，查询使用线程本地的只读连接，WAL模式下互不阻塞。
+
+    词项由 tokenize() 预先切分并以空格连接，FTS5 只需按空格拆分（ascii分词器）。
+    """
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sources (
+        key TEXT PRIMARY KEY,
+        signature TEXT,
+        passages INTEGER,
+        updated_at REAL
+    );
+    CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS passages (
+        id INTEGER PRIMARY KEY,
+        source TEXT NOT NULL,
+        concept TEXT,
+        era TEXT,
+        text TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_passages_source ON passages (source);
+    CREATE VIRTUAL TABLE IF NOT EXISTS passages_fts USING fts5(tokens, content='', tokenize='ascii');
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config if config is not None else SEARCH_CONFIG
+        self.db_path = Path(self.config["index_path"])
+        self._local = threading.local()
+        self._build_lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._last_refresh = 0.0
+        self._last_result: Dict[str, Any] = {}
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if not self._schema_ready:
+                conn.executescript(self._SCHEMA)
+                self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    # ---- 来源 ----
+
+    def _sources(self) -> Iterator[Tuple[str, Any, Any]]:
+        """所有来源：(键, 签名, 段落生成函数)"""
+        for path in sorted(Path(DATA_DIR).glob("*.txt")):
+            yield f"text:{path.name}", _source_signature(path), lambda p=path: _split_paragraphs(p)
+
+        corpus_index = data_manager.corpus_index
+        for era in corpus_index.eras():
+            path = corpus_index.corpus_dir / f"{era}.txt"
+            yield (f"corpus:{era}", _source_signature(path),
+                   lambda era=era: (("", era, text) for text in data_manager.corpus_reader(era)))
+
+        for name in data_manager.get_all_concepts():
+            source = data_manager.concept_source(name)
+            signature = (_source_signature(source) if source is not None
+                         else data_manager.get_concept_metadata(name).get("last_updated"))
+            yield f"concept:{name}", signature, lambda name=name: self._concept_passages(name)
+
+    @staticmethod
+    def _concept_passages(name: str) -> Iterator[Passage]:
+        data = data_manager.store.load(name) or {}
+        for era, texts in (data.get("corpus") or {}).items():
+            for text in texts:
+                if text and text.strip():
+                    yield name, era, text.strip()
+
+    # ---- 建索引 ----
+
+    def _delete_source(self, conn: sqlite3.Connection, key: str):
+        """从倒排索引中删除来源的所有段落（无内容表需要提供原始词项）"""
+        rows = conn.execute("SELECT id, text FROM passages WHERE source = ?", (key,))
+        conn.executemany(
+            "INSERT INTO passages_fts (passages_fts, rowid, tokens) VALUES ('delete', ?, ?)",
+            ((pid, " ".join(tokenize(text))) for pid, text in rows),
+        )
+        conn.execute("DELETE FROM passages WHERE source = ?", (key,))
+        conn.execute("DELETE FROM sources WHERE key = ?", (key,))
+
+    def _index_source(self, conn: sqlite3.Connection, key: str, signature: str, passages) -> int:
+        batch_size = self.config.get("batch_size", 5000)
+        count = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._delete_source(conn, key)
+            batch: List[Passage] = []
+            for passage in passages():
+                batch.append(passage)
+                if len(batch) >= batch_size:
+                    count += self._insert(conn, key, batch)
+                    batch = []
+            count += self._insert(conn, key, batch)
+            conn.execute(
+                "INSERT INTO sources (key, signature, passages, updated_at) VALUES (?, ?, ?, ?)",
+                (key, signature, count, time.time()),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return count
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, key: str, batch: List[Passage]) -> int:
+        if not batch:
+            return 0
+        # 在事务内预先分配行号，两张表都可以批量写入。
+        # 行号只增不减（持久化的计数器），删除后重建的来源不会复用旧行号：
+        # RAG索引按行号保存段落，重建前仍可能检索到已删除的行号
+        row = conn.execute("SELECT value FROM counters WHERE name = 'passage_id'").fetchone()
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM passages").fetchone()[0]
+        first_id = max(row[0] if row else 0, max_id) + 1
+        conn.execute(
+            "INSERT OR REPLACE INTO counters (name, value) VALUES ('passage_id', ?)",
+            (first_id + len(batch) - 1,),
+        )
+        conn.executemany(
+            "INSERT INTO passages (id, source, concept, era, text) VALUES (?, ?, ?, ?, ?)",
+            ((first_id + i, key, concept, era, text) for i, (concept, era, text) in enumerate(batch)),
+        )
+        conn.executemany(
+            "INSERT INTO passages_fts (rowid, tokens) VALUES (?, ?)",
+            ((first_id + i, " ".join(tokenize(text))) for i, (_, _, text) in enumerate(batch)),
+        )
+        return len(batch)
+
+    def refresh(self, force: bool = False) -> Dict[str, Any]:
+        """增量刷新：只重建签名变化的来源，删除已不存在的来源"""
+        with self._build_lock:
+            started = time.time()
+            conn = self._connect()
+            indexed = dict(conn.execute("SELECT key, signature FROM sources").fetchall())
+            seen, updated, passages = set(), [], 0
+
+            for key, signature, producer in self._sources():
+                seen.add(key)
+                signature = repr(signature)
+                if not force and indexed.get(key) == signature:
+                    continue
+                passages += self._index_source(conn, key, signature, producer)
+                updated.append(key)
+
+            removed = [key for key in indexed if key not in seen]
+            for key in removed:
+                conn.execute("BEGIN IMMEDIATE")
+                self._delete_source(conn, key)
+                conn.execute("COMMIT")
+
+            if updated or removed:
+                conn.execute("INSERT INTO passages_fts (passages_fts) VALUES ('optimize')")
+                print(f"检索索引已更新: {len(updated)} 个来源（{passages} 段），移除 {len(removed)} 个来源，"
+                      f"耗时 {time.time() - started:.1f}s")
+            self._last_refresh = time.monotonic()
+            self._last_result = {
+                "updated": updated,
+                "removed": removed,
+                "passages": passages,
+                "seconds": round(time.time() - started, 3),
+            }
+            return self._last_result
+
+    def refresh_async(self) -> bool:
+        """距上次刷新超过 refresh_interval 秒时在后台线程中刷新，返回是否启动了刷新"""
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return False
+        if self._last_refresh and time.monotonic() - self._last_refresh < self.config.get("refresh_interval", 60):
+            return False
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"检索索引刷新失败: {str(e)}")
+
+        self._refresh_thread = threading.Thread(target=run, name="search-index-refresh", daemon=True)
+        self._refresh_thread.start()
+        return True
+
+    # ---- 查询 ----
+
+    def search(
+        self,
+        query: str,
+        eras: Optional[List[str]] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Dict[str, Any]:
+        """BM25检索，返回按相关度排序的段落和高亮摘要"""
+        started = time.perf_counter()
+        expression = _match_expression(query)
+        results: List[Dict[str, Any]] = []
+        has_more = False
+
+        if expression is not None:
+            sql = (
+                "SELECT p.id, p.source, p.concept, p.era, p.text, passages_fts.rank "
+                "FROM passages_fts JOIN passages p ON p.id = passages_fts.rowid "
+                "WHERE passages_fts MATCH ?"
+            )
+            params: List[Any] = [expression]
+            if eras:
+                sql += f" AND p.era IN ({', '.join('?' * len(eras))})"
+                params.extend(eras)
+            sql += " ORDER BY passages_fts.rank LIMIT ? OFFSET ?"
+            params.extend([limit + 1, offset])
+
+            rows = self._connect().execute(sql, params).fetchall()
+            has_more = len(rows) > limit
+            pattern = _highlight_pattern(query)
+            width = self.config.get("snippet_chars", 60)
+            for pid, source, concept, era, text, rank in rows[:limit]:
+                results.append({
+                    "id": pid,
+                    "source": source,
+                    "concept": concept,
+                    "era": era,
+                    # FTS5 的 bm25 越小越相关，取反后越大越相关
+                    "score": round(-rank, 4),
+                    "snippet": make_snippet(text, pattern, width),
+                })
+
+        return {
+            "query": query,
+            "eras": eras or [],
+            "offset": offset,
+            "limit": limit,
+            "has_more": has_more,
+            "results": results,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    # ---- 供其他索引（向量检索）使用的段落访问 ----
+
+    def signature(self) -> str:
+        """所有来源签名的摘要，段落集合变化时随之变化"""
+        rows = self._connect().execute("SELECT key, signature FROM sources ORDER BY key").fetchall()
+        return hashlib.sha1(json.dumps(rows, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def passage_eras(self) -> List[Tuple[int, str]]:
+        """所有段落的 (id, 时代)，按 id 排序"""
+        return self._connect().execute("SELECT id, era FROM passages ORDER BY id").fetchall()
+
+    def iter_passage_texts(self, batch_size: int = 1024) -> Iterator[List[Tuple[int, str]]]:
+        """按 id 顺序分批产出 (id, 文本)"""
+        conn = self._connect()
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, text FROM passages WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
+
+    def match_texts(self, query: str, era: Optional[str] = None, limit: int = 200) -> List[str]:
+        """按BM25相关度返回包含查询词的段落全文"""
+        expression = _match_expression(query)
+        if expression is None:
+            return []
+        sql = ("SELECT p.text FROM passages_fts JOIN passages p ON p.id = passages_fts.rowid "
+               "WHERE passages_fts MATCH ?")
+        params: List[Any] = [expression]
+        if era is not None:
+            sql += " AND p.era = ?"
+            params.append(era)
+        sql += " ORDER BY passages_fts.rank LIMIT ?"
+        params.append(limit)
+        return [row[0] for row in self._connect().execute(sql, params)]
+
+    def get_passages(self, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """按 id 读取段落"""
+        if not ids:
+            return {}
+        rows = self._connect().execute(
+            f"SELECT id, source, concept, era, text FROM passages WHERE id IN ({', '.join('?' * len(ids))})",
+            list(ids),
+        ).fetchall()
+        return {
+            pid: {"id": pid, "source": source, "concept": concept, "era": era, "text": text}
+            for pid, source, concept, era, text in rows
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """索引规模和刷新状态；索引尚未建立时返回零值，不为读取统计创建数据库"""
+        sources, passages = 0, 0
+        if getattr(self._local, "conn", None) is not None or self.db_path.exists():
+            conn = self._connect()
+            sources, passages = conn.execute("SELECT COUNT(*), COALESCE(SUM(passages), 0) FROM sources").fetchone()
+        return {
+            "sources": sources,
+            "passages": passages,
+            "refreshing": self._refresh_thread is not None and self._refresh_thread.is_alive(),
+            "last_refresh": self._last_result,
+        }
+
+
+# 全局检索索引实例
+search_index = SearchIndex()
@@ -1,19 +1,33 @@
 from __future__ import annotations
 
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Sequence, Tuple
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Sequence, Tuple
 
-import matplotlib
-matplotlib.use("Agg")  # 使用无界面后端，便于服务器环境保存图片
-import matplotlib.pyplot as plt
-from sklearn.manifold import TSNE
+import numpy as np
 
-from gensim.models import Word2Vec
-from gensim.models.keyedvectors import KeyedVectors
+from ..config import CORPUS_DIR, DRIFT_CONFIG
+from .drift_table import drift_table, save_alignment
+from .neighbors import is_stale, neighbor_index, save_period_vectors, write_manifest
+from .projection import projection_engine
+
+# gensim / scikit-learn / matplotlib 导入耗时数秒，只在训练、降维和绘图时才导入
+if TYPE_CHECKING:
+    from gensim.models.keyedvectors import KeyedVectors
 
 
 PeriodName = str
 
+# 英文/数字单词，或连续的中文字符
+_TOKEN_RE = re.compile(r"[A-Za-z0-9]+|[\u3400-\u9fff\uf900-\ufaff]+")
+
 
 def _default_corpora() -> Dict[PeriodName, List[List[str]]]:
     """提供演示用的极小语料，生产中请替换为真实语料。
@@ -37,6 +51,180 @@ def _default_corpora() -> Dict[PeriodName, List[List[str]]]:
     }
 
 
+def tokenize_sentence(line: str) -> List[str]:
+    """一行文本切分为词序列。
+
+    英文/数字按单词（小写）；中文连续片段按顺序切成相邻的二字词（单字保留），
+    这样“自由”“理性”等二字概念直接出现在词表中，窗口内的词序也得以保留。
+    """
+
+    tokens: List[str] = []
+    for run in _TOKEN_RE.findall(line):
+        if run.isascii():
+            tokens.append(run.lower())
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class PeriodSentences:
+    """流式读取一个时期的语料文件（每行一句），不把语料整体读入内存。
+
+    Word2Vec 需要多遍扫描（建词表 + 每个 epoch），每次迭代都重新打开文件。
+    """
+
+    def __init__(self, path: Path, tokenizer: Callable[[str], List[str]] = tokenize_sentence):
+        self.path = Path(path)
+        self.tokenizer = tokenizer
+
+    def __iter__(self) -> Iterator[List[str]]:
+        with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                tokens = self.tokenizer(line)
+                if tokens:
+                    yield tokens
+
+
+def default_corpus_paths(corpus_dir: Path | None = None) -> Dict[PeriodName, Path]:
+    """语料目录下每个非空的 `{时期}.txt` 作为一个时期的训练语料"""
+
+    corpus_dir = Path(corpus_dir or CORPUS_DIR)
+    return {p.stem: p for p in sorted(corpus_dir.glob("*.txt")) if p.stat().st_size > 0}
+
+
+def plan_cores(
+    n_periods: int,
+    total_cores: int | None = None,
+    parallel: int | None = None,
+) -> Tuple[int, int]:
+    """在时期间并行和 gensim 内部 workers 之间分配CPU核。
+
+    返回：(同时训练的时期数, 每个模型的 workers)
+    """
+
+    total = max(1, total_cores or os.cpu_count() or 1)
+    parallel = max(1, min(parallel or total, n_periods, total))
+    return parallel, max(1, total // parallel)
+
+
+def _save_checkpoint(obj, path: Path) -> None:
+    """保存 gensim 对象（可能附带若干 .npy 大数组文件）。
+
+    先保存到临时目录，再把附带文件和主文件依次移入；主文件存在即表示已完整保存。
+    """
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f".{path.name}-", dir=path.parent))
+    try:
+        obj.save(str(tmp_dir / path.name))
+        for f in sorted(tmp_dir.iterdir(), key=lambda f: f.name == path.name):
+            os.replace(f, path.parent / f.name)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _train_period(
+    period: PeriodName,
+    source: Path | List[List[str]],
+    kv_path: Path,
+    model_path: Path,
+    params: Dict[str, Any],
+) -> Dict[str, Any]:
+    """训练单个时期的模型并立即保存（在子进程中执行），返回耗时统计"""
+
+    from gensim.models import Word2Vec
+
+    sentences = PeriodSentences(source) if isinstance(source, Path) else source
+    started = time.perf_counter()
+    model = Word2Vec(**params)
+    model.build_vocab(sentences)
+    if not model.wv.key_to_index:
+        raise ValueError(f"时期 {period} 的语料在 min_count={params.get('min_count')} 下没有可训练的词")
+
+    train_started = time.perf_counter()
+    _, raw_words = model.train(sentences, total_examples=model.corpus_count, epochs=model.epochs)
+    train_seconds = time.perf_counter() - train_started
+
+    _save_checkpoint(model, model_path)
+    _save_checkpoint(model.wv, kv_path)
+    return {
+        "period": period,
+        "vocab": len(model.wv.key_to_index),
+        "sentences": model.corpus_count,
+        "words": raw_words,
+        "seconds": round(time.perf_counter() - started, 2),
+        "words_per_sec": round(raw_words / train_seconds) if train_seconds else None,
+        "workers": params.get("workers"),
+    }
+
+
+def train_period_models(
+    sources: Dict[PeriodName, Path | List[List[str]]],
+    models_dir: Path,
+    vector_size: int = 100,
+    window: int = 5,
+    min_count: int = 1,
+    workers: int | None = None,
+    epochs: int = 50,
+    parallel: int | None = None,
+) -> List[Dict[str, Any]]:
+    """在进程池中并行训练多个时期的 Word2Vec，每个时期训练完立即保存 `.kv`/`.model`。
+
+    - sources：时期 -> 语料文件路径（流式读取）或已切分的句子列表
+    - parallel/workers 为 None 时按CPU核数自动分配（见 plan_cores）
+    - 某个时期失败不影响其他时期，已完成的时期重新运行时直接加载
+    返回每个时期的耗时、词数和训练速度（词/秒）。
+    """
+
+    if not sources:
+        return []
+    parallel, auto_workers = plan_cores(len(sources), parallel=parallel)
+    params = {
+        "vector_size": vector_size,
+        "window": window,
+        "min_count": min_count,
+        "workers": workers or auto_workers,
+        "epochs": epochs,
+    }
+    print(f"开始训练 {len(sources)} 个时期的Word2Vec：同时 {parallel} 个，每个 {params['workers']} 个worker")
+
+    started = time.perf_counter()
+    jobs = {
+        period: (period, source, models_dir / f"{period}.kv", models_dir / f"{period}.model", params)
+        for period, source in sources.items()
+    }
+    reports: List[Dict[str, Any]] = []
+    errors: Dict[PeriodName, BaseException] = {}
+
+    def record(report: Dict[str, Any]) -> None:
+        reports.append(report)
+        print(f"时期 {report['period']} 训练完成: {report['seconds']}s，{report['words_per_sec']} 词/秒，"
+              f"词表 {report['vocab']}，已保存")
+
+    if parallel == 1:
+        for period, args in jobs.items():
+            try:
+                record(_train_period(*args))
+            except Exception as e:
+                errors[period] = e
+    else:
+        # spawn：服务进程中有后台线程时 fork 不安全
+        with ProcessPoolExecutor(max_workers=parallel, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {pool.submit(_train_period, *args): period for period, args in jobs.items()}
+            for future in as_completed(futures):
+                try:
+                    record(future.result())
+                except Exception as e:
+                    errors[futures[future]] = e
+
+    print(f"Word2Vec训练结束: 成功 {len(reports)} 个，失败 {len(errors)} 个，总耗时 {time.perf_counter() - started:.1f}s")
+    if errors:
+        period, error = next(iter(errors.items()))
+        raise RuntimeError(f"时期 {'、'.join(errors)} 训练失败（{period}: {error}）") from error
+    return reports
+
+
 def train_or_load_models(
     periods: Sequence[PeriodName] | None = None,
     models_dir: Path | None = None,
@@ -44,60 +232,93 @@ def train_or_load_models(
     vector_size: int = 100,
     window: int = 5,
     min_count: int = 1,
-    workers: int = 1,
+    workers: int | None = None,
     epochs: int = 50,
+    corpus_paths: Dict[PeriodName, Path] | None = None,
+    parallel: int | None = None,
+    align: bool = True,
 ) -> Dict[PeriodName, KeyedVectors]:
     """为每个时期训练或加载 Word2Vec 模型，返回 KeyedVectors 映射。
 
     - 若 models_dir 下存在 `{period}.kv`（KeyedVectors）或 `{period}.model` 则优先加载
-    - 否则使用提供或默认的小语料训练并保存
+    - 其余时期并行训练（见 train_period_models）并保存
+    - 语料来源依次为：corpus_paths（流式读取）、corpora、语料目录下的 `{时期}.txt`、演示用小语料
+    - align 为 True 且未指定 periods 时，漂移表不存在或早于某个时期的模型则重新对齐（见 align_if_stale）
     """
 
     models_dir = Path(models_dir or (Path(__file__).resolve().parent.parent / "models"))
     models_dir.mkdir(parents=True, exist_ok=True)
 
-    corpora = corpora or _default_corpora()
+    if corpus_paths is not None:
+        sources: Dict[PeriodName, Any] = {p: Path(path) for p, path in corpus_paths.items()}
+    else:
+        sources = corpora or default_corpus_paths() or _default_corpora()
+    # 只训练/加载部分时期时不改动漂移表，避免覆盖全部时期的对齐结果
+    align = align and periods is None
     if periods is None:
-        periods = list(corpora.keys())
-
-    period_to_kv: Dict[PeriodName, KeyedVectors] = {}
+        periods = list(sources.keys())
 
+    todo: Dict[PeriodName, Any] = {}
     for period in periods:
         kv_path = models_dir / f"{period}.kv"
         model_path = models_dir / f"{period}.model"
 
         if kv_path.exists():
-            kv = KeyedVectors.load(str(kv_path), mmap='r')
-            period_to_kv[period] = kv
             continue
 
         if model_path.exists():
+            from gensim.models import Word2Vec
             model = Word2Vec.load(str(model_path))
-            period_to_kv[period] = model.wv
             # 同步保存一份 kv，便于下次更快加载
-            model.wv.save(str(kv_path))
+            _save_checkpoint(model.wv, kv_path)
             continue
 
-        # 训练
-        sentences = corpora.get(period)
-        if not sentences:
+        if not sources.get(period):
             raise ValueError(f"缺少时期 {period} 的训练语料")
+        todo[period] = sources[period]
 
-        model = Word2Vec(
-            sentences=sentences,
-            vector_size=vector_size,
-            window=window,
-            min_count=min_count,
-            workers=workers,
-            epochs=epochs,
-        )
-        model.save(str(model_path))
-        model.wv.save(str(kv_path))
-        period_to_kv[period] = model.wv
+    train_period_models(todo, models_dir, vector_size=vector_size, window=window,
+                        min_count=min_count, workers=workers, epochs=epochs, parallel=parallel)
 
+    from gensim.models.keyedvectors import KeyedVectors
+    period_to_kv = {period: KeyedVectors.load(str(models_dir / f"{period}.kv"), mmap='r') for period in periods}
+    export_neighbor_vectors(period_to_kv, models_dir)
+    if align:
+        align_if_stale(period_to_kv, models_dir)
     return period_to_kv
 
 
+def preload_period_models(models_dir: Path | None = None) -> Dict[PeriodName, KeyedVectors]:
+    """以只读内存映射加载 models_dir 下已保存的各时期 `.kv`，不训练缺失的时期。"""
+
+    from gensim.models.keyedvectors import KeyedVectors
+
+    models_dir = Path(models_dir or (Path(__file__).resolve().parent.parent / "models"))
+    return {path.stem: KeyedVectors.load(str(path), mmap='r') for path in sorted(models_dir.glob("*.kv"))}
+
+
+def export_neighbor_vectors(
+    period_to_kv: Dict[PeriodName, KeyedVectors],
+    models_dir: Path | None = None,
+) -> List[PeriodName]:
+    """导出各时期的词表和归一化向量并建立近邻索引（见 neighbors），只处理 `.kv` 更新过的时期。
+
+    返回重新导出的时期；都是最新时不做任何写入。
+    """
+
+    models_dir = Path(models_dir or (Path(__file__).resolve().parent.parent / "models"))
+    exported: List[PeriodName] = []
+    for period, kv in period_to_kv.items():
+        if is_stale(models_dir, period, models_dir / f"{period}.kv"):
+            save_period_vectors(models_dir, period, kv.index_to_key, kv.get_normed_vectors())
+            exported.append(period)
+    if exported:
+        write_manifest(models_dir, list(period_to_kv))
+        if models_dir.resolve() == neighbor_index.directory.resolve():
+            neighbor_index.build()
+    return exported
+
+
 def extract_vectors_for_word(
     word: str,
     period_to_kv: Dict[PeriodName, KeyedVectors],
@@ -125,6 +346,81 @@ def extract_vectors_for_word(
     return periods, vectors
 
 
+def align_period_models(
+    period_to_kv: Dict[PeriodName, KeyedVectors],
+    periods: Sequence[PeriodName] | None = None,
+    max_vocab: int | None = None,
+    out_dir: Path | None = None,
+) -> Dict[str, Any]:
+    """对齐各时期的词向量并生成漂移表（见 drift_table.save_alignment）。
+
+    共有词为所有时期词表的交集，按第一个时期的词频排序，最多 max_vocab 个。
+    """
+
+    periods = list(periods or period_to_kv.keys())
+    if len(periods) < 2:
+        raise ValueError("至少需要两个时期才能计算漂移")
+    kvs = [period_to_kv[p] for p in periods]
+    max_vocab = max_vocab or DRIFT_CONFIG["max_vocab"]
+
+    shared: List[str] = []
+    for word in kvs[0].index_to_key:
+        if all(word in kv.key_to_index for kv in kvs[1:]):
+            shared.append(word)
+            if len(shared) >= max_vocab:
+                break
+    if not shared:
+        raise ValueError(f"时期 {', '.join(periods)} 没有共有词")
+
+    stack = np.stack([kv.vectors[[kv.key_to_index[w] for w in shared]] for kv in kvs])
+    counts = np.stack([
+        np.asarray([kv.get_vecattr(w, "count") for w in shared], dtype=np.int64) for kv in kvs
+    ]).min(axis=0)
+    return save_alignment(Path(out_dir or DRIFT_CONFIG["table_dir"]), periods, shared, stack, counts)
+
+
+def _drift_table_dir(models_dir: Path) -> Path:
+    """默认模型目录对应 DRIFT_CONFIG["table_dir"]，其他模型目录写入其下的 aligned/"""
+    default_dir = Path(__file__).resolve().parent.parent / "models"
+    if models_dir.resolve() == default_dir.resolve():
+        return Path(DRIFT_CONFIG["table_dir"])
+    return models_dir / "aligned"
+
+
+def alignment_is_stale(out_dir: Path, periods: Sequence[PeriodName], kv_paths: Sequence[Path]) -> bool:
+    """漂移表不存在、时期列表不同或早于任一时期的 `.kv` 时需要重新对齐"""
+    meta_path = Path(out_dir) / "meta.json"
+    try:
+        built = os.stat(meta_path).st_mtime_ns
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return True
+    if meta.get("periods") != list(periods):
+        return True
+    return any(os.stat(path).st_mtime_ns > built for path in kv_paths if path.exists())
+
+
+def align_if_stale(
+    period_to_kv: Dict[PeriodName, KeyedVectors],
+    models_dir: Path | None = None,
+) -> Dict[str, Any] | None:
+    """各时期模型训练或更新后重新生成漂移表；已是最新、时期不足两个或没有共有词时跳过，返回新表的 meta"""
+
+    models_dir = Path(models_dir or (Path(__file__).resolve().parent.parent / "models"))
+    periods = list(period_to_kv)
+    if len(periods) < 2:
+        return None
+    out_dir = _drift_table_dir(models_dir)
+    if not alignment_is_stale(out_dir, periods, [models_dir / f"{p}.kv" for p in periods]):
+        return None
+    try:
+        return align_period_models(period_to_kv, periods, out_dir=out_dir)
+    except ValueError as e:
+        print(f"跳过生成漂移表: {str(e)}")
+        return None
+
+
 def tsne_reduce(vectors: Sequence[Sequence[float]], random_state: int = 42) -> List[Tuple[float, float]]:
     """使用 TSNE 将向量降维至二维。
 
@@ -137,6 +433,7 @@ def tsne_reduce(vectors: Sequence[Sequence[float]], random_state: int = 42) -> L
 
     # perplexity 必须 < n
     perplexity = max(2.0, min(30.0, float(n - 1)))
+    from sklearn.manifold import TSNE
     tsne = TSNE(n_components=2, perplexity=perplexity, learning_rate='auto', init='random', random_state=random_state)
     emb = tsne.fit_transform(vectors)
     return [(float(x), float(y)) for x, y in emb]
@@ -147,6 +444,7 @@ def plot_semantic_shift(
     coords: Sequence[Tuple[float, float]],
     periods: Sequence[str],
     out_dir: Path | None = None,
+    method: str = "TSNE",
 ) -> str:
     """绘制连线散点图并保存至 static/{word}.png，返回文件路径字符串。"""
 
@@ -154,6 +452,10 @@ def plot_semantic_shift(
     out_dir.mkdir(parents=True, exist_ok=True)
     out_path = out_dir / f"{word}.png"
 
+    import matplotlib
+    matplotlib.use("Agg")  # 使用无界面后端，便于服务器环境保存图片
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(8, 4.5), dpi=120)
     xs = [p[0] for p in coords]
     ys = [p[1] for p in coords]
@@ -167,9 +469,9 @@ def plot_semantic_shift(
     for (x, y), period in zip(coords, periods):
         plt.text(x + 0.5, y + 0.5, period, fontsize=9)
 
-    plt.title(f"{word} 的语义漂移（TSNE）")
-    plt.xlabel("TSNE-1")
-    plt.ylabel("TSNE-2")
+    plt.title(f"{word} 的语义漂移（{method}）")
+    plt.xlabel(f"{method}-1")
+    plt.ylabel(f"{method}-2")
     plt.grid(True, linestyle='--', alpha=0.3)
     plt.tight_layout()
     plt.savefig(out_path, format="png")
@@ -184,12 +486,21 @@ def generate_semantic_shift_figure(
     models_dir: Path | None = None,
     corpora: Dict[PeriodName, List[List[str]]] | None = None,
 ) -> str:
-    """端到端：训练/加载 -> 提取向量 -> TSNE -> 绘图保存，返回文件路径。
+    """端到端：训练/加载 -> 提取向量 -> 降维 -> 绘图保存，返回文件路径。
+
+    使用默认模型且已生成漂移表时，直接用共享的PCA投影（见 projection.py），
+    坐标可与其他词比较；否则对该词的各时期向量单独做 TSNE。
 
     示例：
         generate_semantic_shift_figure("virtue")
     """
 
+    if periods is None and models_dir is None and corpora is None and drift_table.available:
+        projected = projection_engine.project([word])
+        if projected["items"]:
+            coords = [(c["x"], c["y"]) for c in projected["items"][0]["coords"]]
+            return plot_semantic_shift(word, coords, projected["periods"], method="PCA")
+
     period_to_kv = train_or_load_models(periods=periods, models_dir=models_dir, corpora=corpora)
     used_periods, vectors = extract_vectors_for_word(word, period_to_kv)
     coords = tsne_reduce(vectors)
@@ -197,4 +508,28 @@ def generate_semantic_shift_figure(
     return out_path
 
 
+def main(argv: Sequence[str] | None = None) -> None:
+    """命令行入口：训练或加载各时期模型，导出近邻向量并生成漂移表
+
+    用法：
+        python -m backend.utils.semantic_shift align [--models-dir DIR] [--parallel N] [--force]
+    """
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="训练/加载分时期Word2Vec并生成跨时期漂移表")
+    sub = parser.add_subparsers(dest="command", required=True)
+    align = sub.add_parser("align", help="训练缺少的时期模型，漂移表过期时重新对齐")
+    align.add_argument("--models-dir", type=Path, help="模型目录，默认 backend/models")
+    align.add_argument("--parallel", type=int, help="同时训练的时期数，默认按CPU核数分配")
+    align.add_argument("--force", action="store_true", help="漂移表已是最新时也重新对齐")
+    args = parser.parse_args(argv)
+
+    models_dir = Path(args.models_dir or (Path(__file__).resolve().parent.parent / "models"))
+    period_to_kv = train_or_load_models(models_dir=models_dir, parallel=args.parallel, align=not args.force)
+    if args.force:
+        align_period_models(period_to_kv, out_dir=_drift_table_dir(models_dir))
+
 
+if __name__ == "__main__":
+    main()
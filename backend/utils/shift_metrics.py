@@ -0,0 +1,153 @@
+"""
+定量语义漂移 - 不调用LLM，由各时代语料中包含概念的段落计算漂移与离散度
+
+- 每个时代取全文检索中与概念最相关的若干段落，编码为向量
+  （有句向量模型时使用 VECTOR_MODEL 及其向量缓存，否则使用哈希n-gram向量）
+- 四个时代一次性放入 (时代, 段落, 维度) 数组，用掩码处理段落数不同的情况
+- dispersion：段落向量与本时代质心的平均余弦距离，即概念用法的分散程度，作为图表数值
+- drift：相邻时代质心之间的余弦距离；drift_from_origin：相对最早有语料的时代
+结果只取决于语料，同一概念多次计算得到相同数值。
+"""
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import SHIFT_METRICS_CONFIG
+from .retrieval import ERA_ALIASES, passage_retriever
+from .search import search_index, tokenize
+
+
+def hashed_vectors(texts: List[str], dim: int) -> np.ndarray:
+    """文本 -> 归一化的哈希词袋向量（中文单字+bigram，英文单词）"""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for i, text in enumerate(texts):
+        buckets = [zlib.crc32(t.encode("utf-8")) % dim for t in tokenize(text)]
+        if buckets:
+            np.add.at(vectors[i], buckets, 1.0)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def shift_scores(vectors: np.ndarray, mask: np.ndarray) -> Dict[str, np.ndarray]:
+    """按时代批量计算质心、离散度和漂移
+
+    Args:
+        vectors: (时代数, 段落数, 维度) 的归一化向量，不足的位置补零
+        mask: (时代数, 段落数) 的布尔数组，标记有效段落
+    """
+    counts = mask.sum(axis=1)
+    weights = mask.astype(np.float32)
+    sums = np.einsum("enp,en->ep", vectors, weights)
+    centroids = _normalize(sums)
+    present = counts > 0
+
+    # 每个段落到本时代质心的余弦相似度
+    similarity = np.einsum("enp,ep->en", vectors, centroids)
+    mean_similarity = (similarity * weights).sum(axis=1) / np.maximum(counts, 1)
+    dispersion = np.where(present, 1.0 - mean_similarity, np.nan)
+
+    # 缺少语料的时代沿用上一个有语料时代的质心，使漂移落在有语料的时代之间
+    filled = centroids.copy()
+    last = None
+    for e in range(len(filled)):
+        if present[e]:
+            last = filled[e]
+        elif last is not None:
+            filled[e] = last
+    drift = np.full(len(filled), np.nan)
+    drift[1:] = 1.0 - np.einsum("ep,ep->e", filled[1:], filled[:-1])
+    drift[~present] = np.nan
+    if present.any():
+        origin = filled[int(np.argmax(present))]
+        drift_from_origin = np.where(present, 1.0 - filled @ origin, np.nan)
+    else:
+        drift_from_origin = np.full(len(filled), np.nan)
+    return {
+        "counts": counts,
+        "dispersion": np.clip(dispersion, 0.0, 1.0),
+        "drift": np.clip(drift, 0.0, 1.0),
+        "drift_from_origin": np.clip(drift_from_origin, 0.0, 1.0),
+    }
+
+
+class ShiftMetrics:
+    """从语料计算概念在各时代的定量语义漂移"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config if config is not None else SHIFT_METRICS_CONFIG
+        self.eras: List[str] = list(ERA_ALIASES.values())
+        # auto 模式下句向量不可用的原因，记录后不再重复尝试
+        self._embedding_error: Optional[str] = None
+
+    def _encode(self, texts: List[str]) -> Tuple[np.ndarray, str]:
+        """按配置选择向量表示，句向量模型不可用时（auto）退回哈希向量"""
+        representation = self.config.get("representation", "auto")
+        use_embedding = representation == "embedding" or (representation == "auto" and self._embedding_error is None)
+        if use_embedding and texts:
+            try:
+                return passage_retriever.encode(texts), "embedding"
+            except (RuntimeError, OSError) as e:
+                if representation == "embedding":
+                    raise
+                self._embedding_error = str(e)
+                print(f"句向量不可用，改用哈希向量计算语义漂移: {str(e)}")
+        return hashed_vectors(texts, self.config.get("hashed_dim", 1024)), "hashed"
+
+    def compute(self, word: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        # 索引由后台线程增量刷新，这里只在到期时触发，不在请求中重建（与 /api/search 相同）
+        search_index.refresh_async()
+        limit = self.config.get("max_passages_per_era", 200)
+        per_era = [search_index.match_texts(word, era, limit) for era in self.eras]
+        texts = [t for passages in per_era for t in passages]
+        encoded, method = self._encode(texts)
+
+        # 组装成 (时代, 段落, 维度) 的补零数组
+        width = max((len(p) for p in per_era), default=0)
+        dim = encoded.shape[1]
+        vectors = np.zeros((len(self.eras), max(width, 1), dim), dtype=np.float32)
+        mask = np.zeros(vectors.shape[:2], dtype=bool)
+        offset = 0
+        for e, passages in enumerate(per_era):
+            vectors[e, :len(passages)] = encoded[offset:offset + len(passages)]
+            mask[e, :len(passages)] = True
+            offset += len(passages)
+        scores = shift_scores(vectors, mask)
+
+        def as_list(values: np.ndarray) -> List[Optional[float]]:
+            return [None if np.isnan(v) else round(float(v), 4) for v in values]
+
+        dispersion = scores["dispersion"]
+        present = ~np.isnan(dispersion)
+        # 图表需要四个数值，缺少语料的时代取其他时代的平均值
+        fill = float(dispersion[present].mean()) if present.any() else 0.0
+        values = [round(float(v), 4) if ok else round(fill, 4) for v, ok in zip(dispersion, present)]
+        covered = [era for era, ok in zip(self.eras, present) if ok]
+        return {
+            "values": values,
+            "dispersion": as_list(dispersion),
+            "drift": as_list(scores["drift"]),
+            "drift_from_origin": as_list(scores["drift_from_origin"]),
+            "passages": dict(zip(self.eras, (int(c) for c in scores["counts"]))),
+            "method": method,
+            "description": (f"{word}：由语料计算的用法离散度（覆盖{'、'.join(covered)}）" if covered
+                            else f"{word}：语料中没有包含该概念的段落"),
+            "quantitative": True,
+            "ai_generated": False,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+
+shift_metrics = ShiftMetrics()
+
+
+def compute_semantic_shift(word: str) -> Dict[str, Any]:
+    """概念的定量语义漂移数据（与 get_semantic_shift_data 的格式兼容）"""
+    return shift_metrics.compute(word)
@@ -0,0 +1,78 @@
+"""
+单飞合并 - 同一键的并发请求共享一次执行结果
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+
+class SingleFlight:
+    """合并同一键上正在进行的异步任务
+
+    第一个调用者启动任务，之后的调用者等待同一个任务，所有人拿到同一个结果。
+    任务抛出的异常会传递给所有等待者；任务结束后立即移除，结果和异常都不会被保留。
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        # 每个任务的开始时间和等待者加入的时间；按任务而不是按键记录，
+        # 旧任务的完成回调晚于同一键的新任务启动时不会取走新任务的计数
+        self._started: Dict[asyncio.Task, float] = {}
+        self._joined: Dict[asyncio.Task, List[float]] = {}
+        self._leaders = 0
+        self._coalesced = 0
+        self._failures = 0
+        self._saved_seconds = 0.0
+
+    def join(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """返回该键上正在进行的任务，没有时以 func 启动一个新任务
+
+        调用方需要自己 shield 后等待；需要在任务真正结束时做清理（例如释放并发名额）时
+        可以在返回的任务上添加完成回调。
+        """
+        task = self._inflight.get(key)
+        if task is not None and not task.done():
+            self._coalesced += 1
+            self._joined[task].append(time.monotonic())
+            return task
+        self._leaders += 1
+        task = asyncio.ensure_future(func())
+        self._inflight[key] = task
+        self._started[task] = time.monotonic()
+        self._joined[task] = []
+        task.add_done_callback(lambda t: self._finish(key, t))
+        return task
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """执行 func，若同一键已有任务在进行则等待其结果"""
+        # shield：某个调用者断开（被取消）时不影响其他等待者和正在进行的生成
+        return await asyncio.shield(self.join(key, func))
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        """任务结束后清理并记录节省的等待时间
+
+        等待者在任务开始 t 秒后加入，比自己重新执行少等 t 秒，saved_seconds 为这些时间之和。
+        """
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        started = self._started.pop(task)
+        joined = self._joined.pop(task)
+        if task.cancelled() or task.exception() is not None:
+            self._failures += 1
+        else:
+            self._saved_seconds += sum(t - started for t in joined)
+
+    def in_flight(self, key: Hashable) -> bool:
+        """该键是否有任务正在进行"""
+        task = self._inflight.get(key)
+        return task is not None and not task.done()
+
+    def stats(self) -> Dict[str, Any]:
+        """合并统计"""
+        return {
+            "leaders": self._leaders,
+            "coalesced": self._coalesced,
+            "in_flight": len(self._inflight),
+            "failures": self._failures,
+            "saved_seconds": round(self._saved_seconds, 3),
+        }
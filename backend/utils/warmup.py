@@ -0,0 +1,165 @@
+"""
+启动预热 - 在实例接收流量前加载概念索引、字体与图表模板、分时期模型，并建立LLM连接
+
+预热在 lifespan 中作为后台任务运行，服务可以立即响应；全部步骤结束前 /ready 返回503，
+负载均衡据此只把流量转发给已预热的实例。每一步单独计时，出错只记录，不影响其他步骤。
+"""
+import asyncio
+import importlib.util
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from ..config import WARMUP_CONFIG
+from ..data_manager import data_manager
+from .llm_client import llm_client
+
+# 读入页缓存时每次读取的行数
+_TOUCH_CHUNK = 65536
+
+
+def _touch(vectors) -> int:
+    """顺序读一遍内存映射的数组，让页面进入系统页缓存，返回字节数"""
+    for i in range(0, len(vectors), _TOUCH_CHUNK):
+        vectors[i:i + _TOUCH_CHUNK].sum()
+    return int(vectors.nbytes)
+
+
+class Warmup:
+    """按配置并行执行预热步骤，记录每一步的耗时和结果"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config if config is not None else WARMUP_CONFIG
+        self.ready = not self.config.get("enabled", True)
+        self.timed_out = False
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    # ---- 预热步骤 ----
+
+    def _concepts(self) -> List[str]:
+        names = self.config.get("concepts") or data_manager.get_all_concepts()
+        return list(names)[:self.config.get("max_concepts", 50)]
+
+    def warm_concepts(self) -> Dict[str, Any]:
+        """建立概念名称列表并读入预热概念的文档"""
+        names = self._concepts()
+        loaded = sum(1 for name in names if data_manager.load_concept_data(name))
+        return {"concepts": loaded}
+
+    def warm_charts(self) -> Dict[str, Any]:
+        """加载字体、绘制图表静态层，并预先绘制预热概念的默认图表
+
+        与 /api/semantic_shift/{word} 默认请求使用相同的数据：有已保存的AI分析时用它，否则用预设数据；
+        预热不调用LLM。
+        """
+        from .chart_cache import chart_cache
+        from .concepts import get_semantic_shift_data
+        from .explain import _lookup_analysis
+        from .plot import _build_static_layer, get_system_font
+
+        get_system_font()
+        _build_static_layer()
+        rendered = 0
+        for name in self._concepts():
+            shift_data = _lookup_analysis(name)[0] or get_semantic_shift_data(name)
+            key = chart_cache.key_for(name, shift_data)
+            if chart_cache.lookup(key) is None:
+                chart_cache.render(name, key, shift_data)
+                rendered += 1
+        return {"rendered": rendered}
+
+    def warm_period_models(self) -> Dict[str, Any]:
+        """漂移表、投影、近邻索引和已训练的分时期词向量读入页缓存（不训练缺失的时期）"""
+        from .drift_table import drift_table
+
+        result: Dict[str, Any] = {"bytes": 0}
+        if drift_table.available:
+            from .projection import projection_engine
+            result["bytes"] += _touch(drift_table.vectors())
+            projection_engine.project([])
+            result["drift_words"] = len(drift_table.words())
+        from .neighbors import neighbor_index
+        if neighbor_index.available:
+            result["neighbor_periods"] = neighbor_index.build()
+        # gensim 是可选依赖，在 preload_period_models 内部才导入；未安装时跳过而不是报错
+        if importlib.util.find_spec("gensim") is None:
+            result.update(status="skipped", reason="未安装gensim")
+            return result
+        from .semantic_shift import preload_period_models
+        period_to_kv = preload_period_models()
+        result["periods"] = list(period_to_kv)
+        result["bytes"] += sum(_touch(kv.vectors) for kv in period_to_kv.values())
+        return result
+
+    async def warm_llm(self) -> Dict[str, Any]:
+        """并发探测LLM服务，预先建立连接池中的保活连接"""
+        connections = self.config.get("llm_connections", 4)
+        results = await asyncio.gather(*(llm_client.probe() for _ in range(connections)))
+        # LLM不可用时服务仍可返回预设数据，不阻止实例就绪
+        return {"available": any(results), "connections": connections}
+
+    # ---- 执行 ----
+
+    async def _step(self, name: str, func: Callable):
+        started = time.perf_counter()
+        self.steps[name] = {"status": "running"}
+        try:
+            if asyncio.iscoroutinefunction(func):
+                result = await func()
+            else:
+                result = await asyncio.get_running_loop().run_in_executor(None, func)
+            self.steps[name] = {"status": "done", **result}
+        except Exception as e:
+            print(f"预热步骤 {name} 出错: {str(e)}")
+            self.steps[name] = {"status": "error", "error": str(e)}
+        self.steps[name]["seconds"] = round(time.perf_counter() - started, 3)
+
+    async def run(self):
+        """按配置执行各预热步骤，结束（或超时）后标记为就绪"""
+        self.started_at = time.time()
+        steps = [
+            ("concept_index", self.warm_concepts),
+            ("charts", self.warm_charts),
+            ("period_models", self.warm_period_models),
+            ("llm", self.warm_llm),
+        ]
+        enabled = [(name, func) for name, func in steps
+                   if self.config.get(name, True) and not (name == "llm" and not self.config.get("llm_connections"))]
+
+        async def run_all():
+            # 各步骤互不依赖，LLM连接与本地加载并行
+            await asyncio.gather(*(self._step(name, func) for name, func in enabled))
+
+        try:
+            await asyncio.wait_for(run_all(), timeout=self.config.get("timeout", 300))
+        except asyncio.TimeoutError:
+            self.timed_out = True
+            print("预热超时，跳过未完成的步骤")
+        self.finished_at = time.time()
+        self.ready = True
+        print(f"预热完成，耗时 {self.finished_at - self.started_at:.1f}s")
+
+    def start(self):
+        """在后台启动预热（lifespan 中调用），已就绪或已启动时直接返回"""
+        if self.ready or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "timed_out": self.timed_out,
+            "seconds": round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else None,
+            "steps": self.steps,
+        }
+
+
+warmup = Warmup()
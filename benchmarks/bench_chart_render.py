@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+图表绘制基准测试：对比每次重绘静态层/重新加载字体与使用缓存模板的吞吐量
+
+用法：
+    python benchmarks/bench_chart_render.py [-n 200]
+"""
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.utils.plot import _build_static_layer, get_system_font, render_semantic_shift_chart
+
+SAMPLE_DATA = {
+    "values": [0.3, 0.45, 0.62, 0.81],
+    "ai_generated": True,
+    "overall_trend": "From concrete civic practice to abstract individual autonomy",
+    "key_insights": ["Stoic inner freedom", "Kantian autonomy", "Existential choice"],
+}
+
+
+def run(n: int, cached: bool, encode: bool) -> float:
+    """返回每秒绘制的图表数"""
+    started = time.perf_counter()
+    for i in range(n):
+        if not cached:
+            # 模拟旧实现：每次请求都重新加载字体并重绘全部静态元素
+            get_system_font.cache_clear()
+            _build_static_layer.cache_clear()
+        img = render_semantic_shift_chart(f"concept-{i}", SAMPLE_DATA)
+        if encode:
+            img.save(io.BytesIO(), "PNG")
+    return n / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="语义漂移图表绘制基准测试")
+    parser.add_argument("-n", type=int, default=200, help="每组绘制次数")
+    args = parser.parse_args()
+
+    # 预热
+    run(5, cached=True, encode=True)
+
+    print(f"{'mode':<28}{'charts/sec':>12}")
+    for encode in (False, True):
+        suffix = " + PNG" if encode else ""
+        before = run(args.n, cached=False, encode=encode)
+        after = run(args.n, cached=True, encode=encode)
+        print(f"{'full redraw' + suffix:<28}{before:>12.1f}")
+        print(f"{'cached template' + suffix:<28}{after:>12.1f}  ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
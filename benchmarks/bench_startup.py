@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+启动耗时基准测试：测量后端的导入耗时和冷启动到首个 /api/concepts 响应的时间，并检查导入预算
+
+- 导入预算：在全新解释器中以 `python -X importtime` 导入 backend.main，
+  累计耗时超过 --budget-ms，或启动时就导入了重量级依赖（numpy、PIL、gensim 等）时以非零状态退出，可直接用于CI
+- 冷启动：启动 uvicorn 子进程，轮询 /api/concepts 直到返回200
+
+用法：
+    python benchmarks/bench_startup.py [--budget-ms 800] [-n 3] [--skip-server]
+"""
+import argparse
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+# 项目根目录，子进程从这里导入 backend
+project_root = Path(__file__).resolve().parent.parent
+
+# 只在首次使用时才允许导入的模块
+HEAVY_MODULES = [
+    "numpy", "PIL", "gensim", "sklearn", "matplotlib", "faiss", "sentence_transformers", "torch",
+]
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(project_root), env.get("PYTHONPATH")]))
+    return env
+
+
+def measure_imports(module: str = "backend.main"):
+    """返回 (模块累计导入耗时ms, 耗时最多的直接依赖, 已导入的重量级模块)"""
+    code = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=project_root, env=_env(), capture_output=True, text=True, check=True,
+    )
+    total_us = None
+    children, pending = [], []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        # 子模块先于父模块输出：顶层模块之前缩进多一级的行就是它的直接依赖
+        if len(indent) == 1:
+            if name == module:
+                total_us, children = int(cumulative), pending
+            pending = []
+        elif len(indent) == 3:
+            pending.append((int(cumulative), name))
+    heavy = [m for m in result.stdout.strip().split(",") if m]
+    children.sort(reverse=True)
+    return (total_us or 0) / 1000, children[:8], heavy
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def cold_start(timeout: float = 60.0) -> float:
+    """启动 uvicorn，返回进程启动到 /api/concepts 首次返回200的秒数"""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/api/concepts"
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=project_root, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn 退出，返回码 {proc.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"{timeout:.0f}s 内未收到 {url} 的响应")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端启动耗时基准测试")
+    parser.add_argument("--budget-ms", type=float, default=800, help="导入 backend.main 的耗时预算（毫秒）")
+    parser.add_argument("-n", type=int, default=3, help="冷启动测量次数")
+    parser.add_argument("--skip-server", action="store_true", help="只检查导入预算，不启动服务")
+    args = parser.parse_args()
+
+    # 第一次导入会编译 .pyc，不计入结果
+    measure_imports()
+    import_ms, children, heavy = measure_imports()
+    print(f"import backend.main: {import_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    for cumulative, name in children:
+        print(f"  {name:<40}{cumulative / 1000:>8.1f} ms")
+
+    failures = []
+    if import_ms > args.budget_ms:
+        failures.append(f"导入耗时 {import_ms:.0f} ms 超过预算 {args.budget_ms:.0f} ms")
+    if heavy:
+        failures.append(f"启动时导入了重量级依赖: {', '.join(heavy)}")
+
+    if not args.skip_server:
+        times = [cold_start() for _ in range(args.n)]
+        print(f"cold start -> first /api/concepts: median {statistics.median(times) * 1000:.0f} ms "
+              f"(min {min(times) * 1000:.0f}, max {max(times) * 1000:.0f}, n={args.n})")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
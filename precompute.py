@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+离线预计算脚本 - 预先生成概念的AI语义漂移分析、分时期解释和图表，适合作为每晚的定时任务
+
+默认处理全部概念；已是最新的概念跳过，中断后重新运行从检查点继续（配置见 PRECOMPUTE_CONFIG）。
+
+用法：
+    python precompute.py [概念 ...] [-f 概念列表.txt] [--server http://host:8080 ...]
+                         [--parallel 2] [--force] [--restart] [--no-charts]
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线预计算概念的AI分析")
+    parser.add_argument("concepts", nargs="*", help="要处理的概念，默认全部概念")
+    parser.add_argument("-f", "--file", type=Path, help="概念列表文件，每行一个")
+    parser.add_argument("--server", action="append", help="LLaMA.cpp服务器地址，可重复指定多个")
+    parser.add_argument("--parallel", type=int, help="每个服务器同时处理的概念数（不超过其并行槽位数）")
+    parser.add_argument("--force", action="store_true", help="重新生成所有概念，不跳过已是最新的结果")
+    parser.add_argument("--restart", action="store_true", help="清空检查点后从头开始")
+    parser.add_argument("--no-charts", action="store_true", help="不预先绘制图表")
+    args = parser.parse_args()
+
+    from backend.utils.precompute import Precomputer
+
+    names = list(args.concepts)
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            names += [line.strip() for line in f if line.strip()]
+
+    precomputer = Precomputer(servers=args.server, parallel=args.parallel, force=args.force,
+                              charts=False if args.no_charts else None)
+    if args.restart:
+        precomputer.reset_checkpoint()
+    else:
+        precomputer.load_checkpoint()
+    try:
+        summary = asyncio.run(precomputer.run(names or None))
+    except RuntimeError as e:
+        print(f"预计算失败: {str(e)}")
+        sys.exit(2)
+    for name, error in summary["failures"].items():
+        print(f"  失败: {name}: {error}")
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()